@@ -1,18 +1,135 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QLabel
+from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QLabel, QCheckBox, QSpinBox
+from PyQt5.QtCore import QObject, pyqtSignal, QRunnable, QThreadPool, QTimer
+import pyqtgraph as pg
+import numpy as np
 import serial
 import time
+from collections import deque
+from data_logger import DataLogger
+
+UNITS = {'V': 'V', 'I': 'A', 'R': 'Ohms'}
+NAMES = {'V': 'Voltage', 'I': 'Current', 'R': 'Resistance'}
+COLOURS = {'V': 'r', 'I': 'g', 'R': 'c'}
+
+class RollingStats:
+    def __init__(self, window=1000):
+        self.values = np.zeros(window)
+        self.times = np.zeros(window)
+        self.count = 0
+
+    def add(self, timestamp, value):
+        i = self.count % len(self.values)
+        self.values[i] = value
+        self.times[i] = timestamp
+        self.count += 1
+
+    def filled(self):
+        n = min(self.count, len(self.values))
+        return self.values[:n]
+
+    def ordered(self):
+        # Oldest to newest, for the trend plot
+        n = len(self.values)
+        if self.count <= n:
+            return self.times[:self.count], self.values[:self.count]
+        i = self.count % n
+        return np.concatenate((self.times[i:], self.times[:i])), np.concatenate((self.values[i:], self.values[:i]))
+
+    def summary(self):
+        data = self.filled()
+        if len(data) == 0:
+            return None
+        return data.mean(), data.min(), data.max(), data.std()
+
+    def reset(self):
+        self.count = 0
+
+class WorkerSignals(QObject):
+    readings = pyqtSignal(list)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+class MeasurementWorker(QRunnable):
+    # Keeps `depth` commands in flight so the ESP32 always has the next
+    # request queued while we parse the previous answer.
+    def __init__(self, ser, commands, depth=4, count=None, emit_interval=0.05):
+        super().__init__()
+        self.ser = ser
+        self.commands = list(commands)
+        self.depth = depth
+        self.count = count
+        self.emit_interval = emit_interval
+        self.running = True
+        self.signals = WorkerSignals()
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        pending = deque()
+        batch = []
+        sent = 0
+        received = 0
+        next_cmd = 0
+        last_emit = time.perf_counter()
+        try:
+            while self.running and (self.count is None or received < self.count):
+                while len(pending) < self.depth and (self.count is None or sent < self.count):
+                    cmd = self.commands[next_cmd]
+                    next_cmd = (next_cmd + 1) % len(self.commands)
+                    self.ser.write(cmd.encode())
+                    pending.append(cmd)
+                    sent += 1
+                line = self.ser.readline()
+                if not line:
+                    # Timed out, the device dropped our requests; start over
+                    self.signals.error.emit("Timeout waiting for ESP32")
+                    self.ser.reset_input_buffer()
+                    if self.count is not None:
+                        break
+                    sent -= len(pending)
+                    pending.clear()
+                    continue
+                cmd = pending.popleft()
+                received += 1
+                try:
+                    value = float(line.decode(errors='ignore').strip())
+                except ValueError:
+                    self.signals.error.emit(f"Bad reply for {cmd}: {line!r}")
+                    continue
+                batch.append((cmd, time.time(), value))
+                now = time.perf_counter()
+                if now - last_emit >= self.emit_interval:
+                    self.signals.readings.emit(batch)
+                    batch = []
+                    last_emit = now
+        except serial.SerialException as e:
+            self.signals.error.emit(str(e))
+        if batch:
+            self.signals.readings.emit(batch)
+        # Drain replies to requests we no longer care about
+        if pending:
+            time.sleep(self.ser.timeout or 0)
+            self.ser.reset_input_buffer()
+        self.signals.finished.emit()
 
 class MultimeterGUI(QWidget):
     def __init__(self):
         super().__init__()
-        
+
         # Serial setup (replace COM port as per your system)
         self.ser = serial.Serial('COM3', 115200, timeout=1)
         time.sleep(2)  # Wait for ESP32 to initialize
 
+        self.worker = None
+        self.logger = None
+        self.stats = {cmd: RollingStats() for cmd in UNITS}
+        self.reading_count = 0
+        self.rate_start = time.time()
+
         self.initUI()
-    
+
     def initUI(self):
         self.setWindowTitle('ESP32 Multimeter')
 
@@ -27,32 +144,166 @@ class MultimeterGUI(QWidget):
         self.current_button.clicked.connect(self.measure_current)
         self.resistance_button.clicked.connect(self.measure_resistance)
 
+        # Continuous measurement controls
+        self.channel_boxes = {}
+        channel_layout = QHBoxLayout()
+        for cmd in UNITS:
+            box = QCheckBox(NAMES[cmd], self)
+            box.setChecked(cmd == 'V')
+            self.channel_boxes[cmd] = box
+            channel_layout.addWidget(box)
+        channel_layout.addWidget(QLabel('Pipeline depth:', self))
+        self.depth_spin = QSpinBox(self)
+        self.depth_spin.setRange(1, 32)
+        self.depth_spin.setValue(4)
+        channel_layout.addWidget(self.depth_spin)
+
+        self.continuous_button = QPushButton('Start Continuous', self)
+        self.continuous_button.clicked.connect(self.toggle_continuous)
+        self.reset_button = QPushButton('Reset Statistics', self)
+        self.reset_button.clicked.connect(self.reset_stats)
+        self.log_box = QCheckBox('Log readings to file', self)
+        self.log_box.toggled.connect(self.toggle_logging)
+        self.stats_label = QLabel('', self)
+        self.rate_label = QLabel('Rate: 0.0 readings/s', self)
+
+        # Trend plot
+        self.plot_widget = pg.PlotWidget(self)
+        self.plot_widget.setBackground('k')
+        self.plot_widget.setLabel('bottom', 'Time', units='s')
+        self.plot_widget.showGrid(x=True, y=True)
+        self.plot_widget.addLegend()
+        self.curves = {cmd: self.plot_widget.plot(pen=COLOURS[cmd], name=NAMES[cmd]) for cmd in UNITS}
+
         # Layout
         vbox = QVBoxLayout()
         vbox.addWidget(self.voltage_button)
         vbox.addWidget(self.current_button)
         vbox.addWidget(self.resistance_button)
         vbox.addWidget(self.result_label)
-        
+        vbox.addLayout(channel_layout)
+        vbox.addWidget(self.continuous_button)
+        vbox.addWidget(self.reset_button)
+        vbox.addWidget(self.log_box)
+        vbox.addWidget(self.stats_label)
+        vbox.addWidget(self.rate_label)
+        vbox.addWidget(self.plot_widget)
+
         self.setLayout(vbox)
 
+        # Redraw the trend at a fixed rate instead of per reading
+        self.display_timer = QTimer()
+        self.display_timer.timeout.connect(self.update_display)
+
+    def start_worker(self, commands, count=None):
+        self.worker = MeasurementWorker(self.ser, commands, depth=self.depth_spin.value(), count=count)
+        self.worker.signals.readings.connect(self.handle_readings)
+        self.worker.signals.error.connect(self.handle_error)
+        self.worker.signals.finished.connect(self.worker_finished)
+        self.set_buttons_enabled(False)
+        QThreadPool.globalInstance().start(self.worker)
+
     def send_command(self, cmd):
-        self.ser.write(cmd.encode())  # Send command to ESP32
-        time.sleep(1)  # Wait for data from ESP32
-        result = self.ser.readline().decode().strip()  # Read result from ESP32
-        return result
+        # Single reading, done off the GUI thread
+        if self.worker is None:
+            self.start_worker([cmd], count=1)
 
     def measure_voltage(self):
-        result = self.send_command('V')
-        self.result_label.setText(f'Result: Voltage = {result} V')
+        self.send_command('V')
 
     def measure_current(self):
-        result = self.send_command('I')
-        self.result_label.setText(f'Result: Current = {result} A')
+        self.send_command('I')
 
     def measure_resistance(self):
-        result = self.send_command('R')
-        self.result_label.setText(f'Result: Resistance = {result} Ohms')
+        self.send_command('R')
+
+    def toggle_continuous(self):
+        if self.worker is not None and self.worker.count is None:
+            self.worker.stop()
+            self.continuous_button.setEnabled(False)
+            return
+        commands = [cmd for cmd, box in self.channel_boxes.items() if box.isChecked()]
+        if not commands or self.worker is not None:
+            return
+        self.reading_count = 0
+        self.rate_start = time.time()
+        self.start_worker(commands)
+        self.continuous_button.setText('Stop Continuous')
+        self.continuous_button.setEnabled(True)
+        self.display_timer.start(100)
+
+    def set_buttons_enabled(self, enabled):
+        for button in (self.voltage_button, self.current_button, self.resistance_button):
+            button.setEnabled(enabled)
+        for box in self.channel_boxes.values():
+            box.setEnabled(enabled)
+        self.depth_spin.setEnabled(enabled)
+        self.continuous_button.setEnabled(enabled)
+
+    def worker_finished(self):
+        self.worker = None
+        self.display_timer.stop()
+        self.update_display()
+        self.set_buttons_enabled(True)
+        self.continuous_button.setText('Start Continuous')
+
+    def handle_readings(self, readings):
+        for cmd, timestamp, value in readings:
+            self.stats[cmd].add(timestamp, value)
+        self.reading_count += len(readings)
+        if self.logger is not None:
+            for cmd in {r[0] for r in readings}:
+                times = [t for c, t, _ in readings if c == cmd]
+                values = [v for c, _, v in readings if c == cmd]
+                self.logger.log_many(f'multimeter.{cmd}', values, times)
+        cmd, _, value = readings[-1]
+        self.result_label.setText(f'Result: {NAMES[cmd]} = {value} {UNITS[cmd]}')
+
+    def handle_error(self, message):
+        self.result_label.setText(f'Error: {message}')
+
+    def toggle_logging(self, enabled):
+        if enabled:
+            path = time.strftime('multimeter_%Y%m%d_%H%M%S.dlog')
+            self.logger = DataLogger(path)
+            self.log_box.setText(f'Logging to {path}')
+        elif self.logger is not None:
+            self.logger.close()
+            self.logger = None
+            self.log_box.setText('Log readings to file')
+
+    def reset_stats(self):
+        for stats in self.stats.values():
+            stats.reset()
+        self.reading_count = 0
+        self.rate_start = time.time()
+        self.update_display()
+
+    def update_display(self):
+        lines = []
+        for cmd, stats in self.stats.items():
+            summary = stats.summary()
+            times, values = stats.ordered()
+            if summary is None:
+                self.curves[cmd].setData([], [])
+                continue
+            mean, vmin, vmax, std = summary
+            unit = UNITS[cmd]
+            lines.append(f'{NAMES[cmd]}: mean {mean:.4g} {unit}, min {vmin:.4g}, max {vmax:.4g}, std {std:.3g}')
+            self.curves[cmd].setData(times - self.rate_start, values)
+        self.stats_label.setText('\n'.join(lines))
+        elapsed = time.time() - self.rate_start
+        if elapsed > 0:
+            self.rate_label.setText(f'Rate: {self.reading_count / elapsed:.1f} readings/s')
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.stop()
+        QThreadPool.globalInstance().waitForDone(3000)
+        self.ser.close()
+        if self.logger is not None:
+            self.logger.close()
+        event.accept()
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -1,35 +1,71 @@
 import socket
 import os
 import struct
+import sys
+import time
+from shm_ring import SharedRing
+from link_profiles import PIPE_RATE, LinkTuner, configure_socket, profile_from_argv, queued_bytes
 
 # Define the named pipe (FIFO) path
 pipe_name = '/tmp/adc_data_pipe'
 
-# Create a TCP socket
-server_host = '0.0.0.0'
-server_port = 8081
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server_socket.bind((server_host, server_port))
-server_socket.listen(1)
+# --profile interactive|balanced|bulk|adaptive sets the block size and
+# socket options; use the same one on the viewer (gui5.py --profile)
+profile = profile_from_argv()
+tuner = LinkTuner(profile, PIPE_RATE)
+report_seconds = 5
 
-print("Waiting for TCP connection...")
-client_socket, client_address = server_socket.accept()
-print("Connected to:", client_address)
+# TCP for a remote viewer, or --shm to publish into a shared memory ring
+# for viewers running on this machine (gui5.py --local)
+use_shm = '--shm' in sys.argv
+ring = None
+client_socket = None
+
+if use_shm:
+    ring = SharedRing.create(slot_bytes=tuner.max_bytes)
+    print("Publishing to shared memory ring:", ring.shm.name)
+else:
+    # Create a TCP socket
+    server_host = '0.0.0.0'
+    server_port = 8081
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    configure_socket(server_socket, profile)
+    server_socket.bind((server_host, server_port))
+    server_socket.listen(1)
+
+    print("Waiting for TCP connection...")
+    client_socket, client_address = server_socket.accept()
+    configure_socket(client_socket, profile)
+    print("Connected to:", client_address)
 
 # Open the named pipe for reading
 pipe_fd = os.open(pipe_name, os.O_RDONLY)
 
 try:
     data_buffer = b''  # Buffer to store the received data
+    report_at = time.perf_counter() + report_seconds
 
     while True:
+        # The adaptive profile changes the block size as it goes
+        block_bytes = tuner.block_bytes
         # Read the voltage from the pipe
-        voltage_bytes = os.read(pipe_fd, 4000)
+        voltage_bytes = os.read(pipe_fd, block_bytes)
         data_buffer += voltage_bytes  # Append the received data to the buffer
-        if len(data_buffer) >= 4000:  # Check if the buffer size exceeds 40000 bytes
+        if ring is not None:
+            # One block per ring slot, the remainder waits for the next read
+            while len(data_buffer) >= block_bytes:
+                ring.publish(data_buffer[:block_bytes])
+                data_buffer = data_buffer[block_bytes:]
+                tuner.update(block_bytes, len(data_buffer) + queued_bytes(pipe_fd))
+        elif len(data_buffer) >= block_bytes:  # Check if the buffer holds a full block
             client_socket.sendall(data_buffer)  # Send the data over the socket
+            tuner.update(len(data_buffer), queued_bytes(pipe_fd))
             data_buffer = b''  # Reset the buffer
-        
+        if time.perf_counter() >= report_at:
+            print(tuner.status_text())
+            report_at += report_seconds
+
 finally:
     os.close(pipe_fd)
-
+    if ring is not None:
+        ring.close()
@@ -2,10 +2,30 @@ import sys
 import serial
 import serial.tools.list_ports
 import numpy as np
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QComboBox, QPushButton, QLabel, QHBoxLayout, QDial, QToolTip
-from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QComboBox, QPushButton, QLabel, QHBoxLayout, QDial, QToolTip, QFileDialog, QDoubleSpinBox, QLineEdit, QCheckBox, QSpinBox
+from PyQt5.QtCore import QTimer, Qt, QThreadPool
+from PyQt5.QtGui import QFont, QTransform
 import pyqtgraph as pg
+import time
+from collections import deque
+from data_logger import DataLogger
+from waveform_export import EXPORT_FILTERS, ExportWorker, WaveformRecorder, load_waveform
+from measurements import measure
+from calibration import Calibration, LutDecoder
+from filters import FILTER_TYPES
+from math_channels import MathChannel
+from mask_test import MaskTest
+from display_scheduler import DisplayScheduler
+from strip_chart import StripChart
+from trigger import SWEEP_MODES, Trigger
+from serial_framing import FrameParser
+from protocol_decode import DecodeLog, DecodeOverlay, UartDecoder
+from sinx_interp import SincDisplay
+from eye_diagram import EyeDiagram, EyeDisplay
+from link_profiles import PROFILES, DEFAULT_PROFILE, SERIAL_PROFILE_NOTE, SERIAL_RATE, LinkTuner
+from channels import ChannelDisplay, ChannelPanel, ChannelStream, channel_names
+
+SAMPLE_RATE = 1000000  # esp-scope.ino SAMPLE_RATE
 
 class USBOscilloscope(QMainWindow):
     def __init__(self):
@@ -31,6 +51,14 @@ class USBOscilloscope(QMainWindow):
         self.refresh_ports()
         left_panel.addWidget(self.port_combo)
 
+        # Latency against throughput of the serial reads, see link_profiles.py
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItems(PROFILES)
+        self.profile_combo.setCurrentText(DEFAULT_PROFILE)
+        self.profile_combo.setToolTip(SERIAL_PROFILE_NOTE)
+        self.profile_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.profile_combo)
+
         self.connect_button = QPushButton("Connect")
         self.connect_button.clicked.connect(self.connect_serial)
         self.connect_button.setStyleSheet("""
@@ -86,6 +114,122 @@ class USBOscilloscope(QMainWindow):
         left_panel.addWidget(QLabel("Trigger Mode:"))
         left_panel.addWidget(self.trigger_mode_combo)
 
+        # Sweep mode, pre-trigger and holdoff
+        self.sweep_combo = QComboBox()
+        self.sweep_combo.addItems(SWEEP_MODES)
+        self.sweep_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.sweep_combo)
+        self.pre_trigger_spin = QSpinBox()
+        self.pre_trigger_spin.setRange(0, 100)
+        self.pre_trigger_spin.setValue(50)
+        self.pre_trigger_spin.setSuffix(" % pre-trigger")
+        self.pre_trigger_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.pre_trigger_spin)
+        self.holdoff_spin = QDoubleSpinBox()
+        self.holdoff_spin.setRange(0, 1000000)
+        self.holdoff_spin.setDecimals(0)
+        self.holdoff_spin.setSuffix(" us holdoff")
+        self.holdoff_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.holdoff_spin)
+        self.arm_button = QPushButton("Arm Single")
+        self.arm_button.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.arm_button)
+        self.trigger_label = QLabel("Trigger: Armed")
+        left_panel.addWidget(self.trigger_label)
+
+        # Per-channel colour, gain, trigger source and XY mode; the channel
+        # count comes from the stream's frame headers
+        self.channel_panel = ChannelPanel("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.channel_panel)
+
+        # Filter stage controls
+        self.filter_combo = QComboBox()
+        self.filter_combo.addItems(FILTER_TYPES)
+        self.filter_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        self.filter_combo.currentTextChanged.connect(self.update_filter)
+        left_panel.addWidget(QLabel("Filter:"))
+        left_panel.addWidget(self.filter_combo)
+
+        self.filter_cutoff_spin = QDoubleSpinBox()
+        self.filter_cutoff_spin.setRange(1, SAMPLE_RATE * 0.49)
+        self.filter_cutoff_spin.setDecimals(0)
+        self.filter_cutoff_spin.setSuffix(" Hz")
+        self.filter_cutoff_spin.setValue(SAMPLE_RATE / 20)
+        self.filter_cutoff_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        self.filter_cutoff_spin.valueChanged.connect(self.update_filter)
+        left_panel.addWidget(self.filter_cutoff_spin)
+
+        # Math channel expression, e.g. ddt(CH1) or CH1*2-1.65
+        self.math_edit = QLineEdit()
+        self.math_edit.setPlaceholderText("e.g. ddt(CH1)/1e6")
+        self.math_edit.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        self.math_edit.editingFinished.connect(self.update_math_channel)
+        left_panel.addWidget(QLabel("Math:"))
+        left_panel.addWidget(self.math_edit)
+
+        # Mask testing against a captured golden frame
+        self.mask_button = QPushButton("Capture Mask")
+        self.mask_button.clicked.connect(self.toggle_mask)
+        self.mask_button.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.mask_button)
+        self.mask_margin_spin = QDoubleSpinBox()
+        self.mask_margin_spin.setRange(0.01, 3.3)
+        self.mask_margin_spin.setSingleStep(0.05)
+        self.mask_margin_spin.setValue(0.2)
+        self.mask_margin_spin.setSuffix(" V margin")
+        self.mask_margin_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        self.mask_margin_spin.valueChanged.connect(self.update_mask_settings)
+        left_panel.addWidget(self.mask_margin_spin)
+        self.mask_stop_check = QCheckBox("Stop on fail")
+        self.mask_stop_check.toggled.connect(self.update_mask_settings)
+        left_panel.addWidget(self.mask_stop_check)
+        self.mask_label = QLabel("Mask: off")
+        left_panel.addWidget(self.mask_label)
+
+        # Protocol decode of CH1, labels drawn over the trace
+        self.decode_combo = QComboBox()
+        self.decode_combo.addItems(["Off", "UART"])
+        self.decode_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(QLabel("Decode:"))
+        left_panel.addWidget(self.decode_combo)
+        self.baud_spin = QSpinBox()
+        self.baud_spin.setRange(300, SAMPLE_RATE // 4)
+        self.baud_spin.setValue(115200)
+        self.baud_spin.setSuffix(" baud")
+        self.baud_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.baud_spin)
+        self.decode_search_edit = QLineEdit()
+        self.decode_search_edit.setPlaceholderText("Search, e.g. 0x41 or 'A'")
+        self.decode_search_edit.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.decode_search_edit)
+        self.decode_label = QLabel("Decode: off")
+        left_panel.addWidget(self.decode_label)
+
+        # Display refresh rate, independent of the acquisition rate
+        self.refresh_rate_spin = QSpinBox()
+        self.refresh_rate_spin.setRange(1, 240)
+        self.refresh_rate_spin.setValue(60)
+        self.refresh_rate_spin.setSuffix(" Hz refresh")
+        self.refresh_rate_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.refresh_rate_spin)
+        self.display_label = QLabel("Display: 0 fps")
+        left_panel.addWidget(self.display_label)
+
+        # Band-limited reconstruction when only a few samples are on screen
+        self.sinc_check = QCheckBox("Sin(x)/x at fast timebases")
+        self.sinc_check.setChecked(True)
+        left_panel.addWidget(self.sinc_check)
+
+        # Roll mode scrolls the whole history instead of triggered frames
+        self.roll_check = QCheckBox("Roll mode")
+        left_panel.addWidget(self.roll_check)
+
+        # Eye diagram of CH1 over every unit interval, clock recovered from the data
+        self.eye_check = QCheckBox("Eye diagram")
+        left_panel.addWidget(self.eye_check)
+        self.eye_label = QLabel("Eye: off")
+        left_panel.addWidget(self.eye_label)
+
         self.pause_resume_button = QPushButton("Pause")
         self.pause_resume_button.clicked.connect(self.toggle_pause_resume)
         self.pause_resume_button.setStyleSheet("""
@@ -102,6 +246,41 @@ class USBOscilloscope(QMainWindow):
         """)
         left_panel.addWidget(self.pause_resume_button)
 
+        tool_button_style = """
+            QPushButton {
+                background-color: #2196F3; 
+                color: white; 
+                font-size: 16px; 
+                padding: 10px;
+                border-radius: 8px;
+            }
+            QPushButton:hover {
+                background-color: #1e88e5;
+            }
+        """
+
+        self.log_button = QPushButton("Start Logging")
+        self.log_button.clicked.connect(self.toggle_logging)
+        self.log_button.setStyleSheet(tool_button_style)
+        left_panel.addWidget(self.log_button)
+
+        self.record_button = QPushButton("Record")
+        self.record_button.clicked.connect(self.toggle_recording)
+        self.record_button.setStyleSheet(tool_button_style)
+        left_panel.addWidget(self.record_button)
+
+        # Export source and save button
+        self.export_source_combo = QComboBox()
+        self.export_source_combo.addItems(["Current buffer", "Segment history", "Recording"])
+        self.export_source_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(QLabel("Save:"))
+        left_panel.addWidget(self.export_source_combo)
+
+        self.save_button = QPushButton("Save Data")
+        self.save_button.clicked.connect(self.save_data)
+        self.save_button.setStyleSheet(tool_button_style)
+        left_panel.addWidget(self.save_button)
+
         main_layout.addLayout(left_panel)
         # Right panel with the plot
         self.plot_widget = pg.PlotWidget()
@@ -110,6 +289,10 @@ class USBOscilloscope(QMainWindow):
         self.plot_widget.setLabel('left', 'Voltage', units='V')
         self.plot_widget.setLabel('bottom', 'Time', units='ms')
         self.plot_curve = self.plot_widget.plot(pen='r')
+        self.math_curve = self.plot_widget.plot(pen='y')
+        mask_pen = pg.mkPen((150, 150, 150), style=Qt.DashLine)
+        self.mask_upper_curve = self.plot_widget.plot(pen=mask_pen)
+        self.mask_lower_curve = self.plot_widget.plot(pen=mask_pen)
 
         # Set Y and X ranges for the plot
         self.plot_widget.setYRange(-3.5, 3.5)  # Updated for 3.3V signal
@@ -126,12 +309,66 @@ class USBOscilloscope(QMainWindow):
         self.setCentralWidget(self.central_widget)
 
         self.serial_port = None
+        self.framer = FrameParser()
+        self.decoder = LutDecoder(Calibration.load('esp32'))
+        self.channels = ChannelStream(SAMPLE_RATE)
+        self.channel_display = ChannelDisplay(self.plot_widget, self.plot_curve)
+        self.channel_panel.attach(self.channel_display)
+        self.xy_shown = False
+        self.math_channel = None
+        self.mask_test = None
         self.data_buffer = np.zeros(1000)  # Buffer size for data
+        self.channel_frame = self.data_buffer[:, None]  # All channels, data_buffer is CH1
         self.is_paused = False
-        self.triggered = False
+        self.trigger = Trigger(len(self.data_buffer), auto_timeout=SAMPLE_RATE // 20)
+        self.logger = None
+        self.recorder = None
+        self.last_recording = None
+        self.segment_history = deque(maxlen=1000)
+        self.export_worker = None
+        # Stream positions: samples received since start, where the shown
+        # frame and the roll mode history begin
+        self.sample_count = 0
+        self.frame_start = 0
+        self.roll_origin = 0
+        self.protocol_decoder = None
+        self.decode_log = DecodeLog()
+        self.decode_overlay = DecodeOverlay(self.plot_widget)
+        self.search_position = None
 
         self.plot_timer = QTimer()
         self.plot_timer.timeout.connect(self.update_plot)
+        self.tuner = LinkTuner(PROFILES[DEFAULT_PROFILE], SERIAL_RATE)
+        self.profile_combo.currentTextChanged.connect(self.update_link_profile)
+
+        self.display_scheduler = DisplayScheduler(self.render_frame, self.refresh_rate_spin.value())
+        self.refresh_rate_spin.valueChanged.connect(self.display_scheduler.set_refresh_rate)
+        self.display_scheduler.start()
+
+        self.strip_chart = StripChart(self.plot_widget, self.plot_curve, SAMPLE_RATE)
+        self.sinc_display = SincDisplay()
+        self.sinc_check.toggled.connect(self.toggle_sinc)
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(self.redraw_trace)
+        self.roll_check.toggled.connect(self.toggle_roll_mode)
+        self.eye_diagram = EyeDiagram(SAMPLE_RATE)
+        self.eye_display = EyeDisplay(self.plot_widget)
+        self.eye_check.toggled.connect(self.toggle_eye)
+        self.decode_combo.currentTextChanged.connect(self.update_protocol_decoder)
+        self.baud_spin.valueChanged.connect(self.update_protocol_decoder)
+        self.decode_search_edit.returnPressed.connect(self.search_decoded)
+
+        for signal in (self.trigger_level_dial.valueChanged, self.trigger_mode_combo.currentTextChanged,
+                       self.sweep_combo.currentTextChanged, self.pre_trigger_spin.valueChanged,
+                       self.holdoff_spin.valueChanged):
+            signal.connect(self.update_trigger)
+        self.arm_button.clicked.connect(self.trigger.arm)
+        self.update_trigger()
+        self.channel_panel.changed.connect(self.update_channels)
+
+        # Scale dials only change the view, the buffers stay in volts
+        self.horizontal_scale_dial.valueChanged.connect(self.apply_view_scale)
+        self.vertical_scale_dial.valueChanged.connect(self.apply_view_scale)
+        self.apply_view_scale()
 
         self.connection_check_timer = QTimer()
         self.connection_check_timer.timeout.connect(self.check_serial_connection)
@@ -149,52 +386,295 @@ class USBOscilloscope(QMainWindow):
                 self.serial_port = serial.Serial(selected_port, baudrate=2000000, timeout=0.1)
                 self.status_label.setText(f"Status: Connected to {selected_port}")
                 self.data_buffer = np.zeros(1000)
-                self.plot_timer.start(5)
+                self.channel_frame = self.data_buffer[:, None]
+                self.framer.reset()
+                self.trigger.reset()
+                self.update_protocol_decoder()
+                self.plot_timer.start(self.tuner.poll_ms)
             except Exception as e:
                 self.status_label.setText(f"Failed to open serial port: {e}")
 
     def update_plot(self):
         if self.serial_port is not None and not self.is_paused and self.serial_port.in_waiting > 0:
             try:
-                # Read bytes from the serial port
-                data = self.serial_port.read(200)  # Read in chunks to fit frequency
-                data_array = np.frombuffer(data, dtype=np.uint8)  # Convert to uint8
-                data_array = data_array.astype(np.float32) * 3.3 / 255  # Scale to 0-3.3V
-
-                # Implement Triggering
-                trigger_level = self.trigger_level_dial.value() / 100.0  # Convert to voltage
-                trigger_mode = self.trigger_mode_combo.currentText()
-
-                if not hasattr(self, 'triggered'):
-                    self.triggered = False
-
-                # Trigger Logic
-                if not self.triggered:
-                    for i in range(1, len(data_array)):
-                        if (trigger_mode == "Rising" and data_array[i-1] < trigger_level <= data_array[i]) or \
-                           (trigger_mode == "Falling" and data_array[i-1] > trigger_level >= data_array[i]):
-                            self.triggered = True
-                            break
-
-                if self.triggered:
-                    # Update data buffer with new data
-                    self.data_buffer = np.roll(self.data_buffer, -len(data_array))
-                    self.data_buffer[-len(data_array):] = data_array[:]
-
-                    vertical_scale = self.vertical_scale_dial.value()
-                    scaled_data = self.data_buffer * vertical_scale
-
-                    horizontal_scale = self.horizontal_scale_dial.value()
-                    self.plot_widget.setXRange(0, 1000 / horizontal_scale)  # Adjust X range
-                    self.plot_curve.setData(scaled_data)
+                # Whole blocks from the framed stream, lost blocks are counted
+                waiting = self.serial_port.in_waiting
+                if not self.tuner.due(waiting):
+                    return  # Wait for a whole block, or until it is overdue
+                held = len(self.framer.buffer)  # Start of a frame read earlier
+                data = self.serial_port.read(waiting)
+                data_array = self.framer.feed(data)
+                if not len(data_array):
+                    self.tuner.take(len(data))
+                    return
+                self.tuner.update(len(data), self.serial_port.in_waiting, held)
+                if self.plot_timer.interval() != self.tuner.poll_ms:
+                    self.plot_timer.setInterval(self.tuner.poll_ms)
+                if self.framer.channels != self.channels.count:
+                    self.set_channels(channel_names(self.framer.channels))
+                data_array = self.decoder.decode(data_array)  # Calibrated volts via lookup table
+                # (samples, channels) view of the interleaved block, CH1 is column 0
+                columns = self.channels.split(data_array)
+                if self.protocol_decoder is not None:
+                    self.decode_log.extend(self.protocol_decoder.decode({'RX': columns[:, 0]}))
+                self.sample_count += len(columns)
+                if self.recorder is not None:
+                    self.recorder.append(columns[:, 0] if self.recorder.columns == 1 else columns)
+                columns = self.channels.filter(columns)
+
+                if self.eye_diagram.enabled:
+                    # The eye builds up from every sample, there is no trigger
+                    self.eye_diagram.feed(columns[:, 0])
+                    self.display_scheduler.submit(self.eye_diagram)
+                    return
+
+                if self.strip_chart.enabled:
+                    # Roll mode keeps every sample, there is no trigger
+                    self.strip_chart.append(columns[:, 0])
+                    self.display_scheduler.submit(self.strip_chart)
+                    return
+
+                frames = self.trigger.process(columns)
+                if len(frames):
+                    self.channel_frame = frames[-1]
+                    self.data_buffer = self.channel_frame[:, 0]
+                    self.frame_start = self.sample_count - (self.trigger.position - self.trigger.last_start)
+                    self.display_scheduler.submit(self.channel_frame)
+
+                    frames = frames[:, :, 0]
+                    if self.mask_test is not None:
+                        passed = self.mask_test.test_frames(frames)
+                        if self.mask_test.should_stop(passed):
+                            self.toggle_pause_resume()
+                            self.status_label.setText("Stopped on mask failure")
+                    now = time.time()
+                    self.segment_history.extend((now, frame) for frame in frames)
+
+                    if self.logger is not None:
+                        self.logger.log_measurements('scope', measure(self.data_buffer, SAMPLE_RATE))
 
             except Exception as e:
                 print(f"Error reading from serial port: {e}")
 
+    def render_frame(self, frame):
+        if frame is self.eye_diagram:
+            self.eye_display.show(frame)
+            self.eye_label.setText(frame.summary())
+            self.display_label.setText(self.display_text())
+            return
+        if frame is self.strip_chart:
+            self.strip_chart.redraw()
+            self.draw_decoded()
+            self.display_label.setText(self.display_text())
+            return
+        self.channel_display.draw(frame, sinc_display=self.sinc_display)
+        if self.math_channel is not None:
+            sources = {name: frame[:, i] for i, name in enumerate(self.channels.names)}
+            self.math_curve.setData(self.math_channel.evaluate(sources))
+        if self.mask_test is not None:
+            self.mask_label.setText(self.mask_test.summary())
+        self.trigger_label.setText(f"Trigger: {self.trigger.state}")
+        self.draw_decoded()
+        self.display_label.setText(self.display_text())
+
+    def display_text(self):
+        return f"{self.display_scheduler.stats_text()}  {self.framer.status_text()}  {self.tuner.status_text()}"
+
+    def redraw_trace(self, *args):
+        # Zooming changes the samples per pixel, also while paused
+        if not self.strip_chart.enabled and not self.eye_diagram.enabled:
+            self.channel_display.draw(self.channel_frame, sinc_display=self.sinc_display)
+
+    def toggle_sinc(self, enabled):
+        self.sinc_display.enabled = enabled
+        self.redraw_trace()
+
+    def apply_view_scale(self):
+        horizontal_scale = self.horizontal_scale_dial.value()
+        if not self.strip_chart.enabled and not self.xy_shown and not self.eye_diagram.enabled:
+            self.plot_widget.setXRange(0, 1000 / horizontal_scale)  # Adjust X range
+        transform = QTransform.fromScale(1, self.vertical_scale_dial.value())
+        for curve in (self.math_curve, self.mask_upper_curve, self.mask_lower_curve):
+            curve.setTransform(transform)
+        self.channel_display.set_vertical_scale(self.vertical_scale_dial.value())
+
+    def set_channels(self, names):
+        # The stream changed its channel count
+        if self.recorder is not None:
+            self.toggle_recording()
+        self.channels.set_channels(names)
+        self.trigger.reset()
+        self.channel_frame = np.zeros((self.trigger.length, len(names)), dtype=np.float32)
+        self.data_buffer = self.channel_frame[:, 0]
+        self.channel_panel.set_channels(names)
+        # Frames already queued have the old columns
+        self.display_scheduler.clear()
+        # Drops the math channel while a source is missing, and brings it
+        # back when the stream has it again
+        self.update_math_channel()
+
+    def update_channels(self):
+        self.trigger.source = self.channel_panel.source()
+        if self.channel_display.xy and (self.strip_chart.enabled or self.eye_diagram.enabled):
+            self.channel_panel.xy_check.setChecked(False)
+            return
+        xy = self.channel_display.xy
+        if xy == self.xy_shown:
+            return
+        self.xy_shown = xy
+        if xy:
+            self.plot_widget.setLimits(xMin=-3.5, xMax=3.5)
+            self.plot_widget.setXRange(-3.5, 3.5)
+            self.plot_widget.setLabel('bottom', self.channels.names[0], units='V')
+        else:
+            self.plot_widget.setLimits(xMin=0, xMax=1000)
+            self.plot_widget.setLabel('bottom', 'Time', units='ms')
+            self.apply_view_scale()
+        self.redraw_trace()
+
+    def toggle_roll_mode(self, enabled):
+        if enabled:
+            self.eye_check.setChecked(False)
+        self.channel_panel.xy_check.setChecked(False)  # Roll mode draws CH1 against time
+        self.display_scheduler.clear()
+        self.math_curve.setData([])
+        self.strip_chart.clear()
+        self.channel_display.clear()
+        self.strip_chart.enabled = enabled
+        self.roll_origin = self.sample_count
+        self.trigger.reset()
+        if enabled:
+            self.plot_widget.setLimits(xMin=None, xMax=None)
+            self.plot_widget.setLabel('bottom', 'Time', units='s')
+            self.strip_chart.redraw()
+        else:
+            self.plot_widget.setLimits(xMin=0, xMax=1000)
+            self.plot_widget.setLabel('bottom', 'Time', units='ms')
+            self.redraw_trace()
+            self.apply_view_scale()
+
+    def toggle_eye(self, enabled):
+        if enabled:
+            self.roll_check.setChecked(False)
+            self.channel_panel.xy_check.setChecked(False)
+        self.display_scheduler.clear()
+        self.eye_diagram.reset()
+        self.eye_diagram.enabled = enabled
+        self.trigger.reset()
+        if enabled:
+            for curve in [self.math_curve] + self.channel_display.curves:
+                curve.setData([])
+            self.decode_overlay.clear()
+            self.plot_widget.setLimits(xMin=-0.5, xMax=1.5)
+            self.plot_widget.setXRange(-0.5, 1.5, padding=0)
+            self.plot_widget.setLabel('bottom', 'Unit interval')
+            self.eye_label.setText(self.eye_diagram.summary())
+        else:
+            self.eye_display.clear()
+            self.eye_label.setText("Eye: off")
+            self.plot_widget.setLimits(xMin=0, xMax=1000)
+            self.plot_widget.setLabel('bottom', 'Time', units='ms')
+            self.redraw_trace()
+            self.apply_view_scale()
+
+    def update_trigger(self):
+        self.trigger.level = self.trigger_level_dial.value() / 100.0  # Convert to voltage
+        self.trigger.slope = self.trigger_mode_combo.currentText()
+        self.trigger.mode = self.sweep_combo.currentText()
+        self.trigger.set_pre_trigger(self.pre_trigger_spin.value())
+        self.trigger.holdoff = int(self.holdoff_spin.value() * SAMPLE_RATE / 1e6)
+        self.trigger.arm()
+
+    def update_protocol_decoder(self):
+        self.decode_log.clear()
+        self.decode_overlay.clear()
+        self.search_position = None
+        self.protocol_decoder = None
+        if self.decode_combo.currentText() == "UART":
+            self.protocol_decoder = UartDecoder(SAMPLE_RATE, self.baud_spin.value())
+            self.protocol_decoder.reset(self.sample_count)
+            self.decode_label.setText("Decode: UART")
+        else:
+            self.decode_label.setText("Decode: off")
+
+    def draw_decoded(self):
+        if self.protocol_decoder is None:
+            return
+        if self.strip_chart.enabled:
+            t_start, t_end = self.plot_widget.viewRange()[0]
+            annotations = self.decode_log.in_range(self.roll_origin + int(t_start * SAMPLE_RATE),
+                                                   self.roll_origin + int(t_end * SAMPLE_RATE))
+            self.decode_overlay.show(annotations, lambda p: (p - self.roll_origin) / SAMPLE_RATE, 3.0)
+        else:
+            annotations = self.decode_log.in_range(self.frame_start, self.frame_start + len(self.data_buffer))
+            self.decode_overlay.show(annotations, lambda p: p - self.frame_start, 3.0)
+
+    def search_decoded(self):
+        # Steps through the matches, and in roll mode brings each into view
+        query = self.decode_search_edit.text().strip()
+        if not query:
+            return
+        matches = self.decode_log.search(query, self.search_position) or self.decode_log.search(query)
+        if not matches:
+            self.decode_label.setText(f"No match for {query}")
+            return
+        match = matches[0]
+        self.search_position = match.start
+        self.decode_label.setText(f"{match.text} at {match.start / SAMPLE_RATE:.6f} s")
+        if self.strip_chart.enabled:
+            t = (match.start - self.roll_origin) / SAMPLE_RATE
+            span = self.strip_chart.span
+            self.plot_widget.setXRange(t - span / 2, t + span / 2, padding=0)
+            self.draw_decoded()
+
+    def update_filter(self):
+        self.channels.reconfigure(self.filter_combo.currentText(), self.filter_cutoff_spin.value())
+
+    def update_math_channel(self):
+        expression = self.math_edit.text().strip()
+        self.math_channel = None
+        self.math_curve.setData([])
+        if expression:
+            try:
+                self.math_channel = MathChannel(expression, SAMPLE_RATE, self.channels.names)
+            except ValueError as e:
+                self.status_label.setText(f"Math: {e}")
+
+    def toggle_mask(self):
+        if self.mask_test is None:
+            self.mask_test = MaskTest(self.data_buffer, SAMPLE_RATE, margin=self.mask_margin_spin.value())
+            self.mask_test.stop_on_fail = self.mask_stop_check.isChecked()
+            self.mask_button.setText("Clear Mask")
+            self.draw_mask()
+        else:
+            self.mask_test = None
+            self.mask_upper_curve.setData([])
+            self.mask_lower_curve.setData([])
+            self.mask_button.setText("Capture Mask")
+            self.mask_label.setText("Mask: off")
+
+    def update_mask_settings(self):
+        if self.mask_test is not None:
+            self.mask_test.stop_on_fail = self.mask_stop_check.isChecked()
+            if self.mask_test.margin != self.mask_margin_spin.value():
+                self.mask_test.margin = self.mask_margin_spin.value()
+                self.mask_test.prepare(self.mask_test.length, self.mask_test.sample_rate)
+                self.draw_mask()
+
+    def draw_mask(self):
+        self.mask_upper_curve.setData(self.mask_test.upper)
+        self.mask_lower_curve.setData(self.mask_test.lower)
+
+    def update_link_profile(self, name):
+        self.tuner = LinkTuner(PROFILES[name], SERIAL_RATE)
+        self.plot_timer.setInterval(self.tuner.poll_ms)
+
     def toggle_pause_resume(self):
         if self.is_paused:
             self.is_paused = False
-            self.triggered = False  # Reset the trigger when resuming
+            self.trigger.reset()  # Re-arm on fresh data when resuming
+            if self.protocol_decoder is not None:
+                self.protocol_decoder.reset(self.sample_count)
             self.data_buffer = np.zeros(1000)  # Reset the data buffer
             self.pause_resume_button.setText("Pause")
             self.pause_resume_button.setStyleSheet("QPushButton { background-color: lightgreen; font-size: 16px; padding: 5px; }")
@@ -203,6 +683,75 @@ class USBOscilloscope(QMainWindow):
             self.pause_resume_button.setText("Resume")
             self.pause_resume_button.setStyleSheet("QPushButton { background-color: lightcoral; font-size: 16px; padding: 5px; }")
 
+    def toggle_logging(self):
+        if self.logger is None:
+            path = time.strftime('scope_%Y%m%d_%H%M%S.dlog')
+            self.logger = DataLogger(path)
+            self.log_button.setText("Stop Logging")
+            self.status_label.setText(f"Logging to {path}")
+        else:
+            self.logger.close()
+            self.logger = None
+            self.log_button.setText("Start Logging")
+
+    def export_metadata(self, source):
+        return {
+            'source': source,
+            'sample_rate': SAMPLE_RATE,
+            'units': 'V',
+            'calibration': self.decoder.calibration.to_dict(),
+            'filter': self.channels.kind,
+            'channels': self.channels.names,
+            'trigger_level': self.trigger_level_dial.value() / 100.0,
+            'trigger_mode': self.trigger_mode_combo.currentText(),
+            'sweep': self.trigger.mode,
+            'pre_trigger': self.trigger.pre_trigger,
+            'holdoff': self.trigger.holdoff,
+        }
+
+    def toggle_recording(self):
+        if self.recorder is None:
+            path = time.strftime('recording_%Y%m%d_%H%M%S.npy')
+            self.recorder = WaveformRecorder(path, self.export_metadata('recording'), self.channels.count)
+            self.record_button.setText("Stop Recording")
+            self.status_label.setText(f"Recording to {path}")
+        else:
+            self.recorder.close()
+            self.last_recording = self.recorder.path
+            self.status_label.setText(f"Recorded {self.recorder.samples} samples")
+            self.recorder = None
+            self.record_button.setText("Record")
+
+    def save_data(self):
+        source = self.export_source_combo.currentText()
+        if source == "Current buffer":
+            data = self.channel_frame.copy()
+            metadata = self.export_metadata('buffer')
+        elif source == "Segment history":
+            if not self.segment_history:
+                self.status_label.setText("No segments captured yet")
+                return
+            times, frames = zip(*self.segment_history)
+            data = np.stack(frames, axis=1)
+            metadata = dict(self.export_metadata('segments'), segment_times=list(times))
+        else:
+            if self.recorder is not None:
+                self.status_label.setText("Stop a recording before saving it")
+                return
+            if self.last_recording is None:
+                self.status_label.setText("No recording to save")
+                return
+            data, metadata = load_waveform(self.last_recording)
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Data", "", EXPORT_FILTERS)
+        if not file_path:
+            return
+        self.export_worker = ExportWorker(file_path, data, metadata)
+        self.export_worker.signals.progress.connect(lambda p: self.status_label.setText(f"Saving... {p}%"))
+        self.export_worker.signals.finished.connect(lambda path: self.status_label.setText(f"Saved {path}"))
+        self.export_worker.signals.cancelled.connect(lambda path: self.status_label.setText(f"Save of {path} cancelled"))
+        self.export_worker.signals.error.connect(lambda e: self.status_label.setText(f"Save failed: {e}"))
+        QThreadPool.globalInstance().start(self.export_worker)
+
     def check_serial_connection(self):
         ports = [port.device for port in serial.tools.list_ports.comports()]
         selected_port = self.port_combo.currentText()
@@ -226,6 +775,12 @@ class USBOscilloscope(QMainWindow):
     def closeEvent(self, event):
         if self.serial_port is not None:
             self.serial_port.close()
+        if self.logger is not None:
+            self.logger.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.export_worker is not None:
+            self.export_worker.cancel()
         event.accept()
 
 if __name__ == "__main__":
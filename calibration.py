@@ -0,0 +1,169 @@
+import sys
+import os
+import json
+import numpy as np
+
+CALIBRATION_DIR = os.path.join(os.path.expanduser('~'), '.oscilloscope', 'calibration')
+
+# Nominal transfer functions of the two acquisition paths
+DEVICES = {
+    'esp32': {'bits': 8, 'lsb': 3.3 / 255},   # esp-scope.ino sends raw >> 4
+    'pi': {'bits': 12, 'lsb': 5 / 4096},      # reciever.c 12-bit codes as uint16
+}
+
+class Calibration:
+    # volts = code * lsb * gain + offset + nonlinearity(code)
+    def __init__(self, device, bits, lsb, gain=1.0, offset=0.0, nonlinearity=None):
+        self.device = device
+        self.bits = bits
+        self.lsb = lsb
+        self.gain = gain
+        self.offset = offset
+        # [(code, correction in volts), ...], interpolated between points
+        self.nonlinearity = nonlinearity or []
+
+    @classmethod
+    def nominal(cls, device):
+        return cls(device, **DEVICES[device])
+
+    @classmethod
+    def load(cls, device, directory=CALIBRATION_DIR):
+        try:
+            with open(os.path.join(directory, f'{device}.json')) as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return cls.nominal(device)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['device'], d['bits'], d['lsb'], d.get('gain', 1.0), d.get('offset', 0.0),
+                   [tuple(p) for p in d.get('nonlinearity', [])])
+
+    def to_dict(self):
+        return {'device': self.device, 'bits': self.bits, 'lsb': self.lsb, 'gain': self.gain,
+                'offset': self.offset, 'nonlinearity': [list(p) for p in self.nonlinearity]}
+
+    def save(self, directory=CALIBRATION_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self.device}.json')
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def compile_lut(self):
+        codes = np.arange(1 << self.bits, dtype=np.float64)
+        volts = codes * self.lsb * self.gain + self.offset
+        if self.nonlinearity:
+            points = sorted(self.nonlinearity)
+            volts += np.interp(codes, [p[0] for p in points], [p[1] for p in points])
+        return volts.astype(np.float32)
+
+class LutDecoder:
+    def __init__(self, calibration):
+        self.out = np.empty(0, dtype=np.float32)
+        self.set_calibration(calibration)
+
+    def set_calibration(self, calibration):
+        self.calibration = calibration
+        self.lut = calibration.compile_lut()
+
+    def decode(self, codes, reuse=True):
+        # With reuse the result lives in a shared buffer and is only valid
+        # until the next call; pass reuse=False when handing it to another thread.
+        if not reuse:
+            return np.take(self.lut, codes, mode='clip')
+        if len(self.out) < len(codes):
+            self.out = np.empty(len(codes), dtype=np.float32)
+        out = self.out[:len(codes)]
+        np.take(self.lut, codes, out=out, mode='clip')
+        return out
+
+def fit_calibration(device, points):
+    # points: [(mean code, applied volts), ...]
+    nominal = Calibration.nominal(device)
+    codes = np.array([p[0] for p in points], dtype=np.float64)
+    volts = np.array([p[1] for p in points], dtype=np.float64)
+    if len(points) == 1 or np.ptp(codes) == 0:
+        # A single input level only fixes the offset
+        return Calibration(device, nominal.bits, nominal.lsb, offset=float(volts[0] - codes[0] * nominal.lsb))
+    gain, offset = np.polyfit(codes * nominal.lsb, volts, 1)
+    nonlinearity = []
+    if len(points) > 2:
+        residuals = volts - (codes * nominal.lsb * gain + offset)
+        nonlinearity = sorted(zip(codes.tolist(), residuals.tolist()))
+    return Calibration(device, nominal.bits, nominal.lsb, float(gain), float(offset), nonlinearity)
+
+def guided_calibration(device, read_codes, samples=100000, prompt=input):
+    points = []
+    print(f"Calibrating {device}. Apply a known voltage to the input for each step.")
+    while True:
+        text = prompt("Applied voltage in V (blank to finish): ").strip()
+        if not text:
+            break
+        try:
+            volts = float(text)
+        except ValueError:
+            print("Not a number")
+            continue
+        codes = read_codes(samples)
+        mean = float(np.mean(codes))
+        print(f"  {len(codes)} samples, mean code {mean:.2f}, noise {np.std(codes):.2f} codes")
+        points.append((mean, volts))
+    if not points:
+        return None
+    calibration = fit_calibration(device, points)
+    print(f"gain {calibration.gain:.6f}, offset {calibration.offset:.6f} V, "
+          f"{len(calibration.nonlinearity)} nonlinearity points")
+    return calibration
+
+def serial_code_reader(port, channel=0):
+    import serial
+    from serial_framing import FrameParser
+    ser = serial.Serial(port, baudrate=2000000, timeout=0.1)
+    framer = FrameParser()
+
+    def read_codes(samples):
+        # Only block payloads are averaged; the parser drops the partial
+        # frame left after the flush along with every header and checksum
+        ser.reset_input_buffer()
+        framer.reset()
+        pieces = []
+        total = 0
+        while total < samples * framer.channels:
+            codes = framer.feed(ser.read(4096))
+            pieces.append(codes)
+            total += len(codes)
+        codes = np.concatenate(pieces)
+        # Blocks start on the first channel, so a stride picks one column
+        channels = framer.channels
+        return codes[:len(codes) // channels * channels][min(channel, channels - 1)::channels]
+    return read_codes
+
+def tcp_code_reader(host, port=8081):
+    import socket
+    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client_socket.connect((host, port))
+
+    def read_codes(samples):
+        data = b''
+        while len(data) < samples * 2:
+            chunk = client_socket.recv(samples * 2 - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return np.frombuffer(data[:len(data) // 2 * 2], dtype=np.uint16) & 0xFFF
+    return read_codes
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in DEVICES:
+        print("usage: python3 calibration.py esp32 SERIAL_PORT [CHANNEL]")
+        print("       python3 calibration.py pi SERVER_HOST")
+        sys.exit(1)
+    device = sys.argv[1]
+    if device == 'esp32':
+        reader = serial_code_reader(sys.argv[2], int(sys.argv[3]) - 1 if len(sys.argv) > 3 else 0)
+    else:
+        reader = tcp_code_reader(sys.argv[2])
+    calibration = guided_calibration(device, reader)
+    if calibration is not None:
+        print("Saved", calibration.save())
@@ -0,0 +1,217 @@
+import numpy as np
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QTransform
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QCheckBox, QDoubleSpinBox, QLabel
+from filters import FilterStage
+
+MAX_CHANNELS = 8
+CHANNEL_COLOURS = {"Red": 'r', "Cyan": 'c', "Green": 'g', "Magenta": 'm', "Blue": (80, 120, 255),
+                   "White": 'w', "Orange": (255, 150, 0), "Pink": (255, 150, 200)}
+
+def channel_names(spec):
+    # "2" -> CH1, CH2; "CH3,CH1" -> that order, as the stream interleaves them
+    spec = str(spec).strip()
+    if spec.isdigit():
+        return [f"CH{i + 1}" for i in range(max(1, min(MAX_CHANNELS, int(spec))))]
+    return [name.strip().upper() for name in spec.split(',') if name.strip()][:MAX_CHANNELS]
+
+def deinterleave(block, channels):
+    # (samples, channels) view of an interleaved block; column i is a
+    # strided view of channel i, nothing is copied
+    return block[:len(block) // channels * channels].reshape(-1, channels)
+
+class ChannelStream:
+    # Turns interleaved blocks into (samples, channels) views. A block that
+    # ends part way through a sample set keeps the rest for the next one,
+    # and each channel has its own filter state.
+    def __init__(self, sample_rate, names=("CH1",)):
+        self.sample_rate = sample_rate
+        self.kind = "Off"
+        self.cutoff = sample_rate / 20
+        self.set_channels(names)
+
+    def set_channels(self, names):
+        self.names = list(names)
+        self.count = len(self.names)
+        self.remainder = None
+        self.filters = [FilterStage(self.sample_rate) for _ in self.names]
+        self.reconfigure(self.kind, self.cutoff)
+
+    def reconfigure(self, kind=None, cutoff=None):
+        for stage in self.filters:
+            stage.reconfigure(kind, cutoff)
+        self.kind = self.filters[0].kind
+        self.cutoff = self.filters[0].cutoff
+
+    def split(self, block):
+        if self.remainder is not None:
+            block = np.concatenate((self.remainder, block))
+            self.remainder = None
+        extra = len(block) % self.count
+        if extra:
+            self.remainder = block[-extra:].copy()
+        return deinterleave(block, self.count)
+
+    def filter(self, columns):
+        if self.kind == "Off":
+            return columns
+        if self.count == 1:
+            return self.filters[0].process(columns[:, 0])[:, None]
+        out = np.empty(columns.shape, dtype=np.float32)
+        for i, stage in enumerate(self.filters):
+            out[:, i] = stage.process(columns[:, i])
+        return out
+
+class ChannelDisplay:
+    # One curve per channel, each with its own colour, gain and visibility.
+    # Frames are (samples, channels) and every curve is handed a column, so
+    # a channel only adds its own drawing. XY mode plots the first channel
+    # against the second on a separate curve.
+    def __init__(self, plot_widget, first_curve, names=("CH1",)):
+        self.plot_widget = plot_widget
+        self.curves = [first_curve]
+        self.settings = []
+        self.vertical_scale = 1.0
+        self.xy = False
+        self.xy_curve = plot_widget.plot(pen='g')
+        self.set_channels(names)
+
+    def set_channels(self, names):
+        colours = list(CHANNEL_COLOURS)
+        while len(self.curves) > len(names):
+            self.plot_widget.removeItem(self.curves.pop())
+        while len(self.curves) < len(names):
+            self.curves.append(self.plot_widget.plot())
+        self.settings = self.settings[:len(names)]
+        while len(self.settings) < len(names):
+            self.settings.append({'colour': colours[len(self.settings) % len(colours)], 'gain': 1.0, 'visible': True})
+        self.names = list(names)
+        self.apply()
+
+    def set_vertical_scale(self, scale):
+        self.vertical_scale = scale
+        self.apply()
+
+    def apply(self):
+        for curve, setting in zip(self.curves, self.settings):
+            curve.setPen(CHANNEL_COLOURS[setting['colour']])
+            curve.setTransform(QTransform.fromScale(1, self.vertical_scale * setting['gain']))
+            curve.setVisible(setting['visible'] and not self.xy)
+        self.xy_curve.setVisible(self.xy)
+
+    def clear(self):
+        for curve in self.curves[1:]:
+            curve.setData([])
+        self.xy_curve.setData([])
+
+    def draw(self, frame, x=None, sinc_display=None):
+        frame = frame[:, None] if frame.ndim == 1 else frame
+        if self.xy:
+            if frame.shape[1] > 1:
+                self.xy_curve.setData(frame[:, 0] * self.settings[0]['gain'], frame[:, 1] * self.settings[1]['gain'])
+            return
+        if sinc_display is not None:
+            x_start, x_end = self.plot_widget.viewRange()[0]
+            pixels = int(self.plot_widget.getViewBox().width())
+        for i, (curve, setting) in enumerate(zip(self.curves, self.settings)):
+            if not setting['visible'] or i >= frame.shape[1]:
+                continue
+            column = frame[:, i]
+            trace = None if sinc_display is None else sinc_display.reconstruct(column, x_start, x_end, pixels)
+            if trace is not None:
+                curve.setData(*trace)
+            elif x is None:
+                curve.setData(column)
+            else:
+                curve.setData(x, column)
+
+class ChannelPanel(QWidget):
+    # Controls for the ChannelDisplay given to attach(): the channel picked
+    # in the first combo is the one the colour, gain and visibility
+    # controls edit. Also holds the trigger source and XY mode, which
+    # `changed` reports.
+    changed = pyqtSignal()
+
+    def __init__(self, style=""):
+        super().__init__()
+        self.display = None
+        self.editing = False
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel("Channels:"))
+        row = QHBoxLayout()
+        self.channel_combo = QComboBox()
+        self.visible_check = QCheckBox("On")
+        row.addWidget(self.channel_combo)
+        row.addWidget(self.visible_check)
+        layout.addLayout(row)
+        row = QHBoxLayout()
+        self.gain_spin = QDoubleSpinBox()
+        self.gain_spin.setRange(0.01, 100)
+        self.gain_spin.setSingleStep(0.1)
+        self.gain_spin.setPrefix("x")
+        self.colour_combo = QComboBox()
+        self.colour_combo.addItems(CHANNEL_COLOURS)
+        row.addWidget(self.gain_spin)
+        row.addWidget(self.colour_combo)
+        layout.addLayout(row)
+        row = QHBoxLayout()
+        self.source_combo = QComboBox()
+        self.xy_check = QCheckBox("XY")
+        row.addWidget(QLabel("Trigger on"))
+        row.addWidget(self.source_combo)
+        row.addWidget(self.xy_check)
+        layout.addLayout(row)
+        for widget in (self.channel_combo, self.gain_spin, self.colour_combo, self.source_combo):
+            widget.setStyleSheet(style)
+
+    def attach(self, display):
+        self.display = display
+        self.channel_combo.currentIndexChanged.connect(self.show_channel)
+        self.visible_check.toggled.connect(self.edit_channel)
+        self.gain_spin.valueChanged.connect(self.edit_channel)
+        self.colour_combo.currentTextChanged.connect(self.edit_channel)
+        self.source_combo.currentIndexChanged.connect(lambda index: self.changed.emit())
+        self.xy_check.toggled.connect(self.toggle_xy)
+        self.set_channels(display.names)
+
+    def set_channels(self, names):
+        self.display.set_channels(names)
+        source = self.source_combo.currentIndex()
+        for combo in (self.channel_combo, self.source_combo):
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItems(names)
+            combo.blockSignals(False)
+        self.source_combo.setCurrentIndex(source if 0 <= source < len(names) else 0)
+        self.xy_check.setEnabled(len(names) > 1)
+        if len(names) < 2:
+            self.xy_check.setChecked(False)
+        self.show_channel(0)
+        self.changed.emit()
+
+    def source(self):
+        return max(0, self.source_combo.currentIndex())
+
+    def show_channel(self, index):
+        if index < 0:
+            return
+        setting = self.display.settings[index]
+        self.editing = True
+        self.visible_check.setChecked(setting['visible'])
+        self.gain_spin.setValue(setting['gain'])
+        self.colour_combo.setCurrentText(setting['colour'])
+        self.editing = False
+
+    def edit_channel(self, *args):
+        index = self.channel_combo.currentIndex()
+        if self.editing or index < 0:
+            return
+        self.display.settings[index] = {'colour': self.colour_combo.currentText(), 'gain': self.gain_spin.value(),
+                                        'visible': self.visible_check.isChecked()}
+        self.display.apply()
+
+    def toggle_xy(self, enabled):
+        self.display.xy = enabled
+        self.display.apply()
+        self.changed.emit()
@@ -0,0 +1,245 @@
+import sys
+import os
+import json
+import struct
+import threading
+import time
+import numpy as np
+
+# Log file layout:
+#   file header  'DLOG' + version
+#   chunk        'CHNK' + count + t_min + t_max, then the columns
+#                timestamps (float64), channel ids (uint16), values (float32)
+# <path>.idx holds one (offset, count, t_min, t_max) record per chunk and
+# <path>.json maps channel names to ids.
+FILE_MAGIC = b'DLOG'
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct('<4sI')
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEADER = struct.Struct('<4sIdd')
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('count', '<u4'), ('t_min', '<f8'), ('t_max', '<f8')])
+COLUMNS = (('timestamp', np.dtype('<f8')), ('channel', np.dtype('<u2')), ('value', np.dtype('<f4')))
+RECORD_BYTES = sum(dtype.itemsize for _, dtype in COLUMNS)
+
+def index_path(path):
+    return path + '.idx'
+
+def channels_path(path):
+    return path + '.json'
+
+def load_channels(path):
+    try:
+        with open(channels_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def scan_chunks(path):
+    # Rebuild the index from the chunk headers, seeking over the column data
+    records = []
+    with open(path, 'rb') as f:
+        magic, _ = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path} is not a data log")
+        offset = FILE_HEADER.size
+        size = os.fstat(f.fileno()).st_size
+        while offset + CHUNK_HEADER.size <= size:
+            f.seek(offset)
+            magic, count, t_min, t_max = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+            end = offset + CHUNK_HEADER.size + count * RECORD_BYTES
+            if magic != CHUNK_MAGIC or end > size:
+                break  # Truncated tail from an interrupted write
+            records.append((offset, count, t_min, t_max))
+            offset = end
+    return np.array(records, dtype=INDEX_DTYPE)
+
+class DataLogger:
+    def __init__(self, path, chunk_size=65536, flush_interval=5.0):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.timestamps = np.empty(chunk_size, dtype=COLUMNS[0][1])
+        self.channels = np.empty(chunk_size, dtype=COLUMNS[1][1])
+        self.values = np.empty(chunk_size, dtype=COLUMNS[2][1])
+        self.count = 0
+        self.last_flush = time.monotonic()
+        self.channel_ids = load_channels(path)
+
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if new_file:
+            self.file = open(path, 'ab')
+            self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+            self.file.flush()
+            if os.path.exists(index_path(path)):
+                os.remove(index_path(path))
+        else:
+            # Cut a chunk left half written by a crash, so new chunks follow
+            # the last complete one, and rebuild the index to match
+            records = scan_chunks(path)
+            end = FILE_HEADER.size
+            if len(records):
+                end = int(records['offset'][-1]) + CHUNK_HEADER.size + int(records['count'][-1]) * RECORD_BYTES
+            self.file = open(path, 'ab')
+            self.file.truncate(end)
+            self.file.seek(end)
+            records.tofile(index_path(path))
+        self.index_file = open(index_path(path), 'ab')
+        # Writes out what an idle logger holds every flush_interval
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+
+    def channel_id(self, name):
+        if name not in self.channel_ids:
+            self.channel_ids[name] = len(self.channel_ids)
+            with open(channels_path(self.path), 'w') as f:
+                json.dump(self.channel_ids, f)
+        return self.channel_ids[name]
+
+    def log(self, channel, value, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        self.log_many(channel, [value], [timestamp])
+
+    def log_many(self, channel, values, timestamps):
+        values = np.asarray(values)
+        timestamps = np.asarray(timestamps)
+        with self.lock:
+            if self.file.closed:
+                return  # Closed from another thread while this was measured
+            channel = self.channel_id(channel)
+            start = 0
+            while start < len(values):
+                n = min(len(values) - start, self.chunk_size - self.count)
+                end = self.count + n
+                self.timestamps[self.count:end] = timestamps[start:start + n]
+                self.channels[self.count:end] = channel
+                self.values[self.count:end] = values[start:start + n]
+                self.count = end
+                start += n
+                if self.count == self.chunk_size:
+                    self._flush()
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def log_measurements(self, prefix, measurements, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        for name, value in measurements.items():
+            self.log(f'{prefix}.{name}', value, timestamp)
+
+    def flush(self):
+        with self.lock:
+            if not self.file.closed:
+                self._flush()
+
+    def flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            with self.lock:
+                if self.count and time.monotonic() - self.last_flush >= self.flush_interval:
+                    self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        if self.count == 0:
+            return
+        n = self.count
+        t = self.timestamps[:n]
+        offset = self.file.tell()
+        self.file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, n, t.min(), t.max()))
+        self.file.write(t.tobytes())
+        self.file.write(self.channels[:n].tobytes())
+        self.file.write(self.values[:n].tobytes())
+        self.file.flush()
+        record = np.array([(offset, n, t.min(), t.max())], dtype=INDEX_DTYPE)
+        self.index_file.write(record.tobytes())
+        self.index_file.flush()
+        self.count = 0
+
+    def close(self):
+        self.stopped.set()
+        self.flusher.join()
+        with self.lock:
+            if self.file.closed:
+                return
+            self._flush()
+            self.file.close()
+            self.index_file.close()
+
+class LogReader:
+    def __init__(self, path):
+        self.path = path
+        self.channel_ids = load_channels(path)
+        self.channel_names = {v: k for k, v in self.channel_ids.items()}
+        try:
+            self.index = np.fromfile(index_path(path), dtype=INDEX_DTYPE)
+        except FileNotFoundError:
+            self.index = scan_chunks(path)
+
+    def time_span(self):
+        if len(self.index) == 0:
+            return None
+        return float(self.index['t_min'].min()), float(self.index['t_max'].max())
+
+    def read_chunk(self, f, record):
+        f.seek(int(record['offset']) + CHUNK_HEADER.size)
+        n = int(record['count'])
+        return [np.fromfile(f, dtype=dtype, count=n) for _, dtype in COLUMNS]
+
+    def query(self, t_start=None, t_end=None, channel=None):
+        # Only chunks overlapping [t_start, t_end] are read from disk
+        t_start = -np.inf if t_start is None else t_start
+        t_end = np.inf if t_end is None else t_end
+        selected = self.index[(self.index['t_max'] >= t_start) & (self.index['t_min'] <= t_end)]
+        channel_id = None
+        if channel is not None:
+            if channel not in self.channel_ids:
+                return np.empty(0), np.empty(0, dtype=np.float32)
+            channel_id = self.channel_ids[channel]
+        times = []
+        values = []
+        with open(self.path, 'rb') as f:
+            for record in selected:
+                t, c, v = self.read_chunk(f, record)
+                keep = (t >= t_start) & (t <= t_end)
+                if channel_id is not None:
+                    keep &= c == channel_id
+                times.append(t[keep])
+                values.append(v[keep])
+        if not times:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        return np.concatenate(times), np.concatenate(values)
+
+def plot_log(path, channel, t_start=None, t_end=None):
+    from PyQt5.QtWidgets import QApplication
+    import pyqtgraph as pg
+    reader = LogReader(path)
+    times, values = reader.query(t_start, t_end, channel)
+    app = QApplication(sys.argv)
+    plot_widget = pg.PlotWidget(title=f"{path}: {channel}")
+    plot_widget.setBackground('k')
+    plot_widget.showGrid(x=True, y=True)
+    plot_widget.setAxisItems({'bottom': pg.DateAxisItem()})
+    curve = plot_widget.plot(times, values, pen='r')
+    # Multi-day logs have far more points than pixels
+    curve.setDownsampling(auto=True, method='peak')
+    curve.setClipToView(True)
+    plot_widget.show()
+    sys.exit(app.exec_())
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python3 data_logger.py LOG [CHANNEL [START END]]")
+        sys.exit(1)
+    reader = LogReader(sys.argv[1])
+    if len(sys.argv) < 3:
+        span = reader.time_span()
+        print(f"{len(reader.index)} chunks, {int(reader.index['count'].sum())} readings")
+        if span is not None:
+            print(f"From {time.ctime(span[0])} to {time.ctime(span[1])}")
+        print("Channels:", ', '.join(reader.channel_ids))
+    else:
+        t_start = float(sys.argv[3]) if len(sys.argv) > 3 else None
+        t_end = float(sys.argv[4]) if len(sys.argv) > 4 else None
+        plot_log(sys.argv[1], sys.argv[2], t_start, t_end)
@@ -0,0 +1,64 @@
+import threading
+import time
+from PyQt5.QtCore import QTimer
+
+class DisplayScheduler:
+    # Acquisition hands every finished frame to submit(), from any thread.
+    # Only the newest one is kept, and a GUI timer draws it at most
+    # refresh_rate times a second; frames replaced before they were drawn
+    # are counted as skipped.
+    def __init__(self, render, refresh_rate=60):
+        self.render = render
+        self.lock = threading.Lock()
+        self.pending = None
+        self.submitted = 0
+        self.drawn = 0
+        self.skipped = 0
+        self.rate_start = time.monotonic()
+        self.rate_drawn = 0
+        self.rate_submitted = 0
+        self.fps = 0.0
+        self.input_rate = 0.0
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.tick)
+        self.set_refresh_rate(refresh_rate)
+
+    def set_refresh_rate(self, refresh_rate):
+        self.refresh_rate = refresh_rate
+        self.timer.setInterval(max(1, int(1000 / refresh_rate)))
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def submit(self, frame):
+        with self.lock:
+            if self.pending is not None:
+                self.skipped += 1
+            self.pending = frame
+            self.submitted += 1
+
+    def clear(self):
+        with self.lock:
+            self.pending = None
+
+    def tick(self):
+        with self.lock:
+            frame = self.pending
+            self.pending = None
+        if frame is not None:
+            self.render(frame)
+            self.drawn += 1
+        now = time.monotonic()
+        elapsed = now - self.rate_start
+        if elapsed >= 1.0:
+            self.fps = (self.drawn - self.rate_drawn) / elapsed
+            self.input_rate = (self.submitted - self.rate_submitted) / elapsed
+            self.rate_drawn = self.drawn
+            self.rate_submitted = self.submitted
+            self.rate_start = now
+
+    def stats_text(self):
+        return f"Display: {self.fps:.0f} fps, {self.input_rate:.0f} frames/s in, {self.skipped} skipped"
@@ -2,46 +2,135 @@
 #include <Arduino.h>
 
 #define SAMPLE_RATE 1000000 
-#define ADC_CHANNEL ADC1_CHANNEL_0 
 #define BUFFER_SIZE 2048 
 
-uint8_t adc_buffer[BUFFER_SIZE];
-volatile bool buffer_ready = false; 
-SemaphoreHandle_t buffer_semaphore;
+// Inputs sampled in turn and interleaved in each block, CH1 first.
+// SAMPLE_RATE is per channel and BUFFER_SIZE should be a multiple of CHANNELS.
+#define CHANNELS 1
+const adc1_channel_t adc_channels[] = {ADC1_CHANNEL_0, ADC1_CHANNEL_3, ADC1_CHANNEL_6, ADC1_CHANNEL_7};
+
+// Each block goes out as a frame (see serial_framing.py): sync word,
+// block counter, sample count, channels, flags, samples and, with
+// FRAME_CHECKSUM, a 16-bit sum of the samples
+#define FRAME_CHECKSUM
+#define FLAG_CHECKSUM 0x01
+
+struct __attribute__((packed)) FrameHeader 
+{
+  uint8_t sync[4];
+  uint16_t counter;
+  uint16_t count;
+  uint8_t channels;
+  uint8_t flags;
+};
+
+// Uncomment to stream a little-endian uint32 counter instead of samples,
+// as fast as the link allows, for usb-test.py to check for lost bytes
+// #define TEST_PATTERN
+
+// Ping-pong buffers: the sampler fills one while the sender writes out
+// the other, and buffer indices pass between them through the queues, so
+// a buffer is never written while it is being sent
+#define BUFFERS 2
+
+struct Block 
+{
+  uint8_t index;
+  uint16_t counter;
+};
+
+uint8_t adc_buffers[BUFFERS][BUFFER_SIZE];
+QueueHandle_t filled_queue;  // Blocks waiting to be sent
+QueueHandle_t free_queue;    // Buffers the sender has finished with
 
 void sample_adc_task(void *pvParameters) 
 {
+  uint16_t counter = 0;
+  Block block;
   while (true) 
   {
+    // When the link is behind, reuse the block still waiting to be sent;
+    // the gap in the counter tells the host it was dropped. The sender may
+    // take that block first, so only wait a tick before looking for a
+    // free buffer again.
+    while (xQueueReceive(free_queue, &block.index, 0) != pdTRUE &&
+           xQueueReceive(filled_queue, &block, 1) != pdTRUE) 
+    {
+    }
+    uint8_t *buffer = adc_buffers[block.index];
     for (int i = 0; i < BUFFER_SIZE; i++) 
     {
-      uint16_t raw_value = adc1_get_raw(ADC_CHANNEL);
-      adc_buffer[i] = (raw_value >> 4);
+      uint16_t raw_value = adc1_get_raw(adc_channels[i % CHANNELS]);
+      buffer[i] = (raw_value >> 4);
     }
-    buffer_ready = true;
-    xSemaphoreGive(buffer_semaphore);
-    vTaskDelay(pdMS_TO_TICKS(1000 * BUFFER_SIZE / SAMPLE_RATE));
+    block.counter = ++counter;
+    xQueueSend(filled_queue, &block, portMAX_DELAY);
+    vTaskDelay(pdMS_TO_TICKS(1000 * (BUFFER_SIZE / CHANNELS) / SAMPLE_RATE));
   }
 }
 
 void send_serial_task(void *pvParameters) 
 {
+  Block block;
+  while (true) 
+  {
+    if (xQueueReceive(filled_queue, &block, portMAX_DELAY) == pdTRUE) 
+    {
+      const uint8_t *buffer = adc_buffers[block.index];
+      FrameHeader header = {{0xA5, 0x5A, 0xC3, 0x3C}, block.counter, BUFFER_SIZE, CHANNELS, 0};
+#ifdef FRAME_CHECKSUM
+      header.flags |= FLAG_CHECKSUM;
+      uint16_t checksum = 0;
+      for (int i = 0; i < BUFFER_SIZE; i++) 
+      {
+        checksum += buffer[i];
+      }
+#endif
+      Serial.write((uint8_t *)&header, sizeof(header));
+      Serial.write(buffer, BUFFER_SIZE);
+#ifdef FRAME_CHECKSUM
+      Serial.write((uint8_t *)&checksum, sizeof(checksum));
+#endif
+      xQueueSend(free_queue, &block.index, portMAX_DELAY);
+    }
+  }
+}
+
+#ifdef TEST_PATTERN
+void send_test_pattern_task(void *pvParameters) 
+{
+  uint32_t counter = 0;
+  uint32_t words[BUFFER_SIZE / 4];
   while (true) 
   {
-    if (xSemaphoreTake(buffer_semaphore, portMAX_DELAY) == pdTRUE) 
+    for (int i = 0; i < BUFFER_SIZE / 4; i++) 
     {
-      Serial.write(adc_buffer, sizeof(adc_buffer));
+      words[i] = counter++;
     }
+    Serial.write((uint8_t *)words, sizeof(words));
   }
 }
+#endif
 
 void setup() 
 {
   Serial.begin(2000000);
+#ifdef TEST_PATTERN
+  xTaskCreatePinnedToCore(send_test_pattern_task, "Test Pattern", 8192, NULL, 1, NULL, 0);
+  return;
+#endif
   pinMode(1, INPUT);
-  adc1_config_width(ADC_WIDTH_BIT_12)
-  adc1_config_channel_atten(ADC_CHANNEL, ADC_ATTEN_DB_11);
-  buffer_semaphore = xSemaphoreCreateBinary();
+  adc1_config_width(ADC_WIDTH_BIT_12);
+  for (int i = 0; i < CHANNELS; i++) 
+  {
+    adc1_config_channel_atten(adc_channels[i], ADC_ATTEN_DB_11);
+  }
+  filled_queue = xQueueCreate(BUFFERS, sizeof(Block));
+  free_queue = xQueueCreate(BUFFERS, sizeof(uint8_t));
+  for (uint8_t i = 0; i < BUFFERS; i++) 
+  {
+    xQueueSend(free_queue, &i, 0);
+  }
   xTaskCreatePinnedToCore(sample_adc_task, "ADC Sampling", 4096, NULL, 1, NULL, 1);
   xTaskCreatePinnedToCore(send_serial_task, "Serial Sending", 4096, NULL, 1, NULL, 0);
 }
@@ -0,0 +1,339 @@
+import sys
+import time
+import argparse
+import numpy as np
+from protocol_decode import Thresholder
+from sinx_interp import TAPS, MAX_FACTOR, sinc_interpolate
+
+BINS_X = 256          # Across UI_SPAN unit intervals
+BINS_Y = 128
+UI_SPAN = 2           # Unit intervals shown, -0.5 to 1.5 with the eye centred on 0.5
+LOCK_EDGES = 64       # Edges needed before the bit clock is first estimated
+LOCK_SAMPLES = 1 << 17
+SEGMENT = 8192        # Samples handled at a time, which bounds the working memory
+POINTS_PER_UI = 32    # Slower links are sin(x)/x interpolated up to about this density
+CENTRE_WINDOW = 0.1   # Part of the UI around its centre used for the eye height
+TRACKING = 0.25       # How far each block pulls the recovered clock towards its own fit
+TRACK_SPAN = 32       # UIs of edges, over as many blocks as it takes, behind each fit that moves the clock
+MAX_DRIFT = 0.05      # Fits whose UI is further off than this are not tracked
+
+def edge_times(samples, levels, previous, position):
+    # Sub-sample times of the level changes, interpolated between the two
+    # samples either side of the threshold; `previous` is the last sample,
+    # level and threshold of the block before, at `position` - 1
+    values = np.concatenate(([previous[0]], samples))
+    levels = np.concatenate(([previous[1]], levels))
+    index = np.flatnonzero(levels[1:] != levels[:-1])
+    # The level only changes once the signal leaves the hysteresis band,
+    # which can be a few samples after it crossed the threshold itself
+    above = values >= previous[2]
+    crossed = np.where(above[1:] != above[:-1], np.arange(len(values) - 1), -1)
+    np.maximum.accumulate(crossed, out=crossed)
+    index = np.where(crossed[index] >= 0, crossed[index], index)
+    a = values[index]
+    b = values[index + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.clip(np.nan_to_num((previous[2] - a) / (b - a), nan=0.5), 0, 1)
+    return position - 1 + index + fraction
+
+def estimate_unit_interval(edges):
+    # The shortest common edge spacing, refined by taking every spacing as
+    # a whole number of it
+    gaps = np.diff(edges)
+    gaps = gaps[gaps > 0.5]
+    if len(gaps) < 2:
+        return None
+    shortest = np.percentile(gaps, 10)
+    ui = np.median(gaps[gaps < 1.5 * shortest])
+    bits = np.maximum(1, np.round(gaps / ui))
+    return gaps.sum() / bits.sum()
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.low = np.inf
+        self.high = -np.inf
+
+    def add(self, x):
+        if len(x):
+            self.count += len(x)
+            self.total += float(np.sum(x, dtype=np.float64))
+            self.squares += float(np.sum(np.square(x, dtype=np.float64)))
+            self.low = min(self.low, float(np.min(x)))
+            self.high = max(self.high, float(np.max(x)))
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def std(self):
+        if not self.count:
+            return 0.0
+        return max(0.0, self.squares / self.count - self.mean() ** 2) ** 0.5
+
+class EyeDiagram:
+    # Builds an eye from a stream, block by block, in constant memory: the
+    # bit clock is recovered from the data edges, every sample is placed by
+    # its phase in the unit interval (UI) and counted into a fixed
+    # BINS_Y x BINS_X density map, and the eye height and TIE jitter are
+    # kept as running sums. Until LOCK_EDGES edges have been seen the
+    # samples are held back to find the threshold, UI and vertical range.
+    # Without a bit rate the UI is taken from the shortest edge spacing.
+    def __init__(self, sample_rate, bit_rate=None, level=None, y_range=None, tracking=TRACKING):
+        self.sample_rate = sample_rate
+        self.bit_rate = bit_rate
+        self.level = level
+        self.y_range = y_range
+        self.tracking = tracking
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.density = np.zeros((BINS_Y, BINS_X), dtype=np.int64)
+        self.position = 0
+        self.pending = []
+        self.locked = False
+        self.ui = None
+        self.reference = 0.0
+        self.bit_count = 0.0  # UIs the reference has moved on since lock
+        self.track_edges = []
+        self.track_bits = []
+        self.factor = 1
+        self.history = np.empty(0, dtype=np.float32)
+        self.done = 0.0
+        self.previous = None
+        self.thresholder = None
+        self.range = self.y_range
+        self.unit_intervals = 0
+        self.clipped = 0
+        self.tie = RunningStats()
+        self.highs = RunningStats()
+        self.lows = RunningStats()
+
+    def feed(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        for i in range(0, len(block), SEGMENT):
+            if self.locked:
+                self.accumulate(block[i:i + SEGMENT])
+            else:
+                self.wait_for_lock(block[i:i + SEGMENT])
+
+    def wait_for_lock(self, segment):
+        samples = np.concatenate(self.pending + [segment])[-LOCK_SAMPLES:]
+        start = self.position + len(segment) - len(samples)
+        if not self.lock(samples, start):
+            self.pending = [samples]
+            self.position += len(segment)
+            return
+        self.pending = []
+        self.position = start
+        for i in range(0, len(samples), SEGMENT):
+            self.accumulate(samples[i:i + SEGMENT])
+
+    def lock(self, samples, start):
+        low, high = np.percentile(samples, [1, 99])
+        if high - low < 1e-3:
+            return False
+        level = (low + high) / 2 if self.level is None else self.level
+        thresholder = Thresholder(level, (high - low) / 10)
+        levels = thresholder.process(samples)
+        edges = edge_times(samples[1:], levels[1:], (samples[0], levels[0], level), start + 1)
+        if len(edges) < LOCK_EDGES:
+            return False
+        ui = self.sample_rate / self.bit_rate if self.bit_rate else estimate_unit_interval(edges)
+        if ui is None or ui < 1:
+            return False
+        bits = np.round((edges - edges[0]) / ui)
+        self.ui, self.reference = np.polyfit(bits, edges, 1)
+        self.thresholder = Thresholder(level, thresholder.hysteresis)
+        self.factor = min(MAX_FACTOR, 1 << max(0, int(np.ceil(np.log2(POINTS_PER_UI / ui)))))
+        if self.range is None:
+            margin = (high - low) / 4
+            self.range = (low - margin, high + margin)
+        self.locked = True
+        return True
+
+    def accumulate(self, block):
+        position = self.position
+        self.position += len(block)
+        levels = self.thresholder.process(block)
+        if self.previous is None:
+            self.previous = (block[0], levels[0], self.thresholder.level)
+        edges = edge_times(block, levels, self.previous, position)
+        self.previous = (block[-1], levels[-1], self.thresholder.level)
+        self.track(edges)
+
+        # Band-limited points between the samples, as the eye is usually
+        # sampled only a few times per UI. The last TAPS samples wait for
+        # the next block, so the interpolation runs on as if over one array.
+        data = np.concatenate((self.history, block))
+        base = self.position - len(data)
+        y = sinc_interpolate(data, self.factor) if len(data) > 1 else data
+        end = self.position - TAPS
+        first = max(0, int(np.ceil((self.done - base) * self.factor)))
+        last = max(first, (end - base) * self.factor)
+        self.done = max(self.done, end)
+        self.history = data[-2 * TAPS:]
+        self.add_points(base + first / self.factor, y[first:last])
+
+    def track(self, edges):
+        # Edges are collected with their bit numbers, counted from lock so
+        # they line up across blocks, until they span TRACK_SPAN UIs; short
+        # blocks hold too few edges for a fit of their own
+        if not len(edges):
+            return
+        bits = np.round((edges - self.reference) / self.ui)
+        self.track_edges.append(edges)
+        self.track_bits.append(bits + self.bit_count)
+        if self.track_bits[-1][-1] - self.track_bits[0][0] >= TRACK_SPAN:
+            span_edges = np.concatenate(self.track_edges)
+            span_bits = np.concatenate(self.track_bits)
+            self.track_edges = []
+            self.track_bits = []
+            ui, reference = np.polyfit(span_bits - span_bits[0], span_edges, 1)
+            if abs(ui - self.ui) < MAX_DRIFT * self.ui:
+                # Move the clock part way to the fit, keeping the phase at
+                # the first edge of the span continuous
+                first = span_bits[0] - self.bit_count
+                start = self.reference + first * self.ui
+                start += self.tracking * (reference - start)
+                self.ui += self.tracking * (ui - self.ui)
+                self.reference = start - first * self.ui
+                bits = np.round((edges - self.reference) / self.ui)
+        self.tie.add((edges - self.reference - bits * self.ui) / self.ui)
+        # Keep the reference near the stream position so phases stay exact
+        shift = np.floor((edges[-1] - self.reference) / self.ui)
+        self.reference += shift * self.ui
+        self.bit_count += shift
+
+    def add_points(self, start, y):
+        # y holds points 1 / factor samples apart from sample `start` on.
+        # Phases are float32 relative to the nearby reference edge, and
+        # points outside the vertical range go to one extra bin, so there
+        # is no float64 or masked copy of the points.
+        step = 1 / (self.factor * self.ui)
+        phase = np.arange(len(y), dtype=np.float32) * np.float32(step)
+        phase += np.float32((start - self.reference) / self.ui)
+        u = phase + np.float32(0.5)
+        u -= UI_SPAN * np.floor(u * np.float32(1 / UI_SPAN))
+        column = np.minimum((u * np.float32(BINS_X / UI_SPAN)).astype(np.intp), BINS_X - 1)
+        low, high = self.range
+        row = (y - np.float32(low)) * np.float32(BINS_Y / (high - low))
+        inside = (row >= 0) & (row < BINS_Y)
+        index = np.where(inside, row.astype(np.intp) * BINS_X + column, BINS_Y * BINS_X)
+        counts = np.bincount(index, minlength=BINS_Y * BINS_X + 1)
+        self.density += counts[:-1].reshape(BINS_Y, BINS_X)
+        self.clipped += int(counts[-1])
+        self.unit_intervals += len(y) * step
+        phase -= np.floor(phase)
+        centre = np.abs(phase - np.float32(0.5)) < CENTRE_WINDOW / 2
+        high_level = y > self.thresholder.level
+        self.highs.add(y[centre & high_level])
+        self.lows.add(y[centre & ~high_level])
+
+    def eye_height(self):
+        # Opening at the centre of the UI with 3 sigma of noise on each level
+        if not self.highs.count or not self.lows.count:
+            return 0.0
+        return max(0.0, (self.highs.mean() - 3 * self.highs.std()) - (self.lows.mean() + 3 * self.lows.std()))
+
+    def eye_width(self):
+        # UI less the peak-to-peak TIE, in seconds
+        if not self.tie.count:
+            return 0.0
+        return max(0.0, 1 - (self.tie.high - self.tie.low)) * self.ui / self.sample_rate
+
+    def stats(self):
+        return {
+            'locked': self.locked,
+            'bit_rate': self.sample_rate / self.ui if self.locked else 0.0,
+            'unit_intervals': int(self.unit_intervals),
+            'eye_height': self.eye_height(),
+            'eye_width': self.eye_width(),
+            'tie_rms': self.tie.std() * self.ui / self.sample_rate if self.locked else 0.0,
+            'tie_pp': (self.tie.high - self.tie.low) * self.ui / self.sample_rate if self.tie.count else 0.0,
+        }
+
+    def summary(self):
+        if not self.locked:
+            return "Eye: waiting for edges"
+        s = self.stats()
+        return (f"Eye: {s['bit_rate'] / 1e3:.1f} kbit/s, {s['unit_intervals']} UI, height {s['eye_height']:.3f} V, "
+                f"width {s['eye_width'] * 1e6:.2f} us, TIE {s['tie_rms'] * 1e9:.0f} ns rms "
+                f"{s['tie_pp'] * 1e9:.0f} ns p-p")
+
+class EyeDisplay:
+    # Density map as an image in the plot, x in UI and y in volts, on a
+    # log scale so rare paths still show
+    def __init__(self, plot_widget):
+        import pyqtgraph as pg
+        self.plot_widget = plot_widget
+        self.image = pg.ImageItem()
+        self.image.setLookupTable(pg.colormap.get('inferno').getLookupTable(nPts=256))
+        self.image.setZValue(-1)
+        self.image.setVisible(False)
+        plot_widget.addItem(self.image)
+
+    def show(self, eye):
+        if not eye.locked:
+            return
+        from PyQt5.QtCore import QRectF
+        low, high = eye.range
+        # ImageItem's first axis is x
+        self.image.setImage(np.log1p(eye.density.T.astype(np.float32)), autoLevels=True)
+        self.image.setRect(QRectF(-0.5, low, UI_SPAN, high - low))
+        self.image.setVisible(True)
+
+    def clear(self):
+        self.image.clear()
+        self.image.setVisible(False)
+
+def nrz_waveform(bits, samples_per_bit, jitter=0.02, noise=0.05, rise=0.25, seed=0):
+    # Test signal: 0 / 3.3 V NRZ with linear edges `rise` UI long, Gaussian
+    # edge jitter in UI and noise in volts
+    rng = np.random.default_rng(seed)
+    data = 3.3 * rng.integers(0, 2, bits + 1)
+    edges = np.arange(1, bits + 1) + rng.normal(0, jitter, bits)
+    t = np.arange(int(bits * samples_per_bit)) / samples_per_bit
+    nearest = np.clip(np.round(t).astype(np.intp), 1, bits) - 1
+    step = np.clip((t - edges[nearest]) / rise + 0.5, 0, 1)
+    signal = data[nearest] + (data[nearest + 1] - data[nearest]) * step
+    return (signal + rng.normal(0, noise, len(signal))).astype(np.float32)
+
+def benchmark(sample_rate=1000000, bit_rate=115200, bits=200000, chunk=4096):
+    signal = nrz_waveform(bits, sample_rate / bit_rate)
+    eye = EyeDiagram(sample_rate)
+    start = time.perf_counter()
+    for i in range(0, len(signal), chunk):
+        eye.feed(signal[i:i + chunk])
+    elapsed = time.perf_counter() - start
+    print(eye.summary())
+    print(f"{len(signal)} samples in {elapsed * 1e3:.0f} ms ({len(signal) / elapsed / 1e6:.1f} MS/s, "
+          f"{len(signal) / elapsed / sample_rate:.0f}x real time) at x{eye.factor} interpolation")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Eye diagram and jitter of a serial signal in a recording")
+    parser.add_argument('recording', nargs='?', help="omit to run a benchmark on a synthetic signal")
+    parser.add_argument('--column', type=int, default=0)
+    parser.add_argument('--bit-rate', type=float, help="recovered from the edges when omitted")
+    parser.add_argument('--level', type=float, help="threshold in volts, default mid-swing")
+    parser.add_argument('--image', help="also save the eye as a PNG")
+    args = parser.parse_args()
+    if args.recording is None:
+        benchmark()
+        sys.exit(0)
+    from waveform_export import load_waveform
+    data, metadata = load_waveform(args.recording)
+    if data.ndim == 1:
+        data = data[:, None]
+    eye = EyeDiagram(metadata.get('sample_rate', 1000000), args.bit_rate, args.level)
+    for i in range(0, len(data), 1 << 20):
+        eye.feed(data[i:i + (1 << 20), args.column])
+    print(eye.summary())
+    if args.image and eye.locked:
+        import pyqtgraph as pg
+        image = np.log1p(eye.density[::-1].astype(np.float32))
+        image = pg.colormap.get('inferno').map(image / max(image.max(), 1e-9), mode='byte')
+        from PyQt5.QtGui import QImage
+        QImage(image.tobytes(), BINS_X, BINS_Y, 4 * BINS_X, QImage.Format_RGBA8888).save(args.image)
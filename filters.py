@@ -0,0 +1,225 @@
+import numpy as np
+
+FILTER_TYPES = ("Off", "Moving average", "DC removal", "FIR low-pass", "FIR high-pass",
+                "Biquad low-pass", "Biquad high-pass")
+
+# settling_samples() is how many samples of input a filter needs before
+# its state no longer depends on where it started: exact for the FIR and
+# moving average, down to SETTLED of the start for the recursive filters
+SETTLED = 1e-3
+
+def grow(buffer, n):
+    return buffer if len(buffer) >= n else np.empty(n, dtype=buffer.dtype)
+
+def fir_taps(sample_rate, cutoff, taps, highpass=False):
+    taps = int(taps) | 1  # Odd length so the high-pass inversion is valid
+    fc = cutoff / sample_rate
+    k = np.arange(taps) - (taps - 1) / 2
+    h = 2 * fc * np.sinc(2 * fc * k) * np.hamming(taps)
+    h /= h.sum()
+    if highpass:
+        h = -h
+        h[(taps - 1) // 2] += 1
+    return h
+
+class FIRFilter:
+    def __init__(self, taps):
+        self.taps = np.asarray(taps, dtype=np.float64)
+        self.history = np.zeros(len(self.taps) - 1)
+        self.ext = np.empty(0)
+        self.out = np.empty(0, dtype=np.float32)
+
+    def settling_samples(self):
+        return len(self.history)
+
+    def process(self, x):
+        n = len(x)
+        if n == 0:
+            return self.out[:0]  # np.convolve would swap its arguments
+        h = len(self.history)
+        self.ext = grow(self.ext, n + h)
+        self.out = grow(self.out, n)
+        ext = self.ext[:n + h]
+        ext[:h] = self.history
+        ext[h:] = x
+        out = self.out[:n]
+        # np.convolve has no out=; a windowed matmul into the buffer is
+        # about twice as slow, so only its result is copied in
+        out[:] = np.convolve(ext, self.taps, 'valid')
+        self.history[:] = ext[n:]
+        return out
+
+def biquad_coefficients(sample_rate, cutoff, q=0.7071, highpass=False):
+    # RBJ audio EQ cookbook low/high-pass
+    w0 = 2 * np.pi * cutoff / sample_rate
+    alpha = np.sin(w0) / (2 * q)
+    cos_w0 = np.cos(w0)
+    if highpass:
+        b = np.array([(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2])
+    else:
+        b = np.array([(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2])
+    a = np.array([1 + alpha, -2 * cos_w0, 1 - alpha])
+    return b / a[0], a / a[0]
+
+class IIRFilter:
+    # Direct form II transposed, evaluated a sub-block at a time as
+    # y = T x + O s and s' = A^L s + G x. The matrices are built once per
+    # configuration, so a block costs a few matrix products instead of a
+    # Python loop per sample.
+    def __init__(self, b, a, sub_block=64):
+        b = np.asarray(b, dtype=np.float64)
+        a = np.asarray(a, dtype=np.float64)
+        order = len(a) - 1
+        b = np.concatenate((b, np.zeros(order + 1 - len(b))))
+        A = np.zeros((order, order))
+        A[:, 0] = -a[1:]
+        A[:-1, 1:] = np.eye(order - 1)
+        B = b[1:] - a[1:] * b[0]
+        L = sub_block
+        powers = np.empty((L + 1, order, order))
+        powers[0] = np.eye(order)
+        for k in range(1, L + 1):
+            powers[k] = powers[k - 1] @ A
+        impulse = np.concatenate(([b[0]], powers[:L - 1, 0, :] @ B))
+        idx = np.arange(L)
+        lag = idx[:, None] - idx[None, :]
+        self.T = np.where(lag >= 0, impulse[np.clip(lag, 0, None)], 0.0)
+        self.O = powers[:L, 0, :]
+        self.G = (powers[L - 1::-1] @ B).T  # Column j is A^(L-1-j) B
+        self.powers = powers
+        self.L = L
+        self.state = np.zeros(order)
+        self.out = np.empty(0, dtype=np.float32)
+        self.radius = float(np.max(np.abs(np.linalg.eigvals(A))))
+
+    def settling_samples(self):
+        return int(np.ceil(np.log(SETTLED) / np.log(self.radius)))
+
+    def process(self, x):
+        n = len(x)
+        L = self.L
+        self.out = grow(self.out, n)
+        out = self.out[:n]
+        full = n // L * L
+        if full:
+            X = np.asarray(x[:full], dtype=np.float64).reshape(-1, L)
+            drive = X @ self.G.T
+            AL = self.powers[L]
+            states = np.empty((len(X), len(self.state)))
+            s = self.state
+            for i in range(len(X)):
+                states[i] = s
+                s = AL @ s + drive[i]
+            self.state = s
+            out[:full] = (X @ self.T.T + states @ self.O.T).ravel()
+        r = n - full
+        if r:
+            xr = np.asarray(x[full:], dtype=np.float64)
+            out[full:] = self.T[:r, :r] @ xr + self.O[:r] @ self.state
+            self.state = self.powers[r] @ self.state + self.G[:, L - r:] @ xr
+        return out
+
+class MovingAverage:
+    # Keeps the last window - 1 samples in a ring and their running sum, so
+    # a block only touches the samples entering and leaving the window
+    def __init__(self, window):
+        self.window = max(1, int(window))
+        self.ring = np.zeros(self.window - 1)
+        self.head = 0  # Oldest sample in the ring
+        self.total = 0.0
+        self.leaving = np.empty(0)
+        self.sums = np.empty(0)
+        self.out = np.empty(0, dtype=np.float32)
+
+    def settling_samples(self):
+        return self.window - 1
+
+    def process(self, x):
+        n = len(x)
+        if n == 0:
+            return self.out[:0]
+        ring = self.ring
+        k = len(ring)
+        self.leaving = grow(self.leaving, n)
+        leaving = self.leaving[:n]
+        # leaving[i] drops out of the window as x[i] comes in
+        if n <= k:
+            first = min(n, k - self.head)
+            leaving[:first] = ring[self.head:self.head + first]
+            leaving[first:] = ring[:n - first]
+            ring[self.head:self.head + first] = x[:first]
+            ring[:n - first] = x[first:]
+            wrapped = self.head + n >= k
+            self.head = (self.head + n) % k
+        else:
+            leaving[:k - self.head] = ring[self.head:]
+            leaving[k - self.head:k] = ring[:self.head]
+            leaving[k:] = x[:n - k]
+            ring[:] = x[n - k:]
+            wrapped = True
+            self.head = 0
+        self.sums = grow(self.sums, n)
+        sums = self.sums[:n]
+        np.subtract(x, leaving, out=sums)
+        np.cumsum(sums, out=sums)
+        sums += leaving
+        sums += self.total
+        if wrapped:
+            # Resum once per pass over the ring so rounding can't build up
+            self.total = float(np.sum(ring))
+        else:
+            self.total = float(sums[-1] - leaving[-1])
+        self.out = grow(self.out, n)
+        out = self.out[:n]
+        np.divide(sums, self.window, out=out, casting='unsafe')
+        return out
+
+class DCRemoval(IIRFilter):
+    # x minus a per-sample one-pole average of x, a (1 - z^-1) / (1 - a z^-1).
+    # The average starts at the first sample rather than at zero.
+    def __init__(self, sample_rate, cutoff):
+        self.decay = np.exp(-2 * np.pi * cutoff / sample_rate)
+        super().__init__([self.decay, -self.decay], [1.0, -self.decay])
+        self.started = False
+
+    def process(self, x):
+        if len(x) and not self.started:
+            self.state[:] = -self.decay * float(x[0])
+            self.started = True
+        return super().process(x)
+
+def make_filter(kind, sample_rate, cutoff, taps=63):
+    if kind == "Moving average":
+        # -3 dB point of an N-sample boxcar is about 0.443 * fs / N
+        return MovingAverage(round(0.443 * sample_rate / cutoff))
+    if kind == "DC removal":
+        return DCRemoval(sample_rate, cutoff)
+    if kind in ("FIR low-pass", "FIR high-pass"):
+        return FIRFilter(fir_taps(sample_rate, cutoff, taps, highpass=kind == "FIR high-pass"))
+    if kind in ("Biquad low-pass", "Biquad high-pass"):
+        return IIRFilter(*biquad_coefficients(sample_rate, cutoff, highpass=kind == "Biquad high-pass"))
+    return None
+
+class FilterStage:
+    # Streaming filter for the acquisition path; reconfigure() rebuilds the
+    # coefficients and resets the carried state.
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.kind = "Off"
+        self.cutoff = sample_rate / 20
+        self.filter = None
+
+    def reconfigure(self, kind=None, cutoff=None):
+        if kind is not None:
+            self.kind = kind
+        if cutoff is not None:
+            self.cutoff = min(cutoff, self.sample_rate * 0.49)
+        self.filter = make_filter(self.kind, self.sample_rate, self.cutoff)
+
+    def settling_samples(self):
+        return 0 if self.filter is None else self.filter.settling_samples()
+
+    def process(self, x):
+        if self.filter is None:
+            return x
+        return self.filter.process(x)
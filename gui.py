@@ -5,15 +5,17 @@ import pyqtgraph as pg
 import numpy as np
 import socket
 import struct
+from calibration import Calibration, LutDecoder
 
 class WorkerSignals(QObject):
     plot_data = pyqtSignal(np.ndarray)
 
 class DataReceiver(QRunnable):
-    def __init__(self, client_socket, expected_bytes):
+    def __init__(self, client_socket, expected_bytes, decoder):
         super().__init__()
         self.client_socket = client_socket
         self.expected_bytes = expected_bytes
+        self.decoder = decoder
         self.signals = WorkerSignals()
         self.received_data = []
 
@@ -29,7 +31,7 @@ class DataReceiver(QRunnable):
                 bytes_received += len(data)
             if bytes_received >= self.expected_bytes:
                 received_data_array = np.frombuffer(received_data, dtype=np.uint16)
-                received_data_array = received_data_array.astype(np.float16) * 5 / 4096
+                received_data_array = self.decoder.decode(received_data_array, reuse=False)
                 self.signals.plot_data.emit(received_data_array)
                 self.received_data.extend(received_data_array)
 
@@ -53,7 +55,7 @@ class Oscilloscope(QMainWindow):
         self.plot_widget.setMouseEnabled(y=False)  
         self.plot_widget.setYRange(-5, 5)
         main_layout.addWidget(self.plot_widget)
-        worker = DataReceiver(self.client_socket, 4000)
+        worker = DataReceiver(self.client_socket, 4000, LutDecoder(Calibration.load('pi')))
         worker.signals.plot_data.connect(self.update_plot)
         QThreadPool.globalInstance().start(worker)
 
@@ -1,37 +1,146 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QFileDialog, QDial, QLabel,QMessageBox
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QFileDialog, QDial, QLabel,QMessageBox, QComboBox, QDoubleSpinBox, QLineEdit, QCheckBox
 import pyqtgraph as pg
 import numpy as np
-from PyQt5.QtCore import QTimer, QObject, pyqtSignal, QRunnable, QThreadPool
+from PyQt5.QtCore import QTimer, QRunnable, QThreadPool
 from PyQt5 import QtCore, QtGui, QtWidgets
 import socket
 import struct
-
-class WorkerSignals(QObject):
-    plot_data = pyqtSignal(np.ndarray)
-
-class DataReceiver(QRunnable):
-    def __init__(self, client_socket, expected_bytes):
+import time
+import os
+import threading
+from collections import deque
+from data_logger import DataLogger
+from waveform_export import EXPORT_FILTERS, ExportWorker, WaveformRecorder, load_waveform
+from measurements import measure
+from calibration import Calibration, LutDecoder
+from filters import FILTER_TYPES
+from math_channels import MathChannel
+from mask_test import MaskTest
+from display_scheduler import DisplayScheduler
+from shm_ring import SharedRing
+from pipeline import ProcessingPipeline
+from strip_chart import StripChart
+from trigger import SWEEP_MODES, Trigger
+from channels import ChannelDisplay, ChannelPanel, ChannelStream, channel_names
+from eye_diagram import EyeDiagram, EyeDisplay
+from link_profiles import PIPE_RATE, LinkTuner, configure_socket, profile_from_argv, queued_bytes
+
+SAMPLE_RATE = 2500000  # One sample every 2/5000000 s, shared by the interleaved channels
+FRAME_LENGTH = 2000
+
+class Receiver(QRunnable):
+    # One receiver lives as long as the connection. Stop pauses it rather
+    # than ending it: a recv() already waiting can't be interrupted, and a
+    # second receiver on the same socket would split blocks with the first.
+    def __init__(self, handler):
         super().__init__()
+        self.handler = handler
+        self.running = True
+        self.error = None
+        self.active = threading.Event()
+        self.active.set()
+
+    def pause(self):
+        self.active.clear()
+
+    def resume(self):
+        self.error = None
+        self.active.set()
+
+    def stop(self):
+        self.running = False
+        self.active.set()
+
+    def wait_active(self):
+        # False once the receiver is stopped
+        while self.running and not self.active.wait(0.1):
+            pass
+        return self.running
+
+    def deliver(self, data):
+        if not self.active.is_set():
+            return  # Arrived after Stop
+        try:
+            self.handler(data)
+        except Exception as e:
+            # Reported on the display; letting it end run() would stop
+            # acquisition with nothing shown
+            error = f"{type(e).__name__}: {e}"
+            if error != self.error:
+                print(f"Error processing block: {error}")
+            self.error = error
+
+class DataReceiver(Receiver):
+    # Blocks are handed to `handler` on this thread; the display picks up
+    # finished frames through the DisplayScheduler instead of one Qt
+    # signal per block. The tuner sets the block size and is told how
+    # much is still queued after each block.
+    def __init__(self, client_socket, tuner, decoder, handler):
+        super().__init__(handler)
         self.client_socket = client_socket
-        self.expected_bytes = expected_bytes
-        self.signals = WorkerSignals()
+        self.tuner = tuner
+        self.decoder = decoder
 
     def run(self):
-        while True:
+        while self.wait_active():
+            expected_bytes = self.tuner.block_bytes
             received_data = b''
             bytes_received = 0
-            while bytes_received < self.expected_bytes:
-                data = self.client_socket.recv(self.expected_bytes - bytes_received)
+            while bytes_received < expected_bytes:
+                try:
+                    data = self.client_socket.recv(expected_bytes - bytes_received)
+                except OSError:
+                    return  # Socket shut down on close
                 if not data:
-                    break
+                    return  # Server closed the connection
                 received_data += data
                 bytes_received += len(data)
-            if bytes_received >= self.expected_bytes:
-                received_data_array = np.frombuffer(received_data, dtype=np.uint16)
-                received_data_array = received_data_array.astype(np.float16) * 5 / 4096
-                self.signals.plot_data.emit(received_data_array)
-                self.received_data.extend(received_data_array)
+            self.tuner.update(bytes_received, queued_bytes(self.client_socket.fileno()))
+            received_data_array = np.frombuffer(received_data, dtype=np.uint16)
+            # Fresh array, frames built from it outlive this block
+            received_data_array = self.decoder.decode(received_data_array, reuse=False)
+            self.deliver(received_data_array)
+
+class ShmReceiver(Receiver):
+    # Same job as DataReceiver, reading blocks published by Server.py --shm
+    # straight out of shared memory
+    def __init__(self, ring, tuner, decoder, handler):
+        super().__init__(handler)
+        self.ring = ring
+        self.reader = ring.reader()
+        self.tuner = tuner
+        self.decoder = decoder
+
+    def resume(self):
+        # Carry on from the newest block, not from where Stop was pressed
+        self.reader = self.ring.reader()
+        super().resume()
+
+    def run(self):
+        while self.wait_active():
+            block = self.reader.wait(timeout=0.1)
+            if block is None:
+                continue
+            seq, view = block
+            self.tuner.update(len(view), (self.ring.write_sequence() - self.reader.next_seq) * len(view))
+            received_data_array = self.decoder.decode(view.view(np.uint16), reuse=False)
+            # Drop the block if the producer lapped us while decoding it
+            if self.reader.valid(seq):
+                self.deliver(received_data_array)
+
+class PipelineReceiver(Receiver):
+    # Collects what the pipeline workers publish; decoding and analysis
+    # already happened in the worker processes
+    def __init__(self, results, handler):
+        super().__init__(handler)
+        self.results = results
+
+    def run(self):
+        while self.wait_active():
+            results = self.results.wait(timeout=0.1)
+            if results:
+                self.deliver(results)
 
 
 class LabeledDial(QtWidgets.QWidget):
@@ -161,11 +270,43 @@ class LabeledDial(QtWidgets.QWidget):
 class Oscilloscope(QMainWindow):
     def __init__(self):
         super().__init__()
-        server_host = '169.254.116.191'
-        #server_host = '127.0.0.1'
-        server_port = 8081
-        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.client_socket.connect((server_host, server_port))
+        # --local reads from Server.py --shm on this machine instead of TCP
+        self.client_socket = None
+        self.ring = None
+        self.pipeline = None
+        # --profile interactive|balanced|bulk|adaptive, as given to Server.py
+        profile = profile_from_argv()
+        self.tuner = LinkTuner(profile, PIPE_RATE)
+        if '--local' in sys.argv:
+            self.ring = SharedRing.attach()
+        else:
+            server_host = '169.254.116.191'
+            #server_host = '127.0.0.1'
+            server_port = 8081
+            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            configure_socket(self.client_socket, profile)
+            self.client_socket.connect((server_host, server_port))
+        self.decoder = LutDecoder(Calibration.load('pi'))
+        # --channels N (or names such as CH1,CH2) when the server interleaves
+        # several inputs
+        names = channel_names(sys.argv[sys.argv.index('--channels') + 1]) if '--channels' in sys.argv else ["CH1"]
+        if self.ring is not None and '--pipeline' in sys.argv:
+            # Decode, filter, trigger and measurements in worker processes,
+            # this process only draws
+            self.pipeline = ProcessingPipeline(calibration=self.decoder.calibration, sample_rate=SAMPLE_RATE)
+            self.pipeline.start()
+            names = names[:1]  # The workers only handle one channel
+        self.sample_rate = SAMPLE_RATE / len(names)
+        self.channels = ChannelStream(self.sample_rate, names)
+        self.math_channel = None
+        self.mask_test = None
+        self.last_triggered_frame = None
+        self.stop_requested = False
+        self.receiver = None
+        # Held by update_plot for each block and by the controls while they
+        # change the channels, filter, trigger, roll, eye or mask state it uses.
+        # Re-entrant as toggling one control can toggle another.
+        self.processing_lock = threading.RLock()
         self.setWindowTitle("Oscilloscope")
         self.setGeometry(0, 0, 1920, 1080)
         self.central_widget = QWidget(self)
@@ -194,6 +335,25 @@ class Oscilloscope(QMainWindow):
         self.save_button = QPushButton("Save", self)
         button_layout.addWidget(self.save_button)
 
+        # What the save button writes when a data format is chosen
+        self.export_source_combo = QComboBox(self)
+        self.export_source_combo.addItems(["Current buffer", "Segment history", "Recording"])
+        button_layout.addWidget(self.export_source_combo)
+
+        # Add spacing
+        button_layout.addSpacing(20)  
+
+        # Record button
+        self.record_button = QPushButton("Record", self)
+        button_layout.addWidget(self.record_button)
+
+        # Add spacing
+        button_layout.addSpacing(20)  
+
+        # Log button
+        self.log_button = QPushButton("Log", self)
+        button_layout.addWidget(self.log_button)
+
         # Add spacing
         button_layout.addSpacing(100)  
 
@@ -211,6 +371,92 @@ class Oscilloscope(QMainWindow):
         self.trigger_dial.valueChanged.connect(self.update_trigger_value)
         button_layout.addWidget(self.trigger_dial)
 
+        # Sweep mode, pre-trigger and holdoff
+        self.trigger = Trigger(FRAME_LENGTH, auto_timeout=int(self.sample_rate) // 20)
+        self.sweep_combo = QComboBox(self)
+        self.sweep_combo.addItems(SWEEP_MODES)
+        self.sweep_combo.currentTextChanged.connect(self.update_trigger)
+        button_layout.addWidget(self.sweep_combo)
+        self.pre_trigger_spin = QtWidgets.QSpinBox(self)
+        self.pre_trigger_spin.setRange(0, 100)
+        self.pre_trigger_spin.setValue(50)
+        self.pre_trigger_spin.setSuffix(" % pre-trigger")
+        self.pre_trigger_spin.valueChanged.connect(self.update_trigger)
+        button_layout.addWidget(self.pre_trigger_spin)
+        self.holdoff_spin = QDoubleSpinBox(self)
+        self.holdoff_spin.setRange(0, 1000000)
+        self.holdoff_spin.setDecimals(0)
+        self.holdoff_spin.setSuffix(" us holdoff")
+        self.holdoff_spin.valueChanged.connect(self.update_trigger)
+        button_layout.addWidget(self.holdoff_spin)
+        self.arm_button = QPushButton("Arm Single", self)
+        self.arm_button.clicked.connect(self.arm_trigger)
+        button_layout.addWidget(self.arm_button)
+        self.trigger_label = QLabel("Trigger: Armed", self)
+        button_layout.addWidget(self.trigger_label)
+        self.update_trigger()
+        self.channel_panel = ChannelPanel()
+        button_layout.addWidget(self.channel_panel)
+
+        # Filter selection, applied to the stream before triggering
+        button_layout.addSpacing(10)  
+        self.filter_combo = QComboBox(self)
+        self.filter_combo.addItems(FILTER_TYPES)
+        self.filter_combo.currentTextChanged.connect(self.update_filter)
+        button_layout.addWidget(self.filter_combo)
+        self.filter_cutoff_spin = QDoubleSpinBox(self)
+        self.filter_cutoff_spin.setRange(1, self.sample_rate * 0.49)
+        self.filter_cutoff_spin.setDecimals(0)
+        self.filter_cutoff_spin.setSuffix(" Hz")
+        self.filter_cutoff_spin.setValue(self.sample_rate / 20)
+        self.filter_cutoff_spin.valueChanged.connect(self.update_filter)
+        button_layout.addWidget(self.filter_cutoff_spin)
+
+        # Math channel expression
+        button_layout.addSpacing(10)  
+        self.math_edit = QLineEdit(self)
+        self.math_edit.setPlaceholderText("Math, e.g. ddt(CH1)/1e6")
+        self.math_edit.editingFinished.connect(self.update_math_channel)
+        button_layout.addWidget(self.math_edit)
+
+        # Mask testing against a captured golden frame
+        button_layout.addSpacing(10)  
+        self.mask_button = QPushButton("Capture Mask", self)
+        self.mask_button.clicked.connect(self.toggle_mask)
+        button_layout.addWidget(self.mask_button)
+        self.mask_margin_spin = QDoubleSpinBox(self)
+        self.mask_margin_spin.setRange(0.01, 5)
+        self.mask_margin_spin.setSingleStep(0.05)
+        self.mask_margin_spin.setValue(0.2)
+        self.mask_margin_spin.setSuffix(" V margin")
+        self.mask_margin_spin.valueChanged.connect(self.update_mask_settings)
+        button_layout.addWidget(self.mask_margin_spin)
+        self.mask_stop_check = QCheckBox("Stop on fail", self)
+        self.mask_stop_check.toggled.connect(self.update_mask_settings)
+        button_layout.addWidget(self.mask_stop_check)
+        self.mask_label = QLabel("Mask: off", self)
+        button_layout.addWidget(self.mask_label)
+
+        # Display refresh rate, independent of the data rate
+        button_layout.addSpacing(10)  
+        self.refresh_rate_spin = QtWidgets.QSpinBox(self)
+        self.refresh_rate_spin.setRange(1, 240)
+        self.refresh_rate_spin.setValue(60)
+        self.refresh_rate_spin.setSuffix(" Hz refresh")
+        button_layout.addWidget(self.refresh_rate_spin)
+        self.display_label = QLabel("Display: 0 fps", self)
+        button_layout.addWidget(self.display_label)
+
+        # Roll mode scrolls the whole history instead of triggered frames
+        self.roll_check = QCheckBox("Roll mode", self)
+        button_layout.addWidget(self.roll_check)
+
+        # Eye diagram of CH1 over every unit interval, clock recovered from the data
+        self.eye_check = QCheckBox("Eye diagram", self)
+        button_layout.addWidget(self.eye_check)
+        self.eye_label = QLabel("Eye: off", self)
+        button_layout.addWidget(self.eye_label)
+
         # Add final spacing
         button_layout.addStretch()  
 
@@ -236,20 +482,32 @@ class Oscilloscope(QMainWindow):
         self.start_button.setStyleSheet(button_styles)
         self.stop_button.setStyleSheet(button_styles)
         self.save_button.setStyleSheet(button_styles)
+        self.log_button.setStyleSheet(button_styles)
+        self.record_button.setStyleSheet(button_styles)
 
         # Plot widget
         self.plot_widget = pg.PlotWidget(self.central_widget)
         self.plot_widget.setBackground('k')
         self.plot_widget.setTitle("Oscilloscope")
         self.series_channel1 = self.plot_widget.plot(pen='r', name="Channel 1")
+        self.series_math = self.plot_widget.plot(pen='y', name="Math")
+        mask_pen = pg.mkPen((150, 150, 150), style=QtCore.Qt.DashLine)
+        self.series_mask_upper = self.plot_widget.plot(pen=mask_pen)
+        self.series_mask_lower = self.plot_widget.plot(pen=mask_pen)
         self.plot_widget.showGrid(x=True, y=True)
         main_layout.addWidget(self.plot_widget)
 
-        self.zero_crossing_index = -1
-
         self.start_button.clicked.connect(self.start_plotting)
         self.stop_button.clicked.connect(self.stop_plotting)
         self.save_button.clicked.connect(self.save_plot)
+        self.log_button.clicked.connect(self.toggle_logging)
+        self.record_button.clicked.connect(self.toggle_recording)
+        self.logger = None
+        self.recorder = None
+        self.last_recording = None
+        self.last_frame = np.zeros(0, dtype=np.float32)
+        self.segment_history = deque(maxlen=1000)
+        self.export_worker = None
 
         self.plot_data_timer = QTimer()
         self.plot_data_timer.timeout.connect(self.plot_data)
@@ -262,53 +520,320 @@ class Oscilloscope(QMainWindow):
         # Connect the mouse press event to a function
         self.plot_widget.scene().sigMouseClicked.connect(self.on_plot_clicked)
 
+        self.channel_display = ChannelDisplay(self.plot_widget, self.series_channel1, names)
+        self.channel_panel.attach(self.channel_display)
+        self.channel_panel.changed.connect(self.update_channels)
+
+        self.display_scheduler = DisplayScheduler(self.render_frame, self.refresh_rate_spin.value())
+        self.refresh_rate_spin.valueChanged.connect(self.display_scheduler.set_refresh_rate)
+        self.display_scheduler.start()
+        self.strip_chart = StripChart(self.plot_widget, self.series_channel1, self.sample_rate)
+        self.roll_check.toggled.connect(self.toggle_roll_mode)
+        self.eye_diagram = EyeDiagram(self.sample_rate)
+        self.eye_display = EyeDisplay(self.plot_widget)
+        self.eye_check.toggled.connect(self.toggle_eye)
+
+        if self.pipeline is not None:
+            # These need every raw sample, which stays in the workers
+            for widget in (self.record_button, self.math_edit, self.mask_button, self.roll_check,
+                           self.sweep_combo, self.pre_trigger_spin, self.holdoff_spin, self.arm_button,
+                           self.channel_panel, self.eye_check):
+                widget.setEnabled(False)
+            self.update_filter()
+
     def start_plotting(self):
         self.plotting = True
+        self.stop_requested = False
+        with self.processing_lock:
+            self.trigger.reset()
         self.plot_data_timer.start(50)
 
     def stop_plotting(self):
         self.plotting = False
         self.plot_data_timer.stop()
+        if self.receiver is not None:
+            self.receiver.pause()
 
     def save_plot(self):
         file_dialog = QFileDialog(self)
-        file_path, _ = file_dialog.getSaveFileName(self, "Save Plot", "", "Images (*.png *.jpg)")
-        if file_path:
+        file_path, _ = file_dialog.getSaveFileName(self, "Save Plot", "", "Images (*.png *.jpg);;" + EXPORT_FILTERS)
+        if not file_path:
+            return
+        if os.path.splitext(file_path)[1].lower() in ('.png', '.jpg'):
             image = self.plot_widget.grab()
             image.save(file_path)
+            return
+        source = self.export_source_combo.currentText()
+        if source == "Current buffer":
+            data = self.last_frame
+            metadata = self.export_metadata('buffer')
+        elif source == "Segment history":
+            if not self.segment_history:
+                return
+            times, frames = zip(*self.segment_history)
+            data = np.stack(frames, axis=1)
+            metadata = dict(self.export_metadata('segments'), segment_times=list(times))
+        else:
+            if self.recorder is not None:
+                QMessageBox.warning(self, "Save", "Stop a recording before saving it")
+                return
+            if self.last_recording is None:
+                QMessageBox.warning(self, "Save", "No recording to save")
+                return
+            data, metadata = load_waveform(self.last_recording)
+        self.export_worker = ExportWorker(file_path, data, metadata)
+        self.export_worker.signals.progress.connect(lambda p: self.save_button.setText(f"{p}%"))
+        self.export_worker.signals.finished.connect(lambda path: self.save_button.setText("Save"))
+        self.export_worker.signals.error.connect(self.export_failed)
+        QThreadPool.globalInstance().start(self.export_worker)
+
+    def export_failed(self, message):
+        self.save_button.setText("Save")
+        QMessageBox.warning(self, "Save failed", message)
+
+    def export_metadata(self, source):
+        return {
+            'source': source,
+            'sample_rate': self.sample_rate,
+            'units': 'V',
+            'calibration': self.decoder.calibration.to_dict(),
+            'filter': self.channels.kind,
+            'channels': self.channels.names,
+            'trigger_level': self.trigger_value,
+            'sweep': self.trigger.mode,
+            'pre_trigger': self.trigger.pre_trigger,
+            'holdoff': self.trigger.holdoff,
+        }
+
+    def toggle_recording(self):
+        if self.recorder is None:
+            path = time.strftime('recording_%Y%m%d_%H%M%S.npy')
+            self.recorder = WaveformRecorder(path, self.export_metadata('recording'), self.channels.count)
+            self.record_button.setText("Stop Rec")
+        else:
+            recorder, self.recorder = self.recorder, None
+            recorder.close()
+            self.last_recording = recorder.path
+            self.record_button.setText("Record")
 
     def plot_data(self):
-        if self.plotting:
-            expected_bytes = 4000
-            worker = DataReceiver(self.client_socket, expected_bytes)
-            worker.signals.plot_data.connect(self.update_plot)
-            QThreadPool.globalInstance().start(worker)
+        # One receiver for the connection, so blocks arrive in order
+        if self.plotting and self.receiver is not None:
+            self.receiver.resume()
+        elif self.plotting:
+            if self.pipeline is not None:
+                self.receiver = PipelineReceiver(self.pipeline.results(), self.update_pipeline_results)
+            elif self.ring is not None:
+                self.receiver = ShmReceiver(self.ring, self.tuner, self.decoder, self.update_plot)
+            else:
+                self.receiver = DataReceiver(self.client_socket, self.tuner, self.decoder, self.update_plot)
+            QThreadPool.globalInstance().start(self.receiver)
 
     def update_plot(self, received_data_array):
-        if self.zero_crossing_index == -1:
-            self.find_and_set_first_zero_crossing(received_data_array)
-        self.plot_with_triggering(received_data_array)
-
-    def find_and_set_first_zero_crossing(self, data):
-        for i in range(len(data) - 1):
-            x = data[i] - self.trigger_value
-            y = data[i+1] - self.trigger_value
-            if x * y <= 0 and x < y:
-                self.zero_crossing=data[i+1]
-                break
- 
-    def plot_with_triggering(self, received_data_array):
-        for i in range(len(received_data_array) - 1):
-            if received_data_array[i] == self.zero_crossing:
-                shifted_received_data = received_data_array[i:]
-                num_points = len(shifted_received_data)
-                x_data = np.linspace(0, 2*num_points/5000000, num_points)
-                self.series_channel1.setData(x_data, shifted_received_data)
-                break
-    
+        # Runs on the receiver thread for every block
+        with self.processing_lock:
+            columns = self.channels.split(received_data_array)
+            self.last_frame = columns
+            self.segment_history.append((time.time(), columns[:, 0]))
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.append(columns[:, 0] if recorder.columns == 1 else columns)
+            filtered = self.channels.filter(columns)
+            if self.eye_diagram.enabled:
+                # The eye builds up from every sample, there is no trigger
+                self.eye_diagram.feed(filtered[:, 0])
+                self.display_scheduler.submit(self.eye_diagram)
+                return
+            if self.strip_chart.enabled:
+                # Roll mode keeps every sample, there is no trigger
+                self.strip_chart.append(filtered[:, 0])
+                self.display_scheduler.submit(self.strip_chart)
+                return
+            # Frames are copied out of the block, the filter buffer can be reused
+            frames = self.trigger.process(filtered)
+            if len(frames):
+                self.display_scheduler.submit((self.frame_times(), frames[-1]))
+                self.last_triggered_frame = frames[-1][:, 0]
+                mask_test = self.mask_test
+                if mask_test is not None:
+                    passed = mask_test.test_frames(frames[:, :, 0])
+                    if mask_test.should_stop(passed):
+                        # Stopped from the GUI thread on the next repaint
+                        self.stop_requested = True
+                        if self.receiver is not None:
+                            self.receiver.pause()
+            logger = self.logger
+            if logger is not None:
+                logger.log_measurements('scope', measure(filtered[:, 0], self.sample_rate))
+
+    def update_pipeline_results(self, results):
+        # Runs on the receiver thread; only the newest triggered trace is drawn
+        logger = self.logger
+        if logger is not None:
+            for result in results:
+                logger.log_measurements('scope', result['measurements'])
+        triggered = [r for r in results if r['trigger'] >= 0]
+        if triggered:
+            trace = triggered[-1]['trace']
+            x_data = np.arange(len(trace)) * (triggered[-1]['step'] / SAMPLE_RATE)
+            self.display_scheduler.submit((x_data, trace))
+
+    def render_frame(self, frame):
+        if frame is self.eye_diagram:
+            with self.processing_lock:
+                self.eye_display.show(frame)
+                self.eye_label.setText(frame.summary())
+            self.display_label.setText(self.display_text())
+            return
+        if frame is self.strip_chart:
+            self.strip_chart.redraw()
+            self.display_label.setText(self.display_text())
+            return
+        x_data, data = frame
+        self.channel_display.draw(data, x_data)
+        if self.math_channel is not None:
+            sources = {name: data[:, i] for i, name in enumerate(self.channels.names)}
+            self.series_math.setData(x_data, self.math_channel.evaluate(sources))
+        if self.mask_test is not None:
+            self.mask_label.setText(self.mask_test.summary())
+        self.trigger_label.setText(f"Trigger: {self.trigger.state}")
+        if self.stop_requested and self.plotting:
+            self.stop_plotting()
+        self.display_label.setText(self.display_text())
+
+    def display_text(self):
+        if self.pipeline is not None:
+            text = self.display_scheduler.stats_text()  # The workers read the ring
+        else:
+            text = f"{self.display_scheduler.stats_text()}  {self.tuner.status_text()}"
+        if self.receiver is not None and self.receiver.error:
+            text += f"  Error: {self.receiver.error}"
+        return text
+
+    def update_channels(self):
+        with self.processing_lock:
+            self.trigger.source = self.channel_panel.source()
+            if self.channel_display.xy and (self.strip_chart.enabled or self.eye_diagram.enabled):
+                self.channel_panel.xy_check.setChecked(False)
+                return
+            self.plot_widget.setLabel('bottom', self.channels.names[0] if self.channel_display.xy else 'Time')
+            self.plot_widget.enableAutoRange()
+
+    def toggle_roll_mode(self, enabled):
+        with self.processing_lock:
+            if enabled:
+                self.eye_check.setChecked(False)
+            self.channel_panel.xy_check.setChecked(False)  # Roll mode draws CH1 against time
+            self.display_scheduler.clear()
+            self.series_math.setData([])
+            self.strip_chart.clear()
+            self.channel_display.clear()
+            self.strip_chart.enabled = enabled
+            self.trigger.reset()
+            if enabled:
+                self.strip_chart.redraw()
+            else:
+                self.series_channel1.setData([])
+                self.plot_widget.enableAutoRange()
+
+    def toggle_eye(self, enabled):
+        with self.processing_lock:
+            if enabled:
+                self.roll_check.setChecked(False)
+                self.channel_panel.xy_check.setChecked(False)
+            self.display_scheduler.clear()
+            self.eye_diagram.reset()
+            self.eye_diagram.enabled = enabled
+            self.trigger.reset()
+            if enabled:
+                for curve in [self.series_math] + self.channel_display.curves:
+                    curve.setData([])
+                self.plot_widget.setXRange(-0.5, 1.5, padding=0)
+                self.plot_widget.setLabel('bottom', 'Unit interval')
+                self.eye_label.setText(self.eye_diagram.summary())
+            else:
+                self.eye_display.clear()
+                self.eye_label.setText("Eye: off")
+                self.plot_widget.setLabel('bottom', 'Time')
+                self.plot_widget.enableAutoRange()
+
+    def update_filter(self):
+        if self.pipeline is not None:
+            self.pipeline.send(filter=(self.filter_combo.currentText(), self.filter_cutoff_spin.value()))
+            return
+        with self.processing_lock:
+            self.channels.reconfigure(self.filter_combo.currentText(), self.filter_cutoff_spin.value())
+
+    def toggle_logging(self):
+        if self.logger is None:
+            path = time.strftime('scope_%Y%m%d_%H%M%S.dlog')
+            self.logger = DataLogger(path)
+            self.log_button.setText("Stop Log")
+        else:
+            logger, self.logger = self.logger, None
+            logger.close()
+            self.log_button.setText("Log")
+
+    def frame_times(self):
+        # Time axis of a frame, zero at the trigger point
+        return (np.arange(self.trigger.length) - self.trigger.pre) / self.sample_rate
+
+    def toggle_mask(self):
+        if self.mask_test is None:
+            if self.last_triggered_frame is None:
+                return
+            self.mask_test = MaskTest(self.last_triggered_frame, self.sample_rate, margin=self.mask_margin_spin.value())
+            self.mask_test.stop_on_fail = self.mask_stop_check.isChecked()
+            self.mask_button.setText("Clear Mask")
+            self.draw_mask()
+        else:
+            self.mask_test = None
+            self.series_mask_upper.setData([])
+            self.series_mask_lower.setData([])
+            self.mask_button.setText("Capture Mask")
+            self.mask_label.setText("Mask: off")
+
+    def update_mask_settings(self):
+        with self.processing_lock:
+            if self.mask_test is not None:
+                self.mask_test.stop_on_fail = self.mask_stop_check.isChecked()
+                if self.mask_test.margin != self.mask_margin_spin.value():
+                    self.mask_test.margin = self.mask_margin_spin.value()
+                    self.mask_test.prepare(self.mask_test.length, self.mask_test.sample_rate)
+                    self.draw_mask()
+
+    def draw_mask(self):
+        x_data = self.frame_times()[:self.mask_test.length]
+        self.series_mask_upper.setData(x_data, self.mask_test.upper)
+        self.series_mask_lower.setData(x_data, self.mask_test.lower)
+
+    def update_math_channel(self):
+        expression = self.math_edit.text().strip()
+        self.math_channel = None
+        self.series_math.setData([])
+        if expression:
+            try:
+                self.math_channel = MathChannel(expression, self.sample_rate, self.channels.names)
+            except ValueError as e:
+                QMessageBox.warning(self, "Math", str(e))
+
     def update_trigger_value(self, value):
         self.trigger_value = value / 10
-        self.zero_crossing_index = -1
+        if self.pipeline is not None:
+            self.pipeline.send(trigger=self.trigger_value)
+        self.update_trigger()
+
+    def update_trigger(self):
+        with self.processing_lock:
+            self.trigger.level = self.trigger_value
+            self.trigger.mode = self.sweep_combo.currentText()
+            self.trigger.set_pre_trigger(self.pre_trigger_spin.value())
+            self.trigger.holdoff = int(self.holdoff_spin.value() * self.sample_rate / 1e6)
+            self.trigger.arm()
+
+    def arm_trigger(self):
+        with self.processing_lock:
+            self.trigger.arm()
 
     def on_plot_clicked(self, event):
         if event.double():
@@ -331,7 +856,26 @@ class Oscilloscope(QMainWindow):
 
     def closeEvent(self, event):
         self.stop_plotting()
-        self.client_socket.close()
+        if self.receiver is not None:
+            self.receiver.stop()
+        if self.client_socket is not None:
+            try:
+                # Wakes a receiver waiting in recv(), close() alone may not
+                self.client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.client_socket.close()
+        if self.ring is not None:
+            QThreadPool.globalInstance().waitForDone(1000)
+            if self.pipeline is not None:
+                self.pipeline.close()
+            self.ring.close()
+        if self.logger is not None:
+            self.logger.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.export_worker is not None:
+            self.export_worker.cancel()
         event.accept()
 
 if __name__ == "__main__":
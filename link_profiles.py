@@ -0,0 +1,188 @@
+import sys
+import time
+import socket
+from collections import namedtuple
+
+# Block sizes are given as milliseconds of data and turned into bytes with
+# the nominal rate of each link, so one profile means the same latency on
+# the relay, the TCP client and the serial reader
+PIPE_RATE = 5000000    # Server.py input, bytes/s: 2.5 MS/s of uint16 (gui5.py SAMPLE_RATE)
+SERIAL_RATE = 200000   # esp-scope.ino at 2 Mbaud, 10 bits a byte
+BLOCK_ALIGN = 16       # Whole uint16 samples and channel sets
+MIN_BLOCK_MS = 0.5
+MAX_BLOCK_MS = 20.0
+MAX_WAIT = 0.05        # A serial reader takes a short block after this many seconds
+WINDOW = 0.5           # Seconds per throughput and latency figure
+
+# nodelay sets TCP_NODELAY; socket_buffer sets SO_SNDBUF and SO_RCVBUF,
+# 0 keeps the system default
+Profile = namedtuple('Profile', 'name block_ms poll_ms nodelay socket_buffer adaptive')
+# The serial link delivers whole firmware frames (BUFFER_SIZE in
+# esp-scope.ino), so there a profile only sets how often the port is read
+SERIAL_PROFILE_NOTE = "Serial data arrives in whole firmware frames, so here the profile only sets how often the port is polled"
+PROFILES = {profile.name: profile for profile in (
+    Profile("interactive", MIN_BLOCK_MS, 2, True, 1 << 16, False),
+    Profile("balanced", 0.8, 5, False, 0, False),
+    Profile("bulk", 10.0, 20, False, 1 << 22, False),
+    # Starts balanced; blocks grow while a backlog builds and shrink back
+    # while the reader keeps up
+    Profile("adaptive", 0.8, 5, True, 1 << 20, True),
+)}
+DEFAULT_PROFILE = "balanced"
+
+def profile_from_argv(argv=None):
+    # --profile NAME
+    argv = sys.argv if argv is None else argv
+    name = argv[argv.index('--profile') + 1] if '--profile' in argv[:-1] else DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise SystemExit(f"Unknown profile {name}, choose from {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+def block_bytes(rate, block_ms):
+    return max(BLOCK_ALIGN, int(rate * block_ms / 1000) // BLOCK_ALIGN * BLOCK_ALIGN)
+
+def configure_socket(sock, profile):
+    # Before connect() or listen(), so the buffer sizes also set the TCP window
+    if profile.nodelay:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if profile.socket_buffer:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, profile.socket_buffer)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, profile.socket_buffer)
+
+def queued_bytes(fd):
+    # Bytes waiting on a socket or pipe, 0 where FIONREAD is not available
+    try:
+        import array
+        import fcntl
+        import termios
+        count = array.array('i', [0])
+        fcntl.ioctl(fd, termios.FIONREAD, count)
+        return count[0]
+    except (ImportError, OSError, ValueError):
+        return 0  # Also once the socket is closed
+
+class LinkTuner:
+    # One per link end. Gives the block size to read or send next, and
+    # from what update() is told about each block measures the arrival
+    # rate, throughput and latency. Latency is the age of the oldest byte
+    # of a block when it is handed on, (held + block + backlog) / rate,
+    # which covers filling the block, or the frame it completes, and
+    # waiting in the queue but not the wire.
+    # The adaptive profile resizes blocks once per WINDOW: doubling their
+    # length while more than two blocks are waiting, and taking off a
+    # fifth while the queue stays under one block.
+    def __init__(self, profile, rate, max_bytes=None):
+        self.profile = profile
+        self.rate = float(rate)
+        self.block_ms = profile.block_ms
+        self.poll_ms = profile.poll_ms
+        self.max_bytes = max_bytes or block_bytes(rate, MAX_BLOCK_MS if profile.adaptive else profile.block_ms)
+        self.block_bytes = min(self.max_bytes, block_bytes(rate, self.block_ms))
+        self.last = None
+        self.window_start = None
+        self.window_bytes = 0
+        self.window_blocks = 0
+        self.window_latency = 0.0
+        self.window_backlog = 0
+        self.throughput = 0.0
+        self.blocks_per_second = 0.0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.latency_peak = 0.0
+
+    def due(self, waiting):
+        # For polled readers: whether to take what is waiting now
+        return waiting >= self.block_bytes or self.last is None or time.perf_counter() - self.last >= MAX_WAIT
+
+    def take(self, received):
+        # Bytes read that complete no block yet, such as part of a frame;
+        # they count in the throughput and in latency once handed on
+        self.last = time.perf_counter()
+        if self.window_start is not None:
+            self.window_bytes += received
+
+    def update(self, received, queued=0, held=0):
+        # `received` bytes were just taken, `queued` are still waiting and
+        # `held` were taken before but only handed on with these
+        now = time.perf_counter()
+        self.last = now
+        if self.window_start is None:
+            self.window_start = now
+            return
+        latency = (held + received + queued) / self.rate
+        self.window_bytes += received
+        self.window_blocks += 1
+        self.window_latency += latency
+        self.latency_peak = max(self.latency_peak, latency)
+        self.window_backlog = max(self.window_backlog, received + queued - self.block_bytes)
+        elapsed = now - self.window_start
+        if elapsed >= WINDOW:
+            self.close_window(elapsed)
+            self.window_start = now
+
+    def close_window(self, elapsed):
+        self.throughput = self.window_bytes / elapsed
+        self.blocks_per_second = self.window_blocks / elapsed
+        self.latency = self.window_latency / self.window_blocks
+        self.max_latency = self.latency_peak
+        if self.throughput > 0:
+            self.rate = self.throughput
+        if self.profile.adaptive:
+            if self.window_backlog > 2 * self.block_bytes:
+                self.block_ms = min(MAX_BLOCK_MS, 2 * self.block_ms)
+            elif self.window_backlog < self.block_bytes:
+                self.block_ms = max(MIN_BLOCK_MS, 0.8 * self.block_ms)
+            self.block_bytes = min(self.max_bytes, block_bytes(self.rate, self.block_ms))
+            self.poll_ms = max(1, min(20, int(self.block_ms)))
+        self.window_bytes = self.window_blocks = self.window_backlog = 0
+        self.window_latency = self.latency_peak = 0.0
+
+    def status_text(self):
+        return (f"Link {self.profile.name}: {self.throughput / 1e6:.2f} MB/s, {self.blocks_per_second:.0f} blocks/s "
+                f"of {self.block_bytes} B, latency {self.latency * 1e3:.1f} ms (max {self.max_latency * 1e3:.1f})")
+
+def benchmark(seconds=1.0, rate=PIPE_RATE, cost=0.0002):
+    # A producer at `rate` into a socket pair and a reader that spends
+    # `cost` seconds on every block, as decoding and drawing would
+    import threading
+    for profile in PROFILES.values():
+        sender, receiver = socket.socketpair()
+        if profile.socket_buffer:
+            for sock in (sender, receiver):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, profile.socket_buffer)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, profile.socket_buffer)
+        stop = threading.Event()
+
+        def produce():
+            chunk = bytes(block_bytes(rate, 0.2))
+            next_time = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    sender.sendall(chunk)
+                except OSError:
+                    return
+                next_time += len(chunk) / rate
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        tuner = LinkTuner(profile, rate)
+        buffer = bytearray(tuner.max_bytes)
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            view = memoryview(buffer)[:tuner.block_bytes]
+            received = 0
+            while received < len(view):
+                received += receiver.recv_into(view[received:])
+            time.sleep(cost)
+            tuner.update(received, queued_bytes(receiver.fileno()))
+        stop.set()
+        sender.close()
+        receiver.close()
+        producer.join()
+        print(tuner.status_text())
+
+if __name__ == "__main__":
+    benchmark(*(float(a) for a in sys.argv[1:3]))
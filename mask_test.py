@@ -0,0 +1,71 @@
+import time
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+class MaskTest:
+    # Envelope around a golden waveform: +/- margin volts, widened by
+    # +/- time_margin samples so edge jitter inside the margin passes.
+    def __init__(self, golden, sample_rate, margin=0.1, time_margin=2, keep_failures=100):
+        self.golden = np.array(golden, dtype=np.float32)
+        self.golden_rate = sample_rate
+        self.margin = margin
+        self.time_margin = time_margin
+        self.stop_on_fail = False
+        self.failures = deque(maxlen=keep_failures)
+        self.reset()
+        self.prepare(len(self.golden), sample_rate)
+
+    def reset(self):
+        self.tested = 0
+        self.failed = 0
+        self.failures.clear()
+
+    def prepare(self, length, sample_rate):
+        # Precompute the envelope for frames of `length` samples at `sample_rate`
+        golden = self.golden
+        if sample_rate != self.golden_rate or length != len(golden):
+            t = np.arange(length) / sample_rate
+            golden = np.interp(t, np.arange(len(golden)) / self.golden_rate, golden).astype(np.float32)
+        k = self.time_margin
+        if k > 0:
+            padded = np.pad(golden, k, mode='edge')
+            windows = sliding_window_view(padded, 2 * k + 1)
+            upper, lower = windows.max(axis=1), windows.min(axis=1)
+        else:
+            upper, lower = golden, golden
+        self.upper = upper + np.float32(self.margin)
+        self.lower = lower - np.float32(self.margin)
+        self.length = length
+        self.sample_rate = sample_rate
+
+    def violations(self, frames):
+        # frames: (n_frames, length) or (length,); returns failing samples per frame
+        frames = np.atleast_2d(frames)
+        n = min(frames.shape[1], self.length)
+        bad = (frames[:, :n] > self.upper[:n]) | (frames[:, :n] < self.lower[:n])
+        # Samples a short frame doesn't reach can't be inside the mask
+        return np.count_nonzero(bad, axis=1) + (self.length - n)
+
+    def test_frames(self, frames, timestamp=None):
+        # Returns a pass/fail array and records the failing frames
+        frames = np.atleast_2d(frames)
+        passed = self.violations(frames) == 0
+        self.tested += len(frames)
+        failed = np.flatnonzero(~passed)
+        if len(failed):
+            timestamp = time.time() if timestamp is None else timestamp
+            self.failed += len(failed)
+            for i in failed[-self.failures.maxlen:]:
+                self.failures.append((timestamp, frames[i].copy()))
+        return passed
+
+    def test(self, frame, timestamp=None):
+        return bool(self.test_frames(frame, timestamp)[0])
+
+    def should_stop(self, passed):
+        return self.stop_on_fail and not np.all(passed)
+
+    def summary(self):
+        rate = 100 * self.failed / self.tested if self.tested else 0.0
+        return f"Mask: {self.tested} tested, {self.failed} failed ({rate:.2f}%)"
@@ -0,0 +1,128 @@
+import ast
+import re
+import numpy as np
+
+BINARY_OPS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide, ast.Pow: np.power}
+UFUNCS = {'abs': np.abs, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'log10': np.log10}
+FUNCTIONS = tuple(UFUNCS) + ('ddt', 'integ')
+SOURCE_NAME = re.compile(r'CH\d+$')
+
+class MathChannel:
+    # The expression is parsed and checked once; compile() turns it into a
+    # chain of NumPy calls that write into buffers sized for the frame, so
+    # evaluate() allocates nothing while the frame length stays the same.
+    # Given `names`, the sources are checked against the channels the
+    # stream has now.
+    def __init__(self, expression, sample_rate, names=None):
+        self.expression = expression
+        self.sample_rate = sample_rate
+        try:
+            self.tree = ast.parse(expression, mode='eval').body
+        except SyntaxError as e:
+            raise ValueError(f"Invalid expression: {e.msg}") from None
+        self.sources = set()
+        self.check(self.tree)
+        if names is not None:
+            self.check_sources(names)
+        self.length = None
+        self.run = None
+
+    def check(self, node):
+        if isinstance(node, ast.BinOp):
+            if type(node.op) not in BINARY_OPS:
+                raise ValueError("Unsupported operator")
+            self.check(node.left)
+            self.check(node.right)
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, (ast.USub, ast.UAdd)):
+                raise ValueError("Unsupported operator")
+            self.check(node.operand)
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                raise ValueError(f"Unknown function, use one of: {', '.join(FUNCTIONS)}")
+            if len(node.args) != 1 or node.keywords:
+                raise ValueError(f"{node.func.id}() takes one argument")
+            self.check(node.args[0])
+        elif isinstance(node, ast.Name):
+            if not SOURCE_NAME.match(node.id):
+                raise ValueError(f"Unknown source {node.id}, use CH1, CH2, ...")
+            self.sources.add(node.id)
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)):
+                raise ValueError("Only numeric constants are allowed")
+        else:
+            raise ValueError("Unsupported expression")
+
+    def check_sources(self, names):
+        missing = self.sources - set(names)
+        if missing:
+            raise ValueError(f"No {', '.join(sorted(missing))} in the stream, it has {', '.join(names)}")
+
+    def compile(self, length):
+        self.length = length
+        run = self.compile_node(self.tree)
+        if not callable(run):
+            constant = np.full(length, run, dtype=np.float32)
+            run = lambda env: constant
+        self.run = run
+
+    def compile_node(self, node):
+        # Returns a number for constant subtrees, else a function of the sources
+        if isinstance(node, ast.Constant):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            name = node.id
+            return lambda env: env[name]
+
+        buf = np.empty(self.length, dtype=np.float32)
+        if isinstance(node, ast.BinOp):
+            op = BINARY_OPS[type(node.op)]
+            left = self.compile_node(node.left)
+            right = self.compile_node(node.right)
+            if not callable(left) and not callable(right):
+                return float(op(left, right))
+            if not callable(left):
+                return lambda env: op(left, right(env), out=buf)
+            if not callable(right):
+                return lambda env: op(left(env), right, out=buf)
+            return lambda env: op(left(env), right(env), out=buf)
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self.compile_node(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            if not callable(operand):
+                return -operand
+            return lambda env: np.negative(operand(env), out=buf)
+
+        name = node.func.id
+        arg = self.compile_node(node.args[0])
+        if not callable(arg):
+            value = arg
+            arg = lambda env: np.full(self.length, value, dtype=np.float32)
+        fs = self.sample_rate
+        if name == 'ddt':
+            def ddt(env):
+                x = arg(env)
+                np.subtract(x[1:], x[:-1], out=buf[1:])
+                buf[1:] *= fs
+                buf[0] = buf[1] if len(buf) > 1 else 0
+                return buf
+            return ddt
+        if name == 'integ':
+            def integ(env):
+                np.cumsum(arg(env), out=buf)
+                return np.divide(buf, fs, out=buf)
+            return integ
+        ufunc = UFUNCS[name]
+        return lambda env: ufunc(arg(env), out=buf)
+
+    def evaluate(self, sources):
+        missing = self.sources - set(sources)
+        if missing:
+            raise ValueError(f"No data for {', '.join(sorted(missing))}")
+        length = len(next(iter(sources.values())))
+        if length != self.length:
+            self.compile(length)
+        with np.errstate(all='ignore'):
+            return self.run(sources)
@@ -0,0 +1,21 @@
+import numpy as np
+
+MEASUREMENTS = ('vmin', 'vmax', 'vpp', 'mean', 'rms', 'freq')
+
+def measure(data, sample_rate):
+    if len(data) == 0:
+        return dict.fromkeys(MEASUREMENTS, 0.0)
+    vmin = float(data.min())
+    vmax = float(data.max())
+    mean = float(data.mean())
+    rms = float(np.sqrt(np.mean(np.square(data, dtype=np.float64))))
+
+    # Frequency from rising crossings of the mid level
+    mid = (vmax + vmin) / 2
+    above = data >= mid
+    rising = np.flatnonzero(~above[:-1] & above[1:])
+    freq = 0.0
+    if len(rising) > 1 and vmax > vmin:
+        freq = float(sample_rate * (len(rising) - 1) / (rising[-1] - rising[0]))
+
+    return {'vmin': vmin, 'vmax': vmax, 'vpp': vmax - vmin, 'mean': mean, 'rms': rms, 'freq': freq}
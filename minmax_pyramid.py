@@ -0,0 +1,250 @@
+import os
+import sys
+from collections import deque
+import numpy as np
+
+CHUNK_POINTS = 65536
+
+def pyramid_path(path):
+    return path + '.pyramid.npz'
+
+class Level:
+    # Min/max of every `factor` samples, kept in fixed-size chunks. With
+    # max_points set the oldest chunk is dropped past it, so memory stays
+    # bounded and coarser levels reach further back.
+    def __init__(self, factor, max_points=None, chunk_points=CHUNK_POINTS, paired=True):
+        self.factor = factor
+        self.chunk_points = chunk_points
+        self.max_chunks = None if max_points is None else max(2, max_points // chunk_points)
+        self.paired = paired
+        self.chunks = deque()
+        self.first = 0
+        self.count = 0
+
+    def append(self, mins, maxs):
+        size = self.chunk_points
+        pos = 0
+        while pos < len(mins):
+            fill = self.count % size
+            if fill == 0:
+                if len(self.chunks) == self.max_chunks:
+                    self.chunks.popleft()
+                    self.first += size
+                lo = np.empty(size, dtype=np.float32)
+                self.chunks.append((lo, np.empty(size, dtype=np.float32) if self.paired else lo))
+            n = min(size - fill, len(mins) - pos)
+            lo, hi = self.chunks[-1]
+            lo[fill:fill + n] = mins[pos:pos + n]
+            if self.paired:
+                hi[fill:fill + n] = maxs[pos:pos + n]
+            pos += n
+            self.count += n
+
+    def read(self, start, stop):
+        # Points [start, stop), clipped to what is still kept
+        size = self.chunk_points
+        start = max(start, self.first)
+        stop = min(stop, self.count)
+        if stop <= start:
+            empty = np.empty(0, dtype=np.float32)
+            return start, empty, empty
+        los, his = [], []
+        for c in range((start - self.first) // size, (stop - 1 - self.first) // size + 1):
+            base = self.first + c * size
+            a = max(start, base) - base
+            b = min(stop, base + size) - base
+            lo, hi = self.chunks[c]
+            los.append(lo[a:b])
+            his.append(hi[a:b])
+        lo = np.concatenate(los)
+        return start, lo, np.concatenate(his) if self.paired else lo
+
+class MinMaxPyramid:
+    # Level k holds the min and max of every base * 2**k samples and is
+    # built from level k-1 as samples arrive, so the index costs about
+    # 2/base of the data. Any view is drawn from the level whose bucket
+    # matches the samples per pixel; views finer than `base` samples per
+    # pixel read the samples themselves.
+    def __init__(self, base=16, max_points=None):
+        self.base = base
+        self.max_points = max_points
+        self.levels = []
+        self.pending = []
+        self.count = 0
+
+    @classmethod
+    def from_array(cls, data, base=16, chunk=1 << 20):
+        # A chunk at a time, so a memory-mapped recording is never loaded whole
+        pyramid = cls(base)
+        for i in range(0, len(data), chunk):
+            pyramid.append(data[i:i + chunk])
+        return pyramid
+
+    def append(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        lo = hi = block
+        ratio = self.base
+        k = 0
+        while True:
+            if k < len(self.pending) and len(self.pending[k][0]):
+                lo = np.concatenate((self.pending[k][0], lo))
+                hi = np.concatenate((self.pending[k][1], hi))
+            full = len(lo) // ratio * ratio
+            rest = (lo[full:].copy(), hi[full:].copy())
+            if k < len(self.pending):
+                self.pending[k] = rest
+            else:
+                self.pending.append(rest)
+            if not full:
+                break
+            lo = lo[:full].reshape(-1, ratio).min(axis=1)
+            hi = hi[:full].reshape(-1, ratio).max(axis=1)
+            if k == len(self.levels):
+                self.levels.append(Level(self.base << k, self.max_points, max(256, CHUNK_POINTS >> k)))
+            self.levels[k].append(lo, hi)
+            ratio = 2
+            k += 1
+        self.count += len(block)
+
+    def render(self, start, stop, pixels, raw):
+        # (sample positions, values) for samples [start, stop), about two
+        # points per pixel. raw(start, stop) returns (first, samples) and is
+        # used for fine views and for the newest samples not yet in a bucket.
+        start = max(0, start)
+        stop = min(stop, self.count)
+        if stop <= start:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        per_pixel = (stop - start) / max(1, pixels)
+        pieces = []
+        covered = start
+        if per_pixel >= self.base and self.levels:
+            index = next((k for k, level in enumerate(self.levels) if level.factor >= per_pixel), len(self.levels) - 1)
+            # Coarser levels reach further back when old points are dropped
+            while index < len(self.levels) - 1 and self.levels[index].first * self.levels[index].factor > start:
+                index += 1
+            for level in self.levels[index::-1]:
+                f = level.factor
+                first, lo, hi = level.read(covered // f, stop // f)
+                if len(lo):
+                    pieces.append((first, lo, hi, f))
+                    covered = (first + len(lo)) * f
+        if covered < stop:
+            first, samples = raw(covered, stop)
+            if len(samples):
+                pieces.append((first, samples, samples, 1))
+        if not pieces and self.levels:
+            # The samples are no longer kept; use the finest level that has them
+            level = next((l for l in self.levels if l.first * l.factor <= start), self.levels[-1])
+            f = level.factor
+            first, lo, hi = level.read(start // f, -(-stop // f))
+            if len(lo):
+                pieces.append((first, lo, hi, f))
+        positions = []
+        values = []
+        for first, lo, hi, f in pieces:
+            if f == 1:
+                positions.append(np.arange(first, first + len(lo), dtype=np.float64))
+                values.append(lo)
+                continue
+            p = np.empty(2 * len(lo))
+            p[0::2] = np.arange(first, first + len(lo)) * f
+            p[1::2] = p[0::2] + f / 2
+            v = np.empty(2 * len(lo), dtype=np.float32)
+            v[0::2] = lo
+            v[1::2] = hi
+            positions.append(p)
+            values.append(v)
+        if not positions:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        return np.concatenate(positions), np.concatenate(values)
+
+    def save(self, path):
+        arrays = {'base': self.base, 'count': self.count}
+        for k, level in enumerate(self.levels):
+            _, arrays[f'lo{k}'], arrays[f'hi{k}'] = level.read(level.first, level.count)
+        for k, (lo, hi) in enumerate(self.pending):
+            arrays[f'pending_lo{k}'], arrays[f'pending_hi{k}'] = lo, hi
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            pyramid = cls(int(f['base']))
+            pyramid.count = int(f['count'])
+            k = 0
+            while f'lo{k}' in f:
+                level = Level(pyramid.base << k, None, max(256, CHUNK_POINTS >> k))
+                level.append(f[f'lo{k}'], f[f'hi{k}'])
+                pyramid.levels.append(level)
+                k += 1
+            k = 0
+            while f'pending_lo{k}' in f:
+                pyramid.pending.append((f[f'pending_lo{k}'], f[f'pending_hi{k}']))
+                k += 1
+        return pyramid
+
+def load_pyramid(path, data):
+    # Saved by WaveformRecorder, else built now (and saved for next time)
+    try:
+        pyramid = MinMaxPyramid.load(pyramid_path(path))
+        if pyramid.count == len(data):
+            return pyramid
+    except (FileNotFoundError, KeyError, ValueError):
+        pass
+    pyramid = MinMaxPyramid.from_array(data)
+    try:
+        pyramid.save(pyramid_path(path))
+    except OSError:
+        pass
+    return pyramid
+
+class PyramidView:
+    # Keeps `curve` drawn from the level that matches the current view, so
+    # zooming and panning a deep capture never hands every sample to setData
+    def __init__(self, plot_widget, curve, data, sample_rate, pyramid=None):
+        self.plot_widget = plot_widget
+        self.curve = curve
+        self.data = data
+        self.sample_rate = sample_rate
+        self.pyramid = pyramid or MinMaxPyramid.from_array(data)
+        duration = len(data) / sample_rate
+        plot_widget.setLimits(xMin=0, xMax=duration)
+        plot_widget.setXRange(0, duration, padding=0)
+        plot_widget.getViewBox().sigXRangeChanged.connect(self.redraw)
+        self.redraw()
+
+    def read_raw(self, start, stop):
+        return start, np.asarray(self.data[start:stop], dtype=np.float32)
+
+    def redraw(self, *args):
+        t_start, t_end = self.plot_widget.viewRange()[0]
+        pixels = int(self.plot_widget.getViewBox().width()) or 1000
+        rate = self.sample_rate
+        positions, values = self.pyramid.render(int(t_start * rate), int(np.ceil(t_end * rate)) + 1, pixels, self.read_raw)
+        self.curve.setData(positions / rate, values)
+
+def view_recording(path):
+    from PyQt5.QtWidgets import QApplication
+    import pyqtgraph as pg
+    from waveform_export import load_waveform
+    data, metadata = load_waveform(path)
+    if data.ndim > 1:
+        data = data[:, 0]
+    app = QApplication(sys.argv)
+    plot_widget = pg.PlotWidget(title=f"{os.path.basename(path)}: {len(data)} samples")
+    plot_widget.setBackground('k')
+    plot_widget.showGrid(x=True, y=True)
+    plot_widget.setLabel('left', 'Voltage', units='V')
+    plot_widget.setLabel('bottom', 'Time', units='s')
+    # Held on the widget so the view and its range connection stay alive
+    plot_widget.pyramid_view = PyramidView(plot_widget, plot_widget.plot(pen='r'), data,
+                                           metadata.get('sample_rate', 1), load_pyramid(path, data))
+    plot_widget.show()
+    sys.exit(app.exec_())
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python3 minmax_pyramid.py RECORDING")
+        sys.exit(1)
+    view_recording(sys.argv[1])
@@ -1,11 +1,32 @@
 import sys
 import numpy as np
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QComboBox, QPushButton, QLabel, QHBoxLayout, QDial, QToolTip
+from PyQt5.QtCore import QTimer, QThreadPool
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QComboBox, QPushButton, QLabel, QHBoxLayout, QDial, QToolTip, QFileDialog
 import serial
 import serial.tools.list_ports
 from pyqtgraph import PlotWidget
-from PyQt5.QtGui import QCursor
+from PyQt5.QtGui import QCursor, QTransform
+from PyQt5.QtCore import Qt
+import pyqtgraph as pg
+import time
+from collections import deque
+from data_logger import DataLogger
+from waveform_export import EXPORT_FILTERS, ExportWorker, WaveformRecorder, load_waveform
+from measurements import measure
+from calibration import Calibration, LutDecoder
+from math_channels import MathChannel
+from mask_test import MaskTest
+from display_scheduler import DisplayScheduler
+from strip_chart import StripChart
+from trigger import Trigger
+from serial_framing import FrameParser
+from protocol_decode import DecodeLog, DecodeOverlay, UartDecoder
+from sinx_interp import SincDisplay
+from eye_diagram import EyeDiagram, EyeDisplay
+from link_profiles import PROFILES, DEFAULT_PROFILE, SERIAL_RATE, LinkTuner
+from channels import ChannelDisplay, ChannelStream, channel_names
+
+SAMPLE_RATE = 1000000  # esp-scope.ino SAMPLE_RATE
 
 class OscilloscopeLogic:
     def __init__(self, ui):
@@ -17,20 +38,81 @@ class OscilloscopeLogic:
         self.plot_widget.setLabel('left', 'Voltage', units='V')
         self.plot_widget.setLabel('bottom', 'Time', units='ms')
         self.plot_curve = self.plot_widget.plot(pen='r')
+        self.math_curve = self.plot_widget.plot(pen='y')
+        mask_pen = pg.mkPen((150, 150, 150), style=Qt.DashLine)
+        self.mask_upper_curve = self.plot_widget.plot(pen=mask_pen)
+        self.mask_lower_curve = self.plot_widget.plot(pen=mask_pen)
         self.plot_widget.setLimits(xMin=0, xMax=500, yMin=-3.5, yMax=3.5)
         self.plot_widget.scene().sigMouseMoved.connect(self.on_mouse_moved)
 
         self.ui.central_widget.layout().addWidget(self.plot_widget)
 
         self.serial_port = None
+        self.framer = FrameParser()
+        self.decoder = LutDecoder(Calibration.load('esp32'))
+        self.channels = ChannelStream(SAMPLE_RATE)
+        self.channel_display = ChannelDisplay(self.plot_widget, self.plot_curve)
+        self.ui.channel_panel.attach(self.channel_display)
+        self.xy_shown = False
+        self.math_channel = None
+        self.mask_test = None
         self.data_buffer = np.zeros(500)
+        self.channel_frame = self.data_buffer[:, None]
         self.is_paused = False
-        self.triggered = False
+        self.trigger = Trigger(len(self.data_buffer), auto_timeout=SAMPLE_RATE // 20)
+        self.logger = None
+        self.recorder = None
+        self.last_recording = None
+        self.segment_history = deque(maxlen=1000)
+        self.export_worker = None
+        self.sample_rate = SAMPLE_RATE
+        self.sample_count = 0
+        self.frame_start = 0
+        self.roll_origin = 0
+        self.protocol_decoder = None
+        self.decode_log = DecodeLog()
+        self.decode_overlay = DecodeOverlay(self.plot_widget)
+        self.search_position = None
         self.plot_timer = QTimer()
         self.plot_timer.timeout.connect(self.update_plot)
+        self.tuner = LinkTuner(PROFILES[DEFAULT_PROFILE], SERIAL_RATE)
+        self.ui.profile_combo.currentTextChanged.connect(self.update_link_profile)
+        self.display_scheduler = DisplayScheduler(self.render_frame, self.ui.refresh_rate_spin.value())
+        self.ui.refresh_rate_spin.valueChanged.connect(self.display_scheduler.set_refresh_rate)
+        self.display_scheduler.start()
+        self.strip_chart = StripChart(self.plot_widget, self.plot_curve, self.sample_rate)
+        self.sinc_display = SincDisplay()
+        self.ui.sinc_check.toggled.connect(self.toggle_sinc)
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(self.redraw_trace)
+        self.ui.roll_check.toggled.connect(self.toggle_roll_mode)
+        self.eye_diagram = EyeDiagram(self.sample_rate)
+        self.eye_display = EyeDisplay(self.plot_widget)
+        self.ui.eye_check.toggled.connect(self.toggle_eye)
+        self.ui.decode_combo.currentTextChanged.connect(self.update_protocol_decoder)
+        self.ui.baud_spin.valueChanged.connect(self.update_protocol_decoder)
+        self.ui.decode_search_edit.returnPressed.connect(self.search_decoded)
+        for signal in (self.ui.trigger_level_dial.valueChanged, self.ui.trigger_mode_combo.currentTextChanged,
+                       self.ui.sweep_combo.currentTextChanged, self.ui.pre_trigger_spin.valueChanged,
+                       self.ui.holdoff_spin.valueChanged):
+            signal.connect(self.update_trigger)
+        self.ui.arm_button.clicked.connect(self.trigger.arm)
+        self.update_trigger()
+        self.ui.channel_panel.changed.connect(self.update_channels)
+        self.ui.horizontal_scale_dial.valueChanged.connect(self.apply_view_scale)
+        self.ui.vertical_scale_dial.valueChanged.connect(self.apply_view_scale)
         self.ui.connect_button.clicked.connect(self.connect_serial)
         self.ui.pause_resume_button.clicked.connect(self.toggle_pause_resume)
         self.ui.autoset_button.clicked.connect(lambda: self.autoset(self.data_buffer))
+        self.ui.log_button.clicked.connect(self.toggle_logging)
+        self.ui.record_button.clicked.connect(self.toggle_recording)
+        self.ui.save_button.clicked.connect(self.save_data)
+        self.ui.filter_combo.currentTextChanged.connect(self.update_filter)
+        self.ui.filter_cutoff_spin.valueChanged.connect(self.update_filter)
+        self.ui.math_edit.editingFinished.connect(self.update_math_channel)
+        self.ui.mask_button.clicked.connect(self.toggle_mask)
+        self.ui.mask_margin_spin.valueChanged.connect(self.update_mask_settings)
+        self.ui.mask_stop_check.toggled.connect(self.update_mask_settings)
+        self.apply_view_scale()
 
 
     def update_serial_ports(self):
@@ -46,7 +128,11 @@ class OscilloscopeLogic:
                 self.serial_port = serial.Serial(selected_port, baudrate=2000000, timeout=0.1)
                 self.ui.status_label.setText(f"Status: Connected to {selected_port}")
                 self.data_buffer = np.zeros(500)
-                self.plot_timer.start(5)
+                self.channel_frame = self.data_buffer[:, None]
+                self.framer.reset()
+                self.trigger.reset()
+                self.update_protocol_decoder()
+                self.plot_timer.start(self.tuner.poll_ms)
             except Exception as e:
                 self.ui.status_label.setText(f"Failed to open serial port: {e}")
         else:
@@ -55,37 +141,349 @@ class OscilloscopeLogic:
     def update_plot(self):
         if self.serial_port and not self.is_paused and self.serial_port.in_waiting > 0:
             try:
-                data = self.serial_port.read(200)
-                data_array = np.frombuffer(data, dtype=np.uint8)
-                data_array = data_array.astype(np.float32) * 3.3 / 255
-
-                trigger_level = self.ui.trigger_level_dial.value() / 100.0
-                trigger_mode = self.ui.trigger_mode_combo.currentText()
-
-                if not self.triggered:
-                    for i in range(1, len(data_array)):
-                        if (trigger_mode == "Rising" and data_array[i-1] < trigger_level <= data_array[i]) or \
-                           (trigger_mode == "Falling" and data_array[i-1] > trigger_level >= data_array[i]):
-                            self.triggered = True
-                            break
-
-                if self.triggered:
-                    self.data_buffer = np.roll(self.data_buffer, -len(data_array))
-                    self.data_buffer[-len(data_array):] = data_array[:]
-
-                    vertical_scale = self.ui.vertical_scale_dial.value()
-                    scaled_data = self.data_buffer * vertical_scale
-                    horizontal_scale = self.ui.horizontal_scale_dial.value()
-                    self.plot_widget.setXRange(0, 1000 / horizontal_scale)
-                    self.plot_curve.setData(scaled_data)
+                waiting = self.serial_port.in_waiting
+                if not self.tuner.due(waiting):
+                    return  # Wait for a whole block, or until it is overdue
+                held = len(self.framer.buffer)  # Start of a frame read earlier
+                data = self.serial_port.read(waiting)
+                data_array = self.framer.feed(data)
+                if not len(data_array):
+                    self.tuner.take(len(data))
+                    return
+                self.tuner.update(len(data), self.serial_port.in_waiting, held)
+                if self.plot_timer.interval() != self.tuner.poll_ms:
+                    self.plot_timer.setInterval(self.tuner.poll_ms)
+                if self.framer.channels != self.channels.count:
+                    self.set_channels(channel_names(self.framer.channels))
+                data_array = self.decoder.decode(data_array)
+                columns = self.channels.split(data_array)
+                if self.protocol_decoder is not None:
+                    self.decode_log.extend(self.protocol_decoder.decode({'RX': columns[:, 0]}))
+                self.sample_count += len(columns)
+                if self.recorder is not None:
+                    self.recorder.append(columns[:, 0] if self.recorder.columns == 1 else columns)
+                columns = self.channels.filter(columns)
+
+                if self.eye_diagram.enabled:
+                    # The eye builds up from every sample, there is no trigger
+                    self.eye_diagram.feed(columns[:, 0])
+                    self.display_scheduler.submit(self.eye_diagram)
+                    return
+
+                if self.strip_chart.enabled:
+                    # Roll mode keeps every sample, there is no trigger
+                    self.strip_chart.append(columns[:, 0])
+                    self.display_scheduler.submit(self.strip_chart)
+                    return
+
+                frames = self.trigger.process(columns)
+                if len(frames):
+                    self.channel_frame = frames[-1]
+                    self.data_buffer = self.channel_frame[:, 0]
+                    self.frame_start = self.sample_count - (self.trigger.position - self.trigger.last_start)
+                    self.display_scheduler.submit(self.channel_frame)
+
+                    frames = frames[:, :, 0]
+
+                    if self.mask_test is not None:
+                        passed = self.mask_test.test_frames(frames)
+                        if self.mask_test.should_stop(passed):
+                            self.toggle_pause_resume()
+                            self.ui.status_label.setText("Stopped on mask failure")
+                    now = time.time()
+                    self.segment_history.extend((now, frame) for frame in frames)
+
+                    if self.logger is not None:
+                        self.logger.log_measurements('scope', measure(self.data_buffer, self.sample_rate))
 
             except Exception as e:
                 print(f"Error reading from serial port: {e}")
 
+    def render_frame(self, frame):
+        if frame is self.eye_diagram:
+            self.eye_display.show(frame)
+            self.ui.eye_label.setText(frame.summary())
+            self.ui.display_label.setText(self.display_text())
+            return
+        if frame is self.strip_chart:
+            self.strip_chart.redraw()
+            self.draw_decoded()
+            self.ui.display_label.setText(self.display_text())
+            return
+        self.channel_display.draw(frame, sinc_display=self.sinc_display)
+        if self.math_channel is not None:
+            sources = {name: frame[:, i] for i, name in enumerate(self.channels.names)}
+            self.math_curve.setData(self.math_channel.evaluate(sources))
+        if self.mask_test is not None:
+            self.ui.mask_label.setText(self.mask_test.summary())
+        self.ui.trigger_label.setText(f"Trigger: {self.trigger.state}")
+        self.draw_decoded()
+        self.ui.display_label.setText(self.display_text())
+
+    def display_text(self):
+        return f"{self.display_scheduler.stats_text()}  {self.framer.status_text()}  {self.tuner.status_text()}"
+
+    def redraw_trace(self, *args):
+        if not self.strip_chart.enabled and not self.eye_diagram.enabled:
+            self.channel_display.draw(self.channel_frame, sinc_display=self.sinc_display)
+
+    def toggle_sinc(self, enabled):
+        self.sinc_display.enabled = enabled
+        self.redraw_trace()
+
+    def apply_view_scale(self):
+        horizontal_scale = self.ui.horizontal_scale_dial.value()
+        if not self.strip_chart.enabled and not self.xy_shown and not self.eye_diagram.enabled:
+            self.plot_widget.setXRange(0, 1000 / horizontal_scale)
+        transform = QTransform.fromScale(1, self.ui.vertical_scale_dial.value())
+        for curve in (self.math_curve, self.mask_upper_curve, self.mask_lower_curve):
+            curve.setTransform(transform)
+        self.channel_display.set_vertical_scale(self.ui.vertical_scale_dial.value())
+
+    def set_channels(self, names):
+        if self.recorder is not None:
+            self.toggle_recording()
+        self.channels.set_channels(names)
+        self.trigger.reset()
+        self.channel_frame = np.zeros((self.trigger.length, len(names)), dtype=np.float32)
+        self.data_buffer = self.channel_frame[:, 0]
+        self.ui.channel_panel.set_channels(names)
+        # Frames already queued have the old columns
+        self.display_scheduler.clear()
+        # Drops the math channel while a source is missing, and brings it
+        # back when the stream has it again
+        self.update_math_channel()
+
+    def update_channels(self):
+        self.trigger.source = self.ui.channel_panel.source()
+        if self.channel_display.xy and (self.strip_chart.enabled or self.eye_diagram.enabled):
+            self.ui.channel_panel.xy_check.setChecked(False)
+            return
+        xy = self.channel_display.xy
+        if xy == self.xy_shown:
+            return
+        self.xy_shown = xy
+        if xy:
+            self.plot_widget.setLimits(xMin=-3.5, xMax=3.5)
+            self.plot_widget.setXRange(-3.5, 3.5)
+            self.plot_widget.setLabel('bottom', self.channels.names[0], units='V')
+        else:
+            self.plot_widget.setLimits(xMin=0, xMax=500)
+            self.plot_widget.setLabel('bottom', 'Time', units='ms')
+            self.apply_view_scale()
+        self.redraw_trace()
+
+    def toggle_roll_mode(self, enabled):
+        if enabled:
+            self.ui.eye_check.setChecked(False)
+        self.ui.channel_panel.xy_check.setChecked(False)
+        self.display_scheduler.clear()
+        self.math_curve.setData([])
+        self.strip_chart.clear()
+        self.channel_display.clear()
+        self.strip_chart.enabled = enabled
+        self.roll_origin = self.sample_count
+        self.trigger.reset()
+        if enabled:
+            self.plot_widget.setLimits(xMin=None, xMax=None)
+            self.plot_widget.setLabel('bottom', 'Time', units='s')
+            self.strip_chart.redraw()
+        else:
+            self.plot_widget.setLimits(xMin=0, xMax=500)
+            self.plot_widget.setLabel('bottom', 'Time', units='ms')
+            self.redraw_trace()
+            self.apply_view_scale()
+
+    def toggle_eye(self, enabled):
+        if enabled:
+            self.ui.roll_check.setChecked(False)
+            self.ui.channel_panel.xy_check.setChecked(False)
+        self.display_scheduler.clear()
+        self.eye_diagram.reset()
+        self.eye_diagram.enabled = enabled
+        self.trigger.reset()
+        if enabled:
+            for curve in [self.math_curve] + self.channel_display.curves:
+                curve.setData([])
+            self.decode_overlay.clear()
+            self.plot_widget.setLimits(xMin=-0.5, xMax=1.5)
+            self.plot_widget.setXRange(-0.5, 1.5, padding=0)
+            self.plot_widget.setLabel('bottom', 'Unit interval')
+            self.ui.eye_label.setText(self.eye_diagram.summary())
+        else:
+            self.eye_display.clear()
+            self.ui.eye_label.setText("Eye: off")
+            self.plot_widget.setLimits(xMin=0, xMax=500)
+            self.plot_widget.setLabel('bottom', 'Time', units='ms')
+            self.redraw_trace()
+            self.apply_view_scale()
+
+    def update_protocol_decoder(self):
+        self.decode_log.clear()
+        self.decode_overlay.clear()
+        self.search_position = None
+        self.protocol_decoder = None
+        if self.ui.decode_combo.currentText() == "UART":
+            self.protocol_decoder = UartDecoder(self.sample_rate, self.ui.baud_spin.value())
+            self.protocol_decoder.reset(self.sample_count)
+            self.ui.decode_label.setText("Decode: UART")
+        else:
+            self.ui.decode_label.setText("Decode: off")
+
+    def draw_decoded(self):
+        if self.protocol_decoder is None:
+            return
+        rate = self.sample_rate
+        if self.strip_chart.enabled:
+            t_start, t_end = self.plot_widget.viewRange()[0]
+            annotations = self.decode_log.in_range(self.roll_origin + int(t_start * rate), self.roll_origin + int(t_end * rate))
+            self.decode_overlay.show(annotations, lambda p: (p - self.roll_origin) / rate, 3.0)
+        else:
+            annotations = self.decode_log.in_range(self.frame_start, self.frame_start + len(self.data_buffer))
+            self.decode_overlay.show(annotations, lambda p: p - self.frame_start, 3.0)
+
+    def search_decoded(self):
+        query = self.ui.decode_search_edit.text().strip()
+        if not query:
+            return
+        matches = self.decode_log.search(query, self.search_position) or self.decode_log.search(query)
+        if not matches:
+            self.ui.decode_label.setText(f"No match for {query}")
+            return
+        match = matches[0]
+        self.search_position = match.start
+        self.ui.decode_label.setText(f"{match.text} at {match.start / self.sample_rate:.6f} s")
+        if self.strip_chart.enabled:
+            t = (match.start - self.roll_origin) / self.sample_rate
+            span = self.strip_chart.span
+            self.plot_widget.setXRange(t - span / 2, t + span / 2, padding=0)
+            self.draw_decoded()
+
+    def update_trigger(self):
+        self.trigger.level = self.ui.trigger_level_dial.value() / 100.0
+        self.trigger.slope = self.ui.trigger_mode_combo.currentText()
+        self.trigger.mode = self.ui.sweep_combo.currentText()
+        self.trigger.set_pre_trigger(self.ui.pre_trigger_spin.value())
+        self.trigger.holdoff = int(self.ui.holdoff_spin.value() * self.sample_rate / 1e6)
+        self.trigger.arm()
+
+    def toggle_logging(self):
+        if self.logger is None:
+            path = time.strftime('scope_%Y%m%d_%H%M%S.dlog')
+            self.logger = DataLogger(path)
+            self.ui.log_button.setText("Stop Logging")
+            self.ui.status_label.setText(f"Logging to {path}")
+        else:
+            self.logger.close()
+            self.logger = None
+            self.ui.log_button.setText("Start Logging")
+
+    def export_metadata(self, source):
+        return {
+            'source': source,
+            'sample_rate': self.sample_rate,
+            'units': 'V',
+            'calibration': self.decoder.calibration.to_dict(),
+            'filter': self.channels.kind,
+            'channels': self.channels.names,
+            'trigger_level': self.ui.trigger_level_dial.value() / 100.0,
+            'trigger_mode': self.ui.trigger_mode_combo.currentText(),
+            'sweep': self.trigger.mode,
+            'pre_trigger': self.trigger.pre_trigger,
+            'holdoff': self.trigger.holdoff,
+        }
+
+    def toggle_recording(self):
+        if self.recorder is None:
+            path = time.strftime('recording_%Y%m%d_%H%M%S.npy')
+            self.recorder = WaveformRecorder(path, self.export_metadata('recording'), self.channels.count)
+            self.ui.record_button.setText("Stop Recording")
+            self.ui.status_label.setText(f"Recording to {path}")
+        else:
+            self.recorder.close()
+            self.last_recording = self.recorder.path
+            self.ui.status_label.setText(f"Recorded {self.recorder.samples} samples")
+            self.recorder = None
+            self.ui.record_button.setText("Record")
+
+    def save_data(self):
+        source = self.ui.export_source_combo.currentText()
+        if source == "Current buffer":
+            data = self.channel_frame.copy()
+            metadata = self.export_metadata('buffer')
+        elif source == "Segment history":
+            if not self.segment_history:
+                self.ui.status_label.setText("No segments captured yet")
+                return
+            times, frames = zip(*self.segment_history)
+            data = np.stack(frames, axis=1)
+            metadata = dict(self.export_metadata('segments'), segment_times=list(times))
+        else:
+            if self.recorder is not None:
+                self.ui.status_label.setText("Stop a recording before saving it")
+                return
+            if self.last_recording is None:
+                self.ui.status_label.setText("No recording to save")
+                return
+            data, metadata = load_waveform(self.last_recording)
+        file_path, _ = QFileDialog.getSaveFileName(self.ui, "Save Data", "", EXPORT_FILTERS)
+        if not file_path:
+            return
+        self.export_worker = ExportWorker(file_path, data, metadata)
+        self.export_worker.signals.progress.connect(lambda p: self.ui.status_label.setText(f"Saving... {p}%"))
+        self.export_worker.signals.finished.connect(lambda path: self.ui.status_label.setText(f"Saved {path}"))
+        self.export_worker.signals.cancelled.connect(lambda path: self.ui.status_label.setText(f"Save of {path} cancelled"))
+        self.export_worker.signals.error.connect(lambda e: self.ui.status_label.setText(f"Save failed: {e}"))
+        QThreadPool.globalInstance().start(self.export_worker)
+
+    def update_filter(self):
+        self.channels.reconfigure(self.ui.filter_combo.currentText(), self.ui.filter_cutoff_spin.value())
+
+    def update_math_channel(self):
+        expression = self.ui.math_edit.text().strip()
+        self.math_channel = None
+        self.math_curve.setData([])
+        if expression:
+            try:
+                self.math_channel = MathChannel(expression, self.sample_rate, self.channels.names)
+            except ValueError as e:
+                self.ui.status_label.setText(f"Math: {e}")
+
+    def toggle_mask(self):
+        if self.mask_test is None:
+            self.mask_test = MaskTest(self.data_buffer, self.sample_rate, margin=self.ui.mask_margin_spin.value())
+            self.mask_test.stop_on_fail = self.ui.mask_stop_check.isChecked()
+            self.ui.mask_button.setText("Clear Mask")
+            self.draw_mask()
+        else:
+            self.mask_test = None
+            self.mask_upper_curve.setData([])
+            self.mask_lower_curve.setData([])
+            self.ui.mask_button.setText("Capture Mask")
+            self.ui.mask_label.setText("Mask: off")
+
+    def update_mask_settings(self):
+        if self.mask_test is not None:
+            self.mask_test.stop_on_fail = self.ui.mask_stop_check.isChecked()
+            if self.mask_test.margin != self.ui.mask_margin_spin.value():
+                self.mask_test.margin = self.ui.mask_margin_spin.value()
+                self.mask_test.prepare(self.mask_test.length, self.mask_test.sample_rate)
+                self.draw_mask()
+
+    def draw_mask(self):
+        self.mask_upper_curve.setData(self.mask_test.upper)
+        self.mask_lower_curve.setData(self.mask_test.lower)
+
+    def update_link_profile(self, name):
+        self.tuner = LinkTuner(PROFILES[name], SERIAL_RATE)
+        self.plot_timer.setInterval(self.tuner.poll_ms)
+
     def toggle_pause_resume(self):
         if self.is_paused:
             self.is_paused = False
-            self.triggered = False
+            self.trigger.reset()
+            if self.protocol_decoder is not None:
+                self.protocol_decoder.reset(self.sample_count)
             self.ui.pause_resume_button.setText("Pause")
         else:
             self.is_paused = True
@@ -94,6 +492,12 @@ class OscilloscopeLogic:
     def closeEvent(self, event):
         if self.serial_port is not None:
             self.serial_port.close()
+        if self.logger is not None:
+            self.logger.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.export_worker is not None:
+            self.export_worker.cancel()
         event.accept()
 
     def on_mouse_moved(self, event):
@@ -129,8 +533,7 @@ class OscilloscopeLogic:
         self.plot_widget.setXRange(0, time_per_div * 10)
 
     def set_trigger_level(self, trigger_level):
-        self.trigger_level = trigger_level
-        self.trigger_widget.setValue(trigger_level)
+        self.ui.trigger_level_dial.setValue(int(round(trigger_level * 100)))
 
 
 if __name__ == "__main__":
@@ -1,7 +1,11 @@
 import sys
 import serial.tools.list_ports
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QComboBox, QPushButton, QLabel, QHBoxLayout, QDial, QToolTip
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QComboBox, QPushButton, QLabel, QHBoxLayout, QDial, QToolTip, QDoubleSpinBox, QLineEdit, QCheckBox, QSpinBox
 from PyQt5.QtGui import QFont
+from filters import FILTER_TYPES
+from trigger import SWEEP_MODES
+from channels import ChannelPanel
+from link_profiles import PROFILES, DEFAULT_PROFILE, SERIAL_PROFILE_NOTE
 
 class OscilloscopeUI(QMainWindow):
     def __init__(self):
@@ -22,6 +26,13 @@ class OscilloscopeUI(QMainWindow):
         self.port_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
         left_panel.addWidget(self.port_combo)
 
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItems(PROFILES)
+        self.profile_combo.setCurrentText(DEFAULT_PROFILE)
+        self.profile_combo.setToolTip(SERIAL_PROFILE_NOTE)
+        self.profile_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.profile_combo)
+
         self.connect_button = QPushButton("Connect")
         self.connect_button.setStyleSheet("""
             QPushButton {
@@ -63,6 +74,102 @@ class OscilloscopeUI(QMainWindow):
         left_panel.addWidget(QLabel("Trigger Mode:"))
         left_panel.addWidget(self.trigger_mode_combo)
 
+        self.sweep_combo = QComboBox()
+        self.sweep_combo.addItems(SWEEP_MODES)
+        self.sweep_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.sweep_combo)
+        self.pre_trigger_spin = QSpinBox()
+        self.pre_trigger_spin.setRange(0, 100)
+        self.pre_trigger_spin.setValue(50)
+        self.pre_trigger_spin.setSuffix(" % pre-trigger")
+        self.pre_trigger_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.pre_trigger_spin)
+        self.holdoff_spin = QDoubleSpinBox()
+        self.holdoff_spin.setRange(0, 1000000)
+        self.holdoff_spin.setDecimals(0)
+        self.holdoff_spin.setSuffix(" us holdoff")
+        self.holdoff_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.holdoff_spin)
+        self.arm_button = QPushButton("Arm Single")
+        self.arm_button.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.arm_button)
+        self.trigger_label = QLabel("Trigger: Armed")
+        left_panel.addWidget(self.trigger_label)
+
+        self.channel_panel = ChannelPanel("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.channel_panel)
+
+        self.filter_combo = QComboBox()
+        self.filter_combo.addItems(FILTER_TYPES)
+        self.filter_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(QLabel("Filter:"))
+        left_panel.addWidget(self.filter_combo)
+
+        self.filter_cutoff_spin = QDoubleSpinBox()
+        self.filter_cutoff_spin.setRange(1, 490000)
+        self.filter_cutoff_spin.setDecimals(0)
+        self.filter_cutoff_spin.setSuffix(" Hz")
+        self.filter_cutoff_spin.setValue(50000)
+        self.filter_cutoff_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.filter_cutoff_spin)
+
+        self.math_edit = QLineEdit()
+        self.math_edit.setPlaceholderText("e.g. ddt(CH1)/1e6")
+        self.math_edit.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(QLabel("Math:"))
+        left_panel.addWidget(self.math_edit)
+
+        self.mask_button = QPushButton("Capture Mask")
+        self.mask_button.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.mask_button)
+        self.mask_margin_spin = QDoubleSpinBox()
+        self.mask_margin_spin.setRange(0.01, 3.3)
+        self.mask_margin_spin.setSingleStep(0.05)
+        self.mask_margin_spin.setValue(0.2)
+        self.mask_margin_spin.setSuffix(" V margin")
+        self.mask_margin_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.mask_margin_spin)
+        self.mask_stop_check = QCheckBox("Stop on fail")
+        left_panel.addWidget(self.mask_stop_check)
+        self.mask_label = QLabel("Mask: off")
+        left_panel.addWidget(self.mask_label)
+
+        self.decode_combo = QComboBox()
+        self.decode_combo.addItems(["Off", "UART"])
+        self.decode_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(QLabel("Decode:"))
+        left_panel.addWidget(self.decode_combo)
+        self.baud_spin = QSpinBox()
+        self.baud_spin.setRange(300, 250000)
+        self.baud_spin.setValue(115200)
+        self.baud_spin.setSuffix(" baud")
+        self.baud_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.baud_spin)
+        self.decode_search_edit = QLineEdit()
+        self.decode_search_edit.setPlaceholderText("Search, e.g. 0x41 or 'A'")
+        self.decode_search_edit.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.decode_search_edit)
+        self.decode_label = QLabel("Decode: off")
+        left_panel.addWidget(self.decode_label)
+
+        self.refresh_rate_spin = QSpinBox()
+        self.refresh_rate_spin.setRange(1, 240)
+        self.refresh_rate_spin.setValue(60)
+        self.refresh_rate_spin.setSuffix(" Hz refresh")
+        self.refresh_rate_spin.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(self.refresh_rate_spin)
+        self.display_label = QLabel("Display: 0 fps")
+        left_panel.addWidget(self.display_label)
+        self.sinc_check = QCheckBox("Sin(x)/x at fast timebases")
+        self.sinc_check.setChecked(True)
+        left_panel.addWidget(self.sinc_check)
+        self.roll_check = QCheckBox("Roll mode")
+        left_panel.addWidget(self.roll_check)
+        self.eye_check = QCheckBox("Eye diagram")
+        left_panel.addWidget(self.eye_check)
+        self.eye_label = QLabel("Eye: off")
+        left_panel.addWidget(self.eye_label)
+
         self.pause_resume_button = QPushButton("Pause")
         self.pause_resume_button.setStyleSheet("""
             QPushButton {
@@ -93,6 +200,37 @@ class OscilloscopeUI(QMainWindow):
         """)
         left_panel.addWidget(self.autoset_button)
 
+        tool_button_style = """
+            QPushButton {
+                background-color: #2196F3; 
+                color: white; 
+                font-size: 16px; 
+                padding: 10px;
+                border-radius: 8px;
+            }
+            QPushButton:hover {
+                background-color: #1e88e5;
+            }
+        """
+
+        self.log_button = QPushButton("Start Logging")
+        self.log_button.setStyleSheet(tool_button_style)
+        left_panel.addWidget(self.log_button)
+
+        self.record_button = QPushButton("Record")
+        self.record_button.setStyleSheet(tool_button_style)
+        left_panel.addWidget(self.record_button)
+
+        self.export_source_combo = QComboBox()
+        self.export_source_combo.addItems(["Current buffer", "Segment history", "Recording"])
+        self.export_source_combo.setStyleSheet("background-color: #3d3d3d; color: white; padding: 5px;")
+        left_panel.addWidget(QLabel("Save:"))
+        left_panel.addWidget(self.export_source_combo)
+
+        self.save_button = QPushButton("Save Data")
+        self.save_button.setStyleSheet(tool_button_style)
+        left_panel.addWidget(self.save_button)
+
         main_layout.addLayout(left_panel)
         self.central_widget = QWidget()
         self.central_widget.setLayout(main_layout)
@@ -0,0 +1,218 @@
+import os
+import sys
+import time
+import queue
+import multiprocessing as mp
+import numpy as np
+from shm_ring import CREATED, RING_NAME, SharedRing
+from calibration import Calibration, LutDecoder
+from filters import FilterStage
+from measurements import MEASUREMENTS, measure
+
+DISPLAY_POINTS = 1000
+RESULT_FIELDS = ('seq', 'trigger', 'points', 'step', 'lost') + MEASUREMENTS
+HEADER_BYTES = len(RESULT_FIELDS) * 8
+
+# A result slot is the header as float64 words, then the display trace as
+# float32. `step` is the trace spacing in samples, `trigger` the index of
+# the trigger in the block (-1 if it did not fire) and `lost` the blocks
+# the worker has missed so far.
+
+def find_trigger(data, level):
+    above = data >= level
+    rising = np.flatnonzero(~above[:-1] & above[1:])
+    return int(rising[0]) + 1 if len(rising) else -1
+
+def decimate(data, points):
+    # Min/max pairs, so peaks narrower than a pixel still show
+    n = len(data)
+    if n <= 2 * points:
+        return np.asarray(data, dtype=np.float32), 1.0
+    factor = n // points
+    blocks = data[:factor * points].reshape(points, factor)
+    out = np.empty(2 * points, dtype=np.float32)
+    out[0::2] = blocks.min(axis=1)
+    out[1::2] = blocks.max(axis=1)
+    return out, factor / 2
+
+def unpack_result(view):
+    header = view[:HEADER_BYTES].view(np.float64)
+    points = int(header[2])
+    return {
+        'seq': int(header[0]),
+        'trigger': int(header[1]),
+        'step': float(header[3]),
+        'lost': int(header[4]),
+        'measurements': {k: float(v) for k, v in zip(MEASUREMENTS, header[5:])},
+        'trace': view[HEADER_BYTES:HEADER_BYTES + 4 * points].view(np.float32).copy(),
+    }
+
+def warm_up(stage, decoder, ring, seq, samples, limit):
+    # Runs the last `samples` samples of the `limit` blocks before `seq`
+    # through the filter, oldest first, stopping at one already overwritten
+    blocks = []
+    for previous in range(seq - 1, max(seq - 1 - limit, -1), -1):
+        if samples <= 0:
+            break
+        view = ring.block(previous)
+        if view is None:
+            break
+        data = view.view(np.uint16)
+        blocks.append(data[-samples:])
+        samples -= len(data)
+    for data in reversed(blocks):
+        stage.process(decoder.decode(data))
+
+def run_worker(index, workers, source, result_name, calibration, sample_rate, control, source_created):
+    # The result ring, and the source if source_created, were created by
+    # the parent, which shares this process's resource tracker
+    ring = SharedRing.attach(source, keep_tracking=source_created)
+    results = SharedRing.attach(result_name, keep_tracking=True)
+    decoder = LutDecoder(Calibration.from_dict(calibration))
+    stage = FilterStage(sample_rate)
+    level = 0.0
+    points = DISPLAY_POINTS
+    reader = ring.reader()
+    out = np.empty(results.slot_bytes, dtype=np.uint8)
+    header = out[:HEADER_BYTES].view(np.float64)
+    try:
+        while True:
+            try:
+                while True:
+                    message = control.get_nowait()
+                    if message is None:
+                        return
+                    if 'filter' in message:
+                        stage.reconfigure(*message['filter'])
+                    level = message.get('trigger', level)
+                    points = message.get('points', points)
+            except queue.Empty:
+                pass
+            block = reader.wait(timeout=0.1)
+            if block is None or block[0] % workers != index:
+                continue
+            seq, view = block
+            if workers > 1 and stage.filter is not None:
+                # The blocks since this worker's last one went to the others.
+                # Running the filter over the end of them, as long as it
+                # takes to settle, carries the state across: exactly for
+                # FIR and moving average, to within SETTLED for the
+                # recursive filters. Where settling takes longer than the
+                # skipped blocks all of them are run, which is exact as
+                # long as none was lost.
+                warm_up(stage, decoder, ring, seq, stage.settling_samples(), workers - 1)
+            data = stage.process(decoder.decode(view.view(np.uint16)))
+            if not reader.valid(seq):
+                reader.lost += 1
+                continue
+            trigger = find_trigger(data, level)
+            trace, step = decimate(data[max(trigger, 0):], points)
+            values = measure(data, sample_rate)
+            header[:] = (seq, trigger, len(trace), step, reader.lost) + tuple(values[k] for k in MEASUREMENTS)
+            n = HEADER_BYTES + trace.nbytes
+            out[HEADER_BYTES:n] = trace.view(np.uint8)
+            results.publish(out[:n])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+        results.close()
+
+class PipelineResults:
+    def __init__(self, rings):
+        self.readers = [ring.reader() for ring in rings]
+
+    def read(self):
+        # Everything the workers published since the last call, in block order
+        results = []
+        for reader in self.readers:
+            while True:
+                block = reader.read()
+                if block is None:
+                    break
+                seq, view = block
+                result = unpack_result(view)
+                if reader.valid(seq):
+                    results.append(result)
+        results.sort(key=lambda r: r['seq'])
+        return results
+
+    def wait(self, timeout=0.1, poll_interval=0.0005):
+        deadline = time.monotonic() + timeout
+        while True:
+            results = self.read()
+            if results or time.monotonic() >= deadline:
+                return results
+            time.sleep(poll_interval)
+
+class ProcessingPipeline:
+    # Decode, filter, trigger, measure and decimate in worker processes.
+    # Workers take the blocks of the source ring round-robin, so the
+    # sustained rate grows with the number of cores, and each publishes
+    # to its own result ring so every ring keeps a single producer.
+    # Settings reach the workers through a small control queue.
+    def __init__(self, source=RING_NAME, calibration=None, sample_rate=2500000, workers=None):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        ring = SharedRing.attach(source)
+        result_bytes = HEADER_BYTES + ring.slot_bytes // 2 * 4
+        ring.close()
+        calibration = (calibration or Calibration.nominal('pi')).to_dict()
+        context = mp.get_context('spawn')
+        self.rings = [SharedRing.create(f'{source}_result{i}', slots=64, slot_bytes=result_bytes)
+                      for i in range(self.workers)]
+        self.controls = [context.Queue() for _ in range(self.workers)]
+        self.processes = [context.Process(target=run_worker, daemon=True,
+                                          args=(i, self.workers, source, self.rings[i].shm.name,
+                                                calibration, sample_rate, self.controls[i], source in CREATED))
+                          for i in range(self.workers)]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def send(self, **settings):
+        # filter=(kind, cutoff), trigger=level, points=display points
+        for control in self.controls:
+            control.put(settings)
+
+    def results(self):
+        return PipelineResults(self.rings)
+
+    def close(self):
+        for control in self.controls:
+            control.put(None)
+        for process in self.processes:
+            if process.is_alive():
+                process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        for ring in self.rings:
+            ring.close()
+
+if __name__ == "__main__":
+    # python3 pipeline.py [workers]: blocks/s a synthetic producer gets through
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    source = SharedRing.create('pipeline_bench', slot_bytes=4000)
+    pipeline = ProcessingPipeline('pipeline_bench', workers=workers)
+    pipeline.start()
+    pipeline.send(filter=("FIR low-pass", 100000), trigger=2.5)
+    t = np.arange(2000)
+    codes = (2048 + 1500 * np.sin(2 * np.pi * t / 200)).astype(np.uint16)
+    results = pipeline.results()
+    time.sleep(3)  # Let the workers start
+    processed = 0
+    published = 0
+    start = time.monotonic()
+    try:
+        while time.monotonic() - start < 5:
+            source.publish(codes)
+            published += 1
+            if published % 16 == 0:
+                processed += len(results.read())
+        elapsed = time.monotonic() - start
+        processed += len(results.read())
+        print(f"{pipeline.workers} workers: {processed / elapsed:.0f} blocks/s processed "
+              f"({processed * len(codes) / elapsed / 1e6:.1f} MS/s) of {published / elapsed:.0f} blocks/s published")
+    finally:
+        pipeline.close()
+        source.close()
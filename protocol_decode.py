@@ -0,0 +1,369 @@
+import sys
+import time
+import bisect
+import argparse
+from collections import namedtuple
+import numpy as np
+
+PROTOCOLS = ("UART", "SPI", "I2C")
+PARITIES = ("None", "Even", "Odd")
+MAX_TAIL = 1 << 20  # Samples kept for an unfinished word before giving up on it
+
+# start/end are absolute sample positions, kind names the line or event
+Annotation = namedtuple('Annotation', 'start end kind value text')
+
+def rising_edges(x):
+    return np.flatnonzero(~x[:-1] & x[1:]) + 1
+
+def falling_edges(x):
+    return np.flatnonzero(x[:-1] & ~x[1:]) + 1
+
+class Thresholder:
+    # Volts to logic levels with hysteresis: samples inside the band keep
+    # the last level, carried over from the previous chunk
+    def __init__(self, level=1.65, hysteresis=0.1):
+        self.level = level
+        self.hysteresis = hysteresis
+        self.reset()
+
+    def reset(self):
+        self.state = None
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        if not len(x):
+            return np.empty(0, dtype=bool)
+        high = x > self.level + self.hysteresis
+        known = high | (x < self.level - self.hysteresis)
+        index = np.where(known, np.arange(len(x)), -1)
+        np.maximum.accumulate(index, out=index)
+        levels = high[index]
+        if self.state is None:
+            self.state = bool(x[0] > self.level)
+        levels[index < 0] = self.state
+        self.state = bool(levels[-1])
+        return levels
+
+class LogicDecoder:
+    # Thresholds each line and decodes chunk by chunk. Samples from the
+    # start of an unfinished word are kept and put in front of the next
+    # chunk, so words split across chunks decode as if the capture were
+    # one array; subclasses only see whole arrays and return how many
+    # leading samples they are done with.
+    lines = ()
+
+    def __init__(self, sample_rate, level=1.65, hysteresis=0.1):
+        self.sample_rate = sample_rate
+        self.thresholds = {line: Thresholder(level, hysteresis) for line in self.lines}
+        self.reset()
+
+    def reset(self, position=0):
+        # Annotations count samples from `position`
+        for threshold in self.thresholds.values():
+            threshold.reset()
+        self.tail = None
+        self.position = position
+
+    def decode(self, signals):
+        # signals maps line names to equal-length chunks of volts
+        levels = {line: self.thresholds[line].process(signals[line]) for line in self.lines if line in signals}
+        if self.tail is not None:
+            levels = {line: np.concatenate((self.tail[line], x)) for line, x in levels.items()}
+        n = len(next(iter(levels.values())))
+        if n < 2:
+            self.tail = levels
+            return []
+        annotations, done = self.decode_levels(levels, self.position)
+        if n - done > MAX_TAIL:
+            done = n - 1
+        self.tail = {line: x[done:] for line, x in levels.items()}
+        self.position += done
+        return annotations
+
+class UartDecoder(LogicDecoder):
+    # Idle-high asynchronous serial, LSB first. Every falling edge that is
+    # not inside a frame is a start bit; bits are read at their centres.
+    lines = ('RX',)
+
+    def __init__(self, sample_rate, baud=115200, bits=8, parity="None", stop_bits=1, **kwargs):
+        self.baud = baud
+        self.bits = bits
+        self.parity = parity
+        self.stop_bits = stop_bits
+        super().__init__(sample_rate, **kwargs)
+        spb = sample_rate / baud
+        self.frame_bits = 1 + bits + (parity != "None") + stop_bits
+        self.offsets = np.round((np.arange(self.frame_bits) + 0.5) * spb).astype(np.int64)
+        self.length = int(np.ceil(self.frame_bits * spb))
+        self.weights = 1 << np.arange(bits)
+
+    def decode_levels(self, levels, base):
+        rx = levels['RX']
+        edges = falling_edges(rx)
+        last = self.offsets[-1]
+        stop_centre = self.offsets[self.frame_bits - self.stop_bits]
+        starts = []
+        i = 0
+        while i < len(edges):
+            start = edges[i]
+            if start + last >= len(rx):
+                break  # Finished by a later chunk
+            if rx[start + self.offsets[0]]:
+                i += 1  # Glitch, the start bit did not last
+                continue
+            starts.append(start)
+            i = np.searchsorted(edges, start + stop_centre)
+        done = edges[i] - 1 if i < len(edges) else len(rx) - 1
+        if not starts:
+            return [], done
+
+        starts = np.asarray(starts)
+        sampled = rx[starts[:, None] + self.offsets]
+        data = sampled[:, 1:1 + self.bits]
+        values = data @ self.weights
+        framing = ~sampled[:, self.frame_bits - self.stop_bits:].all(axis=1)
+        parity = np.zeros(len(starts), dtype=bool)
+        if self.parity != "None":
+            ones = data.sum(axis=1) + sampled[:, 1 + self.bits]
+            parity = ones % 2 != (self.parity == "Odd")
+        annotations = []
+        for start, value, fe, pe in zip((starts + base).tolist(), values.tolist(), framing, parity):
+            text = f"{value:02X}"
+            if 32 <= value < 127:
+                text += f" '{chr(value)}'"
+            if fe or pe:
+                text += " FE" if fe else " PE"
+            annotations.append(Annotation(start, start + self.length, 'Error' if fe or pe else 'RX', value, text))
+        return annotations, done
+
+class SpiDecoder(LogicDecoder):
+    # Clocked words on MOSI and MISO, sampled on the edge the mode selects.
+    # With CS (active low) every select starts a new word; without it the
+    # words simply follow each other.
+    lines = ('SCLK', 'MOSI', 'MISO', 'CS')
+
+    def __init__(self, sample_rate, mode=0, bits=8, msb_first=True, **kwargs):
+        self.mode = mode
+        self.bits = bits
+        super().__init__(sample_rate, **kwargs)
+        order = np.arange(bits)
+        self.weights = 1 << (order[::-1] if msb_first else order)
+
+    def decode_levels(self, levels, base):
+        clock = levels['SCLK']
+        cpol, cpha = self.mode >> 1, self.mode & 1
+        edges = rising_edges(clock) if cpol == cpha else falling_edges(clock)
+        if 'CS' in levels:
+            select = levels['CS']
+            edges = edges[~select[edges]]
+            selects = falling_edges(select)
+        else:
+            selects = np.empty(0, dtype=np.int64)
+        segment = np.searchsorted(selects, edges, side='right')
+        rank = np.arange(len(edges)) - np.searchsorted(segment, segment, side='left')
+        words = np.flatnonzero(rank % self.bits == 0)
+        complete = words[words + self.bits - 1 < len(edges)]
+        complete = complete[segment[complete + self.bits - 1] == segment[complete]]
+
+        done = len(clock) - 1
+        if len(words) and (not len(complete) or words[-1] != complete[-1]) and segment[words[-1]] == len(selects):
+            if 'CS' not in levels or not levels['CS'][-1]:
+                done = edges[words[-1]] - 1  # Word still being clocked in
+
+        index = edges[complete[:, None] + np.arange(self.bits)]
+        values = {line: (levels[line][index] @ self.weights).tolist() for line in ('MOSI', 'MISO') if line in levels}
+        starts = (index[:, 0] + base).tolist()
+        ends = (index[:, -1] + base + 1).tolist()
+        annotations = []
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            for line, line_values in values.items():
+                value = line_values[i]
+                annotations.append(Annotation(start, end, line, value, f"{value:0{(self.bits + 3) // 4}X}"))
+        return annotations, done
+
+class I2cDecoder(LogicDecoder):
+    # START/STOP are SDA edges while SCL is high; between them SDA is read
+    # on each SCL rise in groups of eight bits and an acknowledge. The
+    # first byte after a (repeated) START is the address.
+    lines = ('SCL', 'SDA')
+
+    def reset(self, position=0):
+        super().reset(position)
+        self.open = False
+        self.words = 0
+
+    def decode_levels(self, levels, base):
+        scl, sda = levels['SCL'], levels['SDA']
+        falls = falling_edges(sda)
+        rises = rising_edges(sda)
+        starts = falls[scl[falls] & scl[falls - 1]]
+        stops = rises[scl[rises] & scl[rises - 1]]
+        clocks = rising_edges(scl)
+
+        # Transaction each clock belongs to, -1 for the one carried over
+        segment = np.searchsorted(starts, clocks, side='right') - 1
+        opened = np.full(len(clocks), -1)
+        opened[segment >= 0] = starts[segment[segment >= 0]]
+        valid = np.searchsorted(stops, clocks) == np.searchsorted(stops, opened)
+        if not self.open:
+            valid &= segment >= 0
+        clocks, segment = clocks[valid], segment[valid]
+        rank = np.arange(len(clocks)) - np.searchsorted(segment, segment, side='left')
+        words = np.flatnonzero(rank % 9 == 0)
+        complete = words[words + 8 < len(clocks)]
+        complete = complete[segment[complete + 8] == segment[complete]]
+        number = rank[complete] // 9 + np.where(segment[complete] < 0, self.words, 0)
+
+        # Still inside a transaction at the end of the chunk?
+        last = len(starts) - 1
+        if len(starts):
+            still_open = not np.any(stops > starts[-1])
+        else:
+            still_open = self.open and not len(stops)
+        done = len(scl) - 1
+        if still_open:
+            tail = complete[segment[complete] == last]
+            self.words = len(tail) + (self.words if last < 0 else 0)
+            if len(words) and segment[words[-1]] == last and (not len(complete) or words[-1] != complete[-1]):
+                done = clocks[words[-1]] - 1
+        else:
+            self.words = 0
+        self.open = still_open
+
+        index = clocks[complete[:, None] + np.arange(9)]
+        bits = sda[index]
+        values = (bits[:, :8] @ (1 << np.arange(7, -1, -1))).tolist()
+        acks = (~bits[:, 8]).tolist()
+        annotations = []
+        for start, end, value, ack, n in zip((index[:, 0] + base).tolist(), (index[:, -1] + base + 1).tolist(),
+                                             values, acks, number.tolist()):
+            suffix = "" if ack else " NAK"
+            if n == 0:
+                text = f"Addr {value >> 1:02X} {'R' if value & 1 else 'W'}{suffix}"
+                annotations.append(Annotation(start, end, 'Address', value >> 1, text))
+            else:
+                annotations.append(Annotation(start, end, 'Data', value, f"{value:02X}{suffix}"))
+        # An edge at `done` starts the next chunk, which can't see it as an edge
+        for kind, text, positions in (('Start', "S", starts), ('Stop', "P", stops)):
+            for position in positions[positions <= done].tolist():
+                annotations.append(Annotation(position + base, position + base + 1, kind, None, text))
+        annotations.sort(key=lambda a: a.start)
+        return annotations, done
+
+DECODERS = {"UART": UartDecoder, "SPI": SpiDecoder, "I2C": I2cDecoder}
+
+class DecodeLog:
+    # Annotations in time order, trimmed to the newest `keep`, with range
+    # lookup for the overlay and text or value search
+    def __init__(self, keep=100000):
+        self.keep = keep
+        self.clear()
+
+    def clear(self):
+        self.annotations = []
+        self.starts = []
+
+    def extend(self, annotations):
+        self.annotations.extend(annotations)
+        self.starts.extend(a.start for a in annotations)
+        if len(self.annotations) > 2 * self.keep:
+            del self.annotations[:-self.keep]
+            del self.starts[:-self.keep]
+
+    def in_range(self, start, stop):
+        return self.annotations[bisect.bisect_left(self.starts, start):bisect.bisect_left(self.starts, stop)]
+
+    def search(self, query, after=None):
+        # Annotations whose text contains the query, or whose value equals
+        # it read as a number (0x41, 65)
+        try:
+            number = int(query, 0)
+        except ValueError:
+            number = None
+        query = query.lower()
+        first = 0 if after is None else bisect.bisect_right(self.starts, after)
+        return [a for a in self.annotations[first:] if a.value == number or query in a.text.lower()]
+
+class DecodeOverlay:
+    # Labels for the annotations in view, drawn from a reused pool of
+    # text items so redraws do not create Qt objects
+    def __init__(self, plot_widget, max_labels=200):
+        import pyqtgraph as pg
+        self.plot_widget = plot_widget
+        self.items = []
+        for _ in range(max_labels):
+            item = pg.TextItem(color=(0, 220, 255), anchor=(0.5, 1))
+            item.setVisible(False)
+            plot_widget.addItem(item)
+            self.items.append(item)
+
+    def show(self, annotations, to_x, y):
+        if len(annotations) > len(self.items):
+            annotations = annotations[::-(-len(annotations) // len(self.items))]
+        for item, annotation in zip(self.items, annotations):
+            item.setText(annotation.text)
+            item.setPos(to_x((annotation.start + annotation.end) / 2), y)
+            item.setVisible(True)
+        for item in self.items[len(annotations):]:
+            item.setVisible(False)
+
+    def clear(self):
+        for item in self.items:
+            item.setVisible(False)
+
+def decode_recording(path, decoder, columns, chunk=1 << 20):
+    # Decodes a recording saved by WaveformRecorder a chunk at a time;
+    # columns maps decoder lines to recording columns
+    from waveform_export import load_waveform
+    data, _ = load_waveform(path)
+    if data.ndim == 1:
+        data = data[:, None]
+    decoder.reset()
+    for i in range(0, len(data), chunk):
+        block = data[i:i + chunk]
+        yield from decoder.decode({line: block[:, column] for line, column in columns.items()})
+
+def uart_waveform(text, sample_rate, baud, idle=20):
+    # Test signal: 3.3 V idle-high 8N1 frames with some idle bits between
+    bits = []
+    for value in text.encode():
+        bits += [1] * idle + [0] + [(value >> i) & 1 for i in range(8)] + [1]
+    bits += [1] * idle
+    times = np.arange(int(len(bits) * sample_rate / baud))
+    return np.asarray(bits, dtype=np.float32)[(times * baud // sample_rate).astype(np.int64)] * 3.3
+
+def benchmark(sample_rate=1000000, baud=115200, chunk=65536):
+    signal = uart_waveform("The quick brown fox jumps over the lazy dog. " * 200, sample_rate, baud, idle=1)
+    decoder = UartDecoder(sample_rate, baud)
+    start = time.perf_counter()
+    count = 0
+    for i in range(0, len(signal), chunk):
+        count += len(decoder.decode({'RX': signal[i:i + chunk]}))
+    elapsed = time.perf_counter() - start
+    print(f"UART {baud} baud: {count} bytes from {len(signal)} samples in {elapsed * 1e3:.0f} ms "
+          f"({len(signal) / elapsed / 1e6:.1f} MS/s, {len(signal) / elapsed / sample_rate:.0f}x real time)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode UART, SPI or I2C from a recording")
+    parser.add_argument('recording', nargs='?', help="omit to run a UART benchmark")
+    parser.add_argument('--protocol', choices=PROTOCOLS, default="UART")
+    parser.add_argument('--lines', default="", help="line=column pairs, e.g. SCL=0,SDA=1")
+    parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--mode', type=int, default=0, help="SPI mode 0-3")
+    parser.add_argument('--level', type=float, default=1.65, help="logic threshold in volts")
+    parser.add_argument('--search', help="only print annotations matching this text or value")
+    args = parser.parse_args()
+    if args.recording is None:
+        benchmark()
+        sys.exit(0)
+    from waveform_export import read_metadata
+    metadata = read_metadata(args.recording)
+    rate = metadata.get('sample_rate', 1000000)
+    options = {"UART": {'baud': args.baud}, "SPI": {'mode': args.mode}, "I2C": {}}[args.protocol]
+    decoder = DECODERS[args.protocol](rate, level=args.level, **options)
+    columns = dict((pair.split('=')[0], int(pair.split('=')[1])) for pair in args.lines.split(',') if pair)
+    columns = columns or {line: i for i, line in enumerate(decoder.lines[:metadata.get('columns', 1)])}
+    log = DecodeLog(keep=sys.maxsize)
+    log.extend(list(decode_recording(args.recording, decoder, columns)))
+    for annotation in (log.search(args.search) if args.search else log.annotations):
+        print(f"{annotation.start / rate * 1e3:12.4f} ms  {annotation.kind:8s} {annotation.text}")
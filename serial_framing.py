@@ -0,0 +1,146 @@
+import sys
+import time
+import struct
+import numpy as np
+
+# Block framing used by esp-scope.ino, all little-endian:
+#   sync word A5 5A C3 3C, u16 block counter, u16 sample count,
+#   u8 channels, u8 flags, then the samples, then a u16 sum of the sample
+#   bytes when flags has FLAG_CHECKSUM.
+# The counter is bumped for every block the ADC task fills, so blocks the
+# sender skipped show up as lost too.
+SYNC = b'\xa5\x5a\xc3\x3c'
+HEADER = struct.Struct('<4sHHBB')
+CHECKSUM = struct.Struct('<H')
+FLAG_CHECKSUM = 0x01
+MAX_COUNT = 8192
+# Without a sync word in this many bytes the device is taken to be running
+# firmware that sends bare samples
+RAW_DETECT_BYTES = 4 * (HEADER.size + MAX_COUNT)
+
+def frame_checksum(samples):
+    return int(np.sum(samples, dtype=np.uint32)) & 0xFFFF
+
+def build_frame(counter, samples, channels=1, checksum=True):
+    samples = np.asarray(samples, dtype=np.uint8)
+    flags = FLAG_CHECKSUM if checksum else 0
+    frame = HEADER.pack(SYNC, counter & 0xFFFF, len(samples), channels, flags) + samples.tobytes()
+    if checksum:
+        frame += CHECKSUM.pack(frame_checksum(samples))
+    return frame
+
+class FrameParser:
+    # Stream parser for the framing above. Bytes are appended to one
+    # buffer; sync words are found with bytearray.find and every sample is
+    # copied once, straight from the buffer into the returned array. After
+    # noise or a bad checksum it searches for the next sync word, and gaps
+    # in the block counter are counted as lost blocks.
+    def __init__(self, detect_raw=True):
+        self.detect_raw = detect_raw
+        self.reset()
+
+    def reset(self):
+        self.buffer = bytearray()
+        self.framed = None if self.detect_raw else True
+        self.counter = None
+        self.channels = 1
+        self.blocks = 0
+        self.lost = 0
+        self.checksum_errors = 0
+        self.skipped = 0
+
+    def feed(self, data):
+        # Returns the samples of every complete block in `data` plus what
+        # was buffered before it, as one uint8 array
+        if self.framed is False:
+            return np.frombuffer(data, dtype=np.uint8)
+        self.buffer += data
+        buffer = self.buffer
+        view = memoryview(buffer)
+        pieces = []
+        pos = 0
+        try:
+            while True:
+                start = buffer.find(SYNC, pos)
+                if start < 0:
+                    # Keep a partial sync word at the end
+                    keep = max(pos, len(buffer) - len(SYNC) + 1)
+                    self.skipped += keep - pos
+                    pos = keep
+                    break
+                self.skipped += start - pos
+                pos = start
+                if len(buffer) - pos < HEADER.size:
+                    break
+                _, counter, count, channels, flags = HEADER.unpack_from(buffer, pos)
+                if count > MAX_COUNT or not channels:
+                    # Sync word inside noise or samples
+                    self.skipped += 1
+                    pos += 1
+                    continue
+                end = pos + HEADER.size + count
+                total = end + (CHECKSUM.size if flags & FLAG_CHECKSUM else 0)
+                if len(buffer) < total:
+                    break
+                samples = np.frombuffer(view[pos + HEADER.size:end], dtype=np.uint8)
+                if flags & FLAG_CHECKSUM and CHECKSUM.unpack_from(buffer, end)[0] != frame_checksum(samples):
+                    self.checksum_errors += 1
+                    self.skipped += 1
+                    pos += 1
+                    continue
+                gap = (counter - self.counter - 1) & 0xFFFF if self.counter is not None else 0
+                if gap < 0x8000:
+                    self.lost += gap
+                # A larger gap is the counter stepping back, as after a
+                # device reset, so counting restarts from this block
+                self.counter = counter
+                self.channels = channels
+                self.blocks += 1
+                self.framed = True
+                pieces.append(samples)
+                pos = total
+            samples = np.concatenate(pieces) if pieces else np.empty(0, dtype=np.uint8)
+        finally:
+            # The views have to go before the buffer can be resized
+            del pieces
+            view.release()
+        if self.framed is None and self.skipped + len(buffer) - pos >= RAW_DETECT_BYTES:
+            self.framed = False
+            samples = np.frombuffer(bytes(buffer), dtype=np.uint8)
+            pos = len(buffer)
+        del buffer[:pos]
+        return samples
+
+    def status_text(self):
+        if self.framed is False:
+            return "Unframed stream"
+        text = f"Blocks {self.blocks}  lost {self.lost}"
+        if self.checksum_errors:
+            text += f"  bad {self.checksum_errors}"
+        return text
+
+def benchmark(seconds=2.0, block=2048, noise=0.01):
+    # Framed stream with random noise bursts, fed in serial-sized reads
+    rng = np.random.default_rng(0)
+    frames = []
+    for counter in range(256):
+        frames.append(build_frame(counter, rng.integers(0, 256, block)))
+        if rng.random() < noise:
+            frames.append(rng.integers(0, 256, int(rng.integers(1, 64)), dtype=np.uint8).tobytes())
+    stream = b''.join(frames)
+    reads = [stream[i:i + 4096] for i in range(0, len(stream), 4096)]
+    parser = FrameParser()
+    for data in reads:
+        parser.feed(data)
+    print(f"{parser.status_text()}  skipped {parser.skipped} bytes of noise")
+    fed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for data in reads:
+            parser.feed(data)
+        fed += len(stream)
+    elapsed = time.perf_counter() - start
+    print(f"{fed / elapsed / 1e6:.1f} MB/s parsed ({fed / elapsed / 200e3:.0f}x a 2 Mbaud link)")
+
+if __name__ == "__main__":
+    benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0)
@@ -0,0 +1,141 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+RING_NAME = 'adc_ring'
+RING_MAGIC = 0x52494E47  # 'RING'
+
+# Shared memory layout (all little-endian uint64 words, then data):
+#   [0] magic  [1] slots  [2] slot_bytes  [3] write sequence
+#   slot headers, two words per slot: seqlock counter, byte length
+#   slot data, slots * slot_bytes
+# The single producer bumps a slot's counter to odd before writing it and
+# to even after, then advances the write sequence. Readers keep their own
+# cursor, so any number of them can follow without locks; a reader checks
+# the counter again after using a slot to know the data was not
+# overwritten underneath it.
+HEADER_WORDS = 4
+CREATED = set()  # Rings this process created and will unlink
+
+def attach_shared_memory(name, keep_tracking=False):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13 attaching also registers the segment for cleanup,
+    # which would unlink it when this process exits; unregister it again.
+    # Not for a segment about to be unlinked here, or one created by this
+    # process or by another sharing its tracker (pipeline workers and
+    # their parent): registering twice is a no-op there, and unregistering
+    # would drop the creator's entry.
+    shm = shared_memory.SharedMemory(name=name)
+    if not keep_tracking and name not in CREATED:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+class SharedRing:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        words = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        if int(words[0]) != RING_MAGIC:
+            raise ValueError(f"{shm.name} is not a sample ring")
+        self.slots = int(words[1])
+        self.slot_bytes = int(words[2])
+        self.header = words
+        self.slot_headers = np.ndarray((self.slots, 2), dtype=np.uint64, buffer=shm.buf, offset=HEADER_WORDS * 8)
+        data_offset = (HEADER_WORDS + 2 * self.slots) * 8
+        self.data = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=shm.buf, offset=data_offset)
+
+    @classmethod
+    def create(cls, name=RING_NAME, slots=256, slot_bytes=4000):
+        size = (HEADER_WORDS + 2 * slots) * 8 + slots * slot_bytes
+        try:
+            # Left over from a producer that did not shut down cleanly
+            stale = attach_shared_memory(name, keep_tracking=True)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        CREATED.add(name)
+        words = np.ndarray((HEADER_WORDS + 2 * slots,), dtype=np.uint64, buffer=shm.buf)
+        words[:] = 0
+        words[:3] = (RING_MAGIC, slots, slot_bytes)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=RING_NAME, keep_tracking=False):
+        return cls(attach_shared_memory(name, keep_tracking), owner=False)
+
+    def write_sequence(self):
+        return int(self.header[3])
+
+    def publish(self, block):
+        block = np.frombuffer(block, dtype=np.uint8) if isinstance(block, (bytes, bytearray, memoryview)) \
+            else np.ascontiguousarray(block).view(np.uint8).ravel()
+        if len(block) > self.slot_bytes:
+            raise ValueError(f"Block of {len(block)} bytes does not fit a {self.slot_bytes} byte slot")
+        seq = int(self.header[3])
+        slot = seq % self.slots
+        self.slot_headers[slot, 0] = 2 * seq + 1
+        self.data[slot, :len(block)] = block
+        self.slot_headers[slot, 1] = len(block)
+        self.slot_headers[slot, 0] = 2 * seq + 2
+        self.header[3] = seq + 1
+
+    def block(self, seq):
+        # View of an earlier block if it has not been overwritten yet
+        slot = seq % self.slots
+        if int(self.slot_headers[slot, 0]) != 2 * seq + 2:
+            return None
+        return self.data[slot, :int(self.slot_headers[slot, 1])]
+
+    def reader(self, from_latest=True):
+        return RingReader(self, from_latest)
+
+    def close(self):
+        self.header = self.slot_headers = self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            CREATED.discard(self.shm.name)
+
+class RingReader:
+    def __init__(self, ring, from_latest=True):
+        self.ring = ring
+        self.next_seq = ring.write_sequence() if from_latest else 0
+        self.lost = 0
+
+    def read(self):
+        # Returns (seq, view) for the next block, or None if none is ready.
+        # The view points into shared memory: use it, then call valid(seq).
+        ring = self.ring
+        head = ring.write_sequence()
+        if self.next_seq >= head:
+            return None
+        if head - self.next_seq > ring.slots - 1:
+            # Fell more than a ring behind; skip to the oldest safe slot
+            skipped = head - (ring.slots - 1) - self.next_seq
+            self.lost += skipped
+            self.next_seq += skipped
+        seq = self.next_seq
+        self.next_seq += 1
+        view = ring.block(seq)
+        if view is None:
+            self.lost += 1
+            return None
+        return seq, view
+
+    def valid(self, seq):
+        return int(self.ring.slot_headers[seq % self.ring.slots, 0]) == 2 * seq + 2
+
+    def wait(self, timeout=1.0, poll_interval=0.0005):
+        # Polls with a short sleep, so an idle viewer costs almost no CPU
+        deadline = time.monotonic() + timeout
+        while True:
+            block = self.read()
+            if block is not None or time.monotonic() >= deadline:
+                return block
+            if self.next_seq >= self.ring.write_sequence():
+                time.sleep(poll_interval)
@@ -0,0 +1,81 @@
+import threading
+import numpy as np
+from minmax_pyramid import Level, MinMaxPyramid
+
+class StripChartStore:
+    # Recent samples are kept as they are and every sample goes into a
+    # bounded min/max pyramid, so a redraw costs about two points per pixel
+    # however long the history is.
+    def __init__(self, sample_rate, level_points=1 << 22):
+        self.sample_rate = sample_rate
+        self.level_points = level_points
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.raw = Level(1, self.level_points, paired=False)
+            self.pyramid = MinMaxPyramid(max_points=self.level_points)
+
+    def append(self, data):
+        data = np.asarray(data, dtype=np.float32)
+        with self.lock:
+            self.raw.append(data, data)
+            self.pyramid.append(data)
+
+    def latest_time(self):
+        return self.pyramid.count / self.sample_rate
+
+    def read_raw(self, start, stop):
+        first, samples, _ = self.raw.read(start, stop)
+        return first, samples
+
+    def render(self, t_start, t_end, pixels):
+        # Returns (times, values) for the range
+        rate = self.sample_rate
+        with self.lock:
+            positions, values = self.pyramid.render(int(t_start * rate), int(np.ceil(t_end * rate)), pixels, self.read_raw)
+        return positions / rate, values
+
+class StripChart:
+    # Roll mode for a plot: follows the newest data right to left until the
+    # view is panned or zoomed away from it, and redraws on every view change.
+    def __init__(self, plot_widget, curve, sample_rate, span=10.0, level_points=1 << 22):
+        self.store = StripChartStore(sample_rate, level_points)
+        self.plot_widget = plot_widget
+        self.curve = curve
+        self.span = span
+        self.follow = True
+        self.enabled = False
+        self.updating = False
+        plot_widget.getViewBox().sigXRangeChanged.connect(self.view_changed)
+
+    def append(self, data):
+        self.store.append(data)
+
+    def clear(self):
+        self.store.clear()
+        self.follow = True
+
+    def view_changed(self, *args):
+        if not self.enabled or self.updating:
+            return
+        t_start, t_end = self.plot_widget.viewRange()[0]
+        self.span = t_end - t_start
+        self.follow = t_end >= self.store.latest_time() - 0.02 * self.span
+        self.draw(t_start, t_end)
+
+    def redraw(self):
+        if self.follow:
+            t_end = self.store.latest_time()
+            t_start = t_end - self.span
+            self.updating = True
+            self.plot_widget.setXRange(t_start, t_end, padding=0)
+            self.updating = False
+        else:
+            t_start, t_end = self.plot_widget.viewRange()[0]
+        self.draw(t_start, t_end)
+
+    def draw(self, t_start, t_end):
+        pixels = int(self.plot_widget.getViewBox().width()) or 1000
+        self.curve.setData(*self.store.render(t_start, t_end, pixels))
@@ -0,0 +1,92 @@
+import random
+import numpy as np
+import pytest
+from protocol_decode import I2cDecoder, SpiDecoder, UartDecoder, uart_waveform
+
+SAMPLE_RATE = 1000000
+
+def volts(levels):
+    return np.asarray(levels, dtype=np.float32) * 3.3
+
+def spi_waveform(words, mode=0, bits=8, half=5):
+    cpol, cpha = mode >> 1, mode & 1
+    sclk, mosi, cs = [cpol] * 10, [0] * 10, [1] * 10
+
+    def put(clock, bit, select, n=half):
+        sclk.extend([clock] * n)
+        mosi.extend([bit] * n)
+        cs.extend([select] * n)
+
+    for word in words:
+        put(cpol, 0, 0)
+        for i in range(bits):
+            bit = (word >> (bits - 1 - i)) & 1
+            first, second = (cpol, 1 - cpol) if cpha == 0 else (1 - cpol, cpol)
+            put(first, bit, 0)
+            put(second, bit, 0)
+        put(cpol, 0, 0)
+        put(cpol, 0, 1, 3 * half)
+    return {'SCLK': volts(sclk), 'MOSI': volts(mosi), 'CS': volts(cs)}
+
+def i2c_waveform(transactions, quarter=4):
+    scl, sda = [], []
+
+    def put(clock, data, n=quarter):
+        scl.extend([clock] * n)
+        sda.extend([data] * n)
+
+    put(1, 1, 20)
+    for address, read, data in transactions:
+        put(1, 0)  # START
+        put(0, 0)
+        for byte in [(address << 1) | read] + data:
+            for i in range(8):
+                bit = (byte >> (7 - i)) & 1
+                put(0, bit)
+                put(1, bit)
+                put(0, bit)
+            put(0, 0)  # ACK
+            put(1, 0)
+            put(0, 0)
+        put(0, 0)
+        put(1, 0)
+        put(1, 1, 20)  # STOP
+    return {'SCL': volts(scl), 'SDA': volts(sda)}
+
+def decode_chunks(decoder, signals, bounds):
+    annotations = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        annotations += decoder.decode({line: x[start:end] for line, x in signals.items()})
+    return annotations
+
+def check_splits(make_decoder, signals, random_chunkings=50, max_chunk=300):
+    # Every two-way split, then random chunkings, must decode the same as
+    # the whole capture
+    n = len(next(iter(signals.values())))
+    whole = make_decoder().decode(signals)
+    assert whole
+    for split in range(1, n):
+        assert decode_chunks(make_decoder(), signals, [0, split, n]) == whole, f"split at {split}"
+    rng = random.Random(1)
+    for _ in range(random_chunkings):
+        bounds = [0]
+        while bounds[-1] < n:
+            bounds.append(min(n, bounds[-1] + rng.randint(1, max_chunk)))
+        assert decode_chunks(make_decoder(), signals, bounds) == whole, f"chunks {bounds}"
+    return whole
+
+def test_uart_split_anywhere():
+    signals = {'RX': uart_waveform("Hi, 0x55!", SAMPLE_RATE, 115200, idle=3)}
+    whole = check_splits(lambda: UartDecoder(SAMPLE_RATE, 115200), signals)
+    assert ''.join(chr(a.value) for a in whole) == "Hi, 0x55!"
+
+@pytest.mark.parametrize('mode', range(4))
+def test_spi_split_anywhere(mode):
+    words = [0xA5, 0x3C, 0xFF, 0x00, 0x81]
+    whole = check_splits(lambda: SpiDecoder(SAMPLE_RATE, mode=mode), spi_waveform(words, mode), max_chunk=60)
+    assert [a.value for a in whole if a.kind == 'MOSI'] == words
+
+def test_i2c_split_anywhere():
+    signals = i2c_waveform([(0x50, 0, [0x12, 0x34]), (0x51, 1, [0xAB])])
+    whole = check_splits(lambda: I2cDecoder(SAMPLE_RATE), signals, random_chunkings=200, max_chunk=40)
+    assert [a.text for a in whole] == ['S', 'Addr 50 W', '12', '34', 'P', 'S', 'Addr 51 R', 'AB', 'P']
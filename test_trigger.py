@@ -0,0 +1,100 @@
+import random
+import numpy as np
+import pytest
+from trigger import SWEEP_MODES, Trigger
+
+LENGTH = 64
+
+def stream(n=4000, seed=0):
+    # Noisy sine with a drifting period, so edges land at uneven spacings
+    rng = np.random.default_rng(seed)
+    phase = np.cumsum(2 * np.pi / rng.uniform(30, 45, n))
+    return (np.sin(phase) + rng.normal(0, 0.05, n)).astype(np.float32)
+
+def run(trigger, data, bounds):
+    frames, starts = [], []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        out = trigger.process(data[start:end])
+        frames.append(out)
+        if len(out):
+            starts.append(trigger.last_start)
+    return np.concatenate(frames), starts
+
+def random_bounds(rng, n, max_chunk):
+    bounds = [0]
+    while bounds[-1] < n:
+        bounds.append(min(n, bounds[-1] + rng.randint(1, max_chunk)))
+    return bounds
+
+def check_splits(make_trigger, data, random_chunkings=50, max_chunk=300):
+    # Random chunkings must give the same frames as the whole stream
+    n = len(data)
+    whole, whole_starts = run(make_trigger(), data, [0, n])
+    assert len(whole)
+    rng = random.Random(1)
+    for _ in range(random_chunkings):
+        bounds = random_bounds(rng, n, max_chunk)
+        frames, starts = run(make_trigger(), data, bounds)
+        np.testing.assert_array_equal(frames, whole, err_msg=f"chunks {bounds}")
+        # Several frames in one block only report the newest start
+        assert starts[-1] == whole_starts[-1]
+    return whole
+
+@pytest.mark.parametrize('holdoff', [0, 100])
+@pytest.mark.parametrize('mode', SWEEP_MODES)
+def test_split_anywhere(mode, holdoff):
+    data = stream()
+    whole = check_splits(lambda: Trigger(LENGTH, pre_trigger=25, mode=mode, holdoff=holdoff), data)
+    pre = int(round(LENGTH * 0.25))
+    # Every frame crosses the level rising between its pre-trigger and trigger samples
+    assert np.all(whole[:, pre - 1] < 0) and np.all(whole[:, pre] >= 0)
+    if mode == "Single":
+        assert len(whole) == 1
+
+def test_holdoff_spaces_frames():
+    data = stream()
+    counts = [len(run(Trigger(LENGTH, mode="Normal", holdoff=holdoff), data, [0, len(data)])[0])
+              for holdoff in (0, 100, 400)]
+    assert counts[0] > counts[1] > counts[2] > 0
+    assert counts[2] <= len(data) // (LENGTH // 2 + 400) + 1
+
+@pytest.mark.parametrize('holdoff', [0, 100])
+@pytest.mark.parametrize('source', [0, 1])
+def test_split_anywhere_channels(source, holdoff):
+    data = np.column_stack((stream(seed=0), stream(seed=1)))
+
+    def make_trigger():
+        trigger = Trigger(LENGTH, slope="Falling", mode="Normal", holdoff=holdoff)
+        trigger.source = source
+        return trigger
+
+    whole = check_splits(make_trigger, data)
+    assert whole.shape[1:] == (LENGTH, 2)
+    pre = int(round(LENGTH * 0.5))
+    assert np.all(whole[:, pre - 1, source] > 0) and np.all(whole[:, pre, source] <= 0)
+
+def test_single_rearm_split_anywhere():
+    data = stream()
+    armed_at = 2000
+
+    def run_armed(bounds_before, bounds_after):
+        trigger = Trigger(LENGTH, mode="Single")
+        first, _ = run(trigger, data[:armed_at], bounds_before)
+        assert trigger.state == "Stopped"
+        trigger.arm()
+        second, _ = run(trigger, data[armed_at:], bounds_after)
+        return first, second
+
+    whole = run_armed([0, armed_at], [0, len(data) - armed_at])
+    assert len(whole[0]) == 1 and len(whole[1]) == 1
+    rng = random.Random(2)
+    for _ in range(50):
+        chunked = run_armed(random_bounds(rng, armed_at, 300), random_bounds(rng, len(data) - armed_at, 300))
+        np.testing.assert_array_equal(chunked[0], whole[0])
+        np.testing.assert_array_equal(chunked[1], whole[1])
+
+def test_auto_free_runs_without_edges():
+    trigger = Trigger(LENGTH, mode="Auto", auto_timeout=500)
+    frames, _ = run(trigger, np.full(2000, -1.0, dtype=np.float32), list(range(0, 2001, 100)))
+    assert len(frames) == 4
+    assert not trigger.triggered and trigger.state == "Auto"
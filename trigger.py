@@ -0,0 +1,113 @@
+import numpy as np
+
+SWEEP_MODES = ("Auto", "Normal", "Single")
+TRIGGER_SLOPES = ("Rising", "Falling")
+
+class Trigger:
+    # Edge trigger over a continuous stream. Each block is searched for
+    # crossings with NumPy; every armed crossing with enough samples around
+    # it becomes a frame of `length` samples, `pre` of them before the edge.
+    # After a frame the trigger re-arms once the post-trigger samples and
+    # the holdoff (in samples) have passed. Auto also emits an untriggered
+    # frame when nothing fired for `auto_timeout` samples; Single stops
+    # after one frame until arm() is called. last_start is the stream
+    # position of the first sample of the newest frame. Blocks may also be
+    # (samples, channels): column `source` is searched and frames are
+    # (n, length, channels).
+    def __init__(self, length, level=0.0, slope="Rising", mode="Auto", pre_trigger=50, holdoff=0, auto_timeout=None):
+        self.level = level
+        self.slope = slope
+        self.mode = mode
+        self.holdoff = holdoff
+        self.auto_timeout = auto_timeout or 10 * length
+        self.pre_trigger = pre_trigger
+        self.source = 0
+        self.set_length(length)
+
+    def set_length(self, length):
+        self.length = length
+        self.set_pre_trigger(self.pre_trigger)
+        self.reset()
+
+    def set_pre_trigger(self, percent):
+        self.pre_trigger = percent
+        self.pre = min(self.length - 1, int(round(self.length * percent / 100)))
+        self.post = self.length - self.pre
+
+    def reset(self):
+        self.tail = np.empty(0, dtype=np.float32)
+        self.position = 0
+        self.search_from = 0
+        self.last_frame = 0
+        self.last_start = 0
+        self.triggered = False
+        self.state = "Armed"
+
+    def arm(self):
+        self.search_from = self.position
+        self.last_frame = self.position
+        self.state = "Armed"
+
+    def edges(self, data, start):
+        # Indices i >= start where data crosses the level between i-1 and i
+        x = data[start - 1:]
+        if self.slope == "Falling":
+            above = x > self.level
+            crossing = above[:-1] & ~above[1:]
+        else:
+            above = x >= self.level
+            crossing = ~above[:-1] & above[1:]
+        return np.flatnonzero(crossing) + start
+
+    def process(self, block):
+        # Returns the frames completed by this block as a (n, length) array
+        block = np.asarray(block, dtype=np.float32)
+        if self.tail.shape[1:] != block.shape[1:]:
+            self.tail = np.empty((0,) + block.shape[1:], dtype=np.float32)
+        data = np.concatenate((self.tail, block))
+        base = self.position - len(self.tail)
+        self.position += len(block)
+        self.tail = data[-self.length:].copy()
+        empty = np.empty((0, self.length) + block.shape[1:], dtype=np.float32)
+        if self.state == "Stopped":
+            return empty
+        signal = data if data.ndim == 1 else data[:, self.source]
+
+        starts = []
+        start = max(1, self.pre, self.search_from - base)
+        if start < len(data):
+            edges = self.edges(signal, start)
+            spacing = self.post + self.holdoff
+            i = 0
+            while i < len(edges):
+                edge = edges[i]
+                if edge + self.post > len(data):
+                    break  # Completed by a later block
+                starts.append(edge - self.pre)
+                if self.mode == "Single":
+                    break
+                i = np.searchsorted(edges, edge + spacing)
+            if starts:
+                self.search_from = base + starts[-1] + self.pre + spacing
+            elif i < len(edges):
+                self.search_from = base + edges[i]
+            else:
+                self.search_from = base + len(data)
+
+        if starts:
+            self.triggered = True
+            self.last_frame = self.position
+            self.state = "Stopped" if self.mode == "Single" else "Triggered"
+            self.last_start = base + starts[-1]
+            index = np.asarray(starts)[:, None] + np.arange(self.length)
+            return data[index]
+        if self.mode == "Auto" and self.position - self.last_frame >= self.auto_timeout and len(data) >= self.length:
+            # Free-running frame so the trace never disappears
+            self.triggered = False
+            self.last_frame = self.position
+            self.state = "Auto"
+            self.last_start = self.position - self.length
+            return data[None, -self.length:].copy()
+        if self.position - self.last_frame >= self.auto_timeout:
+            self.state = "Armed"
+        return empty
@@ -1,36 +1,224 @@
-import serial
+import os
+import sys
 import time
+import random
+import argparse
+import threading
+from collections import deque
+import numpy as np
+import serial
+
+# Serial link benchmark. The far end sends a stream of little-endian uint32
+# counters (esp-scope.ino built with TEST_PATTERN, a TX-RX jumper with
+# --echo, or --loopback for a pseudo-terminal), so every lost byte is
+# counted exactly:
+#   python3 usb-test.py --port /dev/ttyUSB0 --baud 2000000 --duration 30
+#   python3 usb-test.py --loopback --baud 2000000 --drop 0.01
+
+SERIAL_PORT = 'COM10' if os.name == 'nt' else '/dev/ttyUSB0'
+BAUD_RATE = 2000000  # esp-scope.ino Serial.begin
+BLOCK_BYTES = 2048   # esp-scope.ino BUFFER_SIZE
+
+def pattern(offset, n):
+    # Bytes [offset, offset + n) of the counter stream
+    skip = offset % 4
+    first = offset // 4
+    words = np.arange(first, first + (skip + n + 3) // 4, dtype=np.uint64).astype('<u4')
+    return words.view(np.uint8)[skip:skip + n]
+
+class PatternChecker:
+    # Follows the counter stream; after a mismatch it finds the stream
+    # offset again from two consecutive counters and counts the bytes skipped
+    def __init__(self):
+        self.offset = None
+        self.synced = False
+        self.received = 0
+        self.lost = 0
+        self.errors = 0
+
+    def locate(self, data, pos):
+        # Stream offset of data[pos], or None if it cannot be found yet
+        for shift in range(4):
+            start = pos + shift
+            if start + 8 > len(data):
+                return None
+            first, second = np.frombuffer(data[start:start + 8].tobytes(), dtype='<u4')
+            if np.uint32(first + np.uint32(1)) == second:
+                return 4 * int(first) - shift
+        return None
+
+    def check(self, data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        self.received += len(data)
+        pos = 0
+        while pos < len(data):
+            if not self.synced:
+                found = self.locate(data, pos)
+                if found is None:
+                    if self.offset is not None:
+                        self.offset += len(data) - pos
+                    return
+                if self.offset is not None:
+                    self.account(found)
+                self.offset = found
+                self.synced = True
+            expected = pattern(self.offset, len(data) - pos)
+            mismatch = np.flatnonzero(data[pos:] != expected)
+            if not len(mismatch):
+                self.offset += len(data) - pos
+                return
+            self.offset += int(mismatch[0])
+            pos += int(mismatch[0])
+            self.synced = False
+
+    def account(self, found):
+        if found > self.offset:
+            self.lost += found - self.offset
+        elif found < self.offset:
+            self.errors += 1  # Repeated or corrupted bytes
+
+class LinkStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last_arrival = None
+        self.gaps = []
+        self.latencies = []
+
+    def arrival(self, now):
+        gap = 0.0
+        if self.last_arrival is not None:
+            gap = now - self.last_arrival
+            self.gaps.append(gap)
+        self.last_arrival = now
+        return gap
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+def stream_pattern(write, rate, block, stop, drop=0.0, injected=None, sent=None):
+    # Writes the counter stream at `rate` bytes/s, optionally dropping
+    # part of a block with probability `drop` to exercise the checker.
+    # `sent` collects (end offset, time) of every block for latency.
+    offset = 0
+    next_time = time.perf_counter()
+    while not stop.is_set():
+        data = pattern(offset, block).tobytes()
+        offset += block
+        if drop and random.random() < drop:
+            a = random.randrange(block)
+            b = random.randrange(a + 1, block + 1)
+            data = data[:a] + data[b:]
+            if injected is not None:
+                injected[0] += b - a
+        if sent is not None:
+            sent.append((offset, time.perf_counter()))
+        write(data)
+        next_time += block / rate
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+def open_loopback(args, stop, injected):
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(master)
+    rate = args.baud / 10
+    if args.echo:
+        def echo():
+            while not stop.is_set():
+                try:
+                    data = os.read(master, 65536)
+                except OSError:
+                    return
+                os.write(master, data)
+        target = echo
+    else:
+        def device():
+            try:
+                stream_pattern(lambda d: os.write(master, d), rate, args.block, stop, args.drop, injected)
+            except OSError:
+                pass
+        target = device
+    threading.Thread(target=target, daemon=True).start()
+    return os.ttyname(slave), master
+
+def run(args):
+    stop = threading.Event()
+    injected = [0]
+    master = None
+    port = args.port
+    if args.loopback:
+        port, master = open_loopback(args, stop, injected)
+    try:
+        ser = serial.Serial(port, args.baud, timeout=0.05)
+    except serial.SerialException as e:
+        print(f"Error: {e}")
+        return 2
+    print(f"Connected to {port} at {args.baud} baud" + (" (pty loopback)" if args.loopback else ""))
+    ser.reset_input_buffer()
+
+    checker = PatternChecker()
+    stats = LinkStats()
+    sent = deque()
+    if args.echo:
+        # Our own writes come back on RX; remember when each block left
+        threading.Thread(target=stream_pattern, daemon=True,
+                         args=(ser.write, args.baud / 10, args.block, stop), kwargs={'sent': sent}).start()
+
+    end = stats.start + args.duration
+    report_at = stats.start + 1
+    window_bytes = 0
+    window_gap = 0.0
+    try:
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            data = ser.read(max(1, ser.in_waiting))
+            now = time.perf_counter()
+            if data:
+                window_gap = max(window_gap, stats.arrival(now))
+                checker.check(data)
+                window_bytes += len(data)
+                if args.dump:
+                    print(data.hex())
+                while sent and checker.synced and checker.offset >= sent[0][0]:
+                    stats.latencies.append(now - sent.popleft()[1])
+            if now >= report_at:
+                print(f"{now - stats.start:6.1f} s  {window_bytes:10,d} B/s  "
+                      f"max gap {1e3 * window_gap:7.2f} ms  lost {checker.lost}")
+                window_bytes = 0
+                window_gap = 0.0
+                report_at += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        elapsed = time.perf_counter() - stats.start
+        ser.close()
+        if master is not None:
+            os.close(master)
+
+    line_rate = args.baud / 10
+    print(f"\nReceived {checker.received:,d} bytes in {elapsed:.1f} s: {checker.received / elapsed:,.0f} B/s "
+          f"({100 * checker.received / elapsed / line_rate:.1f}% of {line_rate:,.0f} B/s line rate)")
+    print(f"Lost bytes: {checker.lost:,d}  resync errors: {checker.errors}" +
+          (f"  injected: {injected[0]:,d}" if args.loopback and not args.echo else ""))
+    print(f"Inter-read gap: p50 {1e3 * percentile(stats.gaps, 50):.2f} ms, "
+          f"p99 {1e3 * percentile(stats.gaps, 99):.2f} ms, max {1e3 * max(stats.gaps, default=0):.2f} ms")
+    if stats.latencies:
+        print(f"Burst latency ({args.block} B): p50 {1e3 * percentile(stats.latencies, 50):.2f} ms, "
+              f"p99 {1e3 * percentile(stats.latencies, 99):.2f} ms, max {1e3 * max(stats.latencies):.2f} ms")
+    return 0 if checker.lost == injected[0] and not checker.errors else 1
 
-SERIAL_PORT = 'COM10'
-BAUD_RATE = 230400
-try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-    print(f"Connected to {SERIAL_PORT} at {BAUD_RATE} baud.")
-except serial.SerialException as e:
-    print(f"Error: {e}")
-    exit(1)
-time.sleep(2)
-
-try:
-    while True:
-        if ser.in_waiting > 0:
-            # Read available bytes
-            raw_data = ser.read(ser.in_waiting)
-            
-            # Print raw data in hexadecimal format
-            hex_data = raw_data.hex()
-            print(f"Raw Data (Hex): {hex_data}")
-            
-            # Optionally, you can also print the data as integers
-            int_data = list(raw_data)
-            print(f"Raw Data (Int): {int_data}")
-            
-            # Decode the data assuming it's UTF-8 (if it's textual)
-            line = raw_data.decode('utf-8', errors='ignore').rstrip()
-            print(f"Decoded Line: {line}")
-            
-except KeyboardInterrupt:
-    print("Program terminated.")
-finally:
-    ser.close()
-    print("Serial connection closed.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serial link throughput and integrity benchmark")
+    parser.add_argument('--port', default=SERIAL_PORT)
+    parser.add_argument('--baud', type=int, default=BAUD_RATE)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds")
+    parser.add_argument('--block', type=int, default=BLOCK_BYTES, help="bytes per burst")
+    parser.add_argument('--echo', action='store_true', help="send the pattern and read it back (TX wired to RX)")
+    parser.add_argument('--loopback', action='store_true', help="test against a local pseudo-terminal")
+    parser.add_argument('--drop', type=float, default=0.0, help="with --loopback, chance of dropping part of a block")
+    parser.add_argument('--dump', action='store_true', help="also print received bytes as hex")
+    sys.exit(run(parser.parse_args()))
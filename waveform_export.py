@@ -0,0 +1,185 @@
+import os
+import json
+import struct
+import threading
+import time
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal, QRunnable
+from minmax_pyramid import MinMaxPyramid, pyramid_path
+
+EXPORT_FILTERS = "NumPy (*.npy);;Chunked binary (*.wfm);;CSV (*.csv)"
+CHUNK_SAMPLES = 1 << 16
+
+# .wfm layout: 'WFM1', metadata length, metadata JSON, then chunks of
+# 'CHNK' + first sample index + sample count + float32 rows.
+WFM_MAGIC = b'WFM1'
+WFM_HEADER = struct.Struct('<4sI')
+WFM_CHUNK = struct.Struct('<4sQI')
+NPY_HEADER_BYTES = 128
+
+def metadata_path(path):
+    return path + '.json'
+
+def as_columns(data):
+    # Samples down, channels/segments across
+    data = np.asarray(data)
+    return data.reshape(-1, 1) if data.ndim == 1 else data
+
+def npy_header(dtype, shape):
+    # Fixed-size header so a streamed file can be patched with its final shape
+    header = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': tuple(shape)}
+    preamble = b'\x93NUMPY\x01\x00'
+    length = NPY_HEADER_BYTES - len(preamble) - 2
+    text = repr(header).ljust(length - 1) + '\n'
+    return preamble + struct.pack('<H', length) + text.encode('latin1')
+
+def write_metadata(path, metadata):
+    with open(metadata_path(path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+def read_metadata(path):
+    try:
+        with open(metadata_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def csv_rows(time_axis, block, precision=6):
+    # One %-format over the whole chunk instead of one call per sample
+    row = ','.join([f'%.{precision + 3}g'] + [f'%.{precision}g'] * block.shape[1]) + '\n'
+    values = np.column_stack((time_axis, block)).ravel().tolist()
+    return (row * len(block)) % tuple(values)
+
+def export_waveform(path, data, metadata, progress=None, cancelled=None):
+    data = as_columns(data)
+    n = len(data)
+    sample_rate = metadata['sample_rate']
+    ext = os.path.splitext(path)[1].lower()
+    meta = dict(metadata, samples=n, columns=data.shape[1], dtype='float32', exported=time.time())
+    with open(path, 'wb') as f:
+        if ext == '.npy':
+            shape = (n,) if data.shape[1] == 1 else data.shape
+            f.write(npy_header(np.float32, shape))
+            write_metadata(path, meta)
+        elif ext == '.wfm':
+            header = json.dumps(meta).encode()
+            f.write(WFM_HEADER.pack(WFM_MAGIC, len(header)))
+            f.write(header)
+        elif ext == '.csv':
+            for key, value in meta.items():
+                f.write(f'# {key}: {json.dumps(value)}\n'.encode())
+            names = meta.get('column_names') or [f'ch{i + 1}' for i in range(data.shape[1])]
+            f.write(('time,' + ','.join(names) + '\n').encode())
+        else:
+            raise ValueError(f"Unsupported export format: {ext}")
+
+        for start in range(0, n, CHUNK_SAMPLES):
+            if cancelled is not None and cancelled():
+                break
+            block = np.asarray(data[start:start + CHUNK_SAMPLES], dtype=np.float32)
+            if ext == '.csv':
+                # Relative to t0, which is kept in the header
+                time_axis = np.arange(start, start + len(block)) / sample_rate
+                f.write(csv_rows(time_axis, block).encode())
+            else:
+                if ext == '.wfm':
+                    f.write(WFM_CHUNK.pack(b'CHNK', start, len(block)))
+                f.write(np.ascontiguousarray(block).tobytes())
+            if progress is not None:
+                progress(min(100, (start + len(block)) * 100 // n))
+        else:
+            return True
+    # Cancelled: the header already gives the full length, so don't leave
+    # a file that can't be loaded
+    for partial in (path, metadata_path(path)):
+        if os.path.exists(partial):
+            os.remove(partial)
+    return False
+
+def load_wfm(path):
+    # Returns (samples, metadata); chunk data is read with one fromfile per chunk
+    with open(path, 'rb') as f:
+        magic, length = WFM_HEADER.unpack(f.read(WFM_HEADER.size))
+        if magic != WFM_MAGIC:
+            raise ValueError(f"{path} is not a .wfm file")
+        metadata = json.loads(f.read(length))
+        columns = metadata.get('columns', 1)
+        data = np.empty((metadata['samples'], columns), dtype=np.float32)
+        while True:
+            header = f.read(WFM_CHUNK.size)
+            if len(header) < WFM_CHUNK.size:
+                break
+            _, start, count = WFM_CHUNK.unpack(header)
+            data[start:start + count] = np.fromfile(f, dtype=np.float32, count=count * columns).reshape(-1, columns)
+    return (data[:, 0] if columns == 1 else data), metadata
+
+def load_waveform(path, mmap=True):
+    if path.lower().endswith('.wfm'):
+        return load_wfm(path)
+    return np.load(path, mmap_mode='r' if mmap else None), read_metadata(path)
+
+class ExportSignals(QObject):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(str)
+    cancelled = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+class ExportWorker(QRunnable):
+    def __init__(self, path, data, metadata):
+        super().__init__()
+        self.path = path
+        self.data = data
+        self.metadata = metadata
+        self.cancelled = False
+        self.signals = ExportSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            if export_waveform(self.path, self.data, self.metadata, self.signals.progress.emit, lambda: self.cancelled):
+                self.signals.finished.emit(self.path)
+            else:
+                self.signals.cancelled.emit(self.path)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+
+class WaveformRecorder:
+    # Streams acquired blocks straight to a memory-mappable .npy file and
+    # builds its min/max pyramid on the way, for zooming the capture later.
+    # append() may run on a receiver thread while close() runs on the GUI
+    # thread; blocks that arrive after close() are dropped.
+    def __init__(self, path, metadata, columns=1):
+        self.path = path
+        self.lock = threading.Lock()
+        self.columns = columns
+        self.samples = 0
+        self.pyramid = MinMaxPyramid() if columns == 1 else None
+        self.metadata = dict(metadata, t0=time.time())
+        self.file = open(path, 'wb')
+        self.file.write(npy_header(np.float32, self.shape()))
+
+    def shape(self):
+        return (self.samples,) if self.columns == 1 else (self.samples, self.columns)
+
+    def append(self, block):
+        block = np.ascontiguousarray(block, dtype=np.float32)
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(block.tobytes())
+            self.samples += len(block)
+            if self.pyramid is not None:
+                self.pyramid.append(block)
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.seek(0)
+            self.file.write(npy_header(np.float32, self.shape()))
+            self.file.close()
+        write_metadata(self.path, dict(self.metadata, samples=self.samples, columns=self.columns, dtype='float32'))
+        if self.pyramid is not None:
+            self.pyramid.save(pyramid_path(self.path))